@@ -0,0 +1,327 @@
+import argparse
+import csv
+import json
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for component_dir in ('ShingleEntityMatcher', 'CatalogNormalizer', 'EntityTableGenerator', 'Benchmarks'):
+    sys.path.insert(0, os.path.join(REPO_ROOT, component_dir))
+
+import synthetic_data
+
+# Generated data, one subdirectory per scale, and the stored baseline results
+DATA_DIR = 'Benchmarks/data'
+BASELINE_JSON = 'Benchmarks/baseline.json'
+REPORT_JSON = 'Benchmarks/benchmark_report.json'
+ENTITY_TABLE_CONFIG = 'EntityTableGenerator/config.txt'
+
+# Stages in pipeline order; each runs in its own process so its peak memory is its own
+STAGES = [
+    'catalog_normalizer', 'entity_table_generator', 'shingles_dict_generator',
+    'search_analysis', 'problematic_query_rollup', 'synonym_string_list_generator'
+]
+
+# A stage regresses when its throughput drops, or its peak memory grows, by more than this fraction
+DEFAULT_TOLERANCE = 0.2
+
+# Distinct queries whose synonym expansions are enumerated by the synonym stage
+SYNONYM_SAMPLE_SIZE = 50000
+
+def data_paths(data_dir: str) -> dict:
+    """
+    Returns the paths of the inputs and outputs of every stage in a data directory.
+    """
+    output_dir = os.path.join(data_dir, 'Output')
+    return {
+        'full_catalog': os.path.join(data_dir, synthetic_data.FULL_CATALOG_CSV),
+        'search_terms': os.path.join(data_dir, synthetic_data.SEARCH_TERMS_CSV),
+        'simplified_catalog': os.path.join(data_dir, 'simplified_catalog.csv'),
+        'entity_table': os.path.join(data_dir, 'entity_table.csv'),
+        'matched': os.path.join(output_dir, 'MatchedTable.csv'),
+        'unmatched': os.path.join(output_dir, 'UnmatchedTable.csv'),
+        'problematic': os.path.join(output_dir, 'potentially_problematic_searches.csv'),
+        'rolled_up': os.path.join(output_dir, 'rolled_up_searches.csv'),
+    }
+
+def stage_report_path(data_dir: str, stage_name: str) -> str:
+    return os.path.join(data_dir, 'Output', f'{stage_name}_report.json')
+
+def count_csv_rows(filename: str) -> int:
+    with open(filename, newline='', encoding='utf-8') as file:
+        return sum(1 for _ in csv.reader(file)) - 1
+
+def configure_solr(solr_url: str) -> None:
+    """
+    Points the analysis and catalog checks of this process at the Solr stub, with caching off.
+    """
+    import catalog_match_checker
+    import normalizer
+    import pysolr
+
+    normalizer.SOLR_URL = solr_url
+    normalizer.ANALYSIS_BACKEND = "solr"
+    normalizer.CACHE_ENABLED = False
+    catalog_match_checker.CATALOG_CHECK_ENGINE = "solr"
+    catalog_match_checker.PERSIST_VERDICTS = False
+    catalog_match_checker.solr = pysolr.Solr(f'{solr_url}/{normalizer.CORE_NAME}')
+
+def run_stage(stage_name: str, data_dir: str, solr_url: str, workers: int) -> dict:
+    """
+    Runs one stage on a data directory and returns its instrumentation report.
+
+    Only the stage itself is timed; loading its inputs (e.g. the dictionary artifact for
+    search_analysis) happens before.
+
+    Args:
+        stage_name (str): One of STAGES.
+        data_dir (str): The data directory, holding the outputs of the earlier stages.
+        solr_url (str): Base URL of the Solr stub, or None for stages that do not use Solr.
+        workers (int): Worker processes for search_analysis.
+
+    Returns:
+        dict: The report of instrumentation.recorder.
+    """
+    import instrumentation
+
+    paths = data_paths(data_dir)
+    os.makedirs(os.path.dirname(paths['matched']), exist_ok=True)
+    with open(os.path.join(data_dir, synthetic_data.MANIFEST_JSON), encoding='utf-8') as file:
+        manifest = json.load(file)
+    if solr_url:
+        configure_solr(solr_url)
+
+    recorder = instrumentation.recorder
+    recorder.reset()
+
+    if stage_name == 'catalog_normalizer':
+        import catalog_normalizer
+        with recorder.stage(stage_name) as stage:
+            catalog_normalizer.clean_data(paths['full_catalog'], paths['simplified_catalog'])
+            stage.rows = manifest['catalog_rows']
+
+    elif stage_name == 'entity_table_generator':
+        import entity_table_generator
+        with recorder.stage(stage_name) as stage:
+            entity_table_generator.create_entity_table_streaming(paths['simplified_catalog'], ENTITY_TABLE_CONFIG, paths['entity_table'])
+            stage.rows = manifest['catalog_rows']
+
+    elif stage_name == 'shingles_dict_generator':
+        import shingle_dictionary
+        import shingle_dictionary_artifact
+        import shingles_dict_generator
+        shingles_dict = shingle_dictionary.ShingleDictionary()
+        with recorder.stage(stage_name) as stage:
+            shingles_dict_generator.read_csv_and_populate_shingles_dict(paths['entity_table'], shingles_dict)
+            stage.rows = len(shingles_dict)
+        # Saved for search_analysis, outside the timed stage
+        shingle_dictionary_artifact.write_artifact(
+            shingles_dict, shingle_dictionary_artifact.artifact_path_for(paths['entity_table']),
+            shingle_dictionary_artifact.file_sha256(paths['entity_table']), shingle_dictionary_artifact.current_fingerprint()
+        )
+
+    elif stage_name == 'search_analysis':
+        import search_analysis
+        import shingle_dictionary_artifact
+        import shingle_matcher
+        search_analysis.LULU_TERMS_AGGREGATED_CSV = paths['search_terms']
+        search_analysis.MATCHED_TABLE_CSV = paths['matched']
+        search_analysis.UNMATCHED_TABLE_CSV = paths['unmatched']
+        search_analysis.PROBLEMATIC_SEARCHES_CSV = paths['problematic']
+        # Every run analyzes every row, rather than replaying the previous run's results
+        search_analysis.RESULT_CACHE_ENABLED = False
+        search_analysis.shingles_dict, _ = shingle_dictionary_artifact.load_or_build(paths['entity_table'])
+        search_analysis.shingle_trie = shingle_matcher.ShingleTrie(search_analysis.shingles_dict.keys())
+        search_analysis.initialize_csvs()
+        with recorder.stage(stage_name) as stage:
+            stage.rows = search_analysis.process_search_queries(workers)
+
+    elif stage_name == 'problematic_query_rollup':
+        import problematic_query_rollup
+        with recorder.stage(stage_name) as stage:
+            problematic_query_rollup.rollup_queries(paths['problematic'], paths['rolled_up'])
+            stage.rows = count_csv_rows(paths['problematic'])
+
+    elif stage_name == 'synonym_string_list_generator':
+        import normalizer
+        import problematic_query_rollup
+        import synonym_string_list_generator
+        with open(paths['search_terms'], newline='', encoding='utf-8') as file:
+            queries = list(dict.fromkeys(row['Search Query'] for row in csv.DictReader(file)))[:SYNONYM_SAMPLE_SIZE]
+        token_data = normalizer.get_raw_normalized_result_many(queries, 'dig_practice_char_syns_stem')
+        with recorder.stage(stage_name) as stage:
+            for query_token_data in token_data:
+                for _ in synonym_string_list_generator.iter_strings(
+                    query_token_data, max_expansions=problematic_query_rollup.MAX_SYNONYM_EXPANSIONS, unique=True
+                ):
+                    pass
+            stage.rows = len(token_data)
+
+    else:
+        raise ValueError(f"Unknown stage: {stage_name}")
+
+    return recorder.report(stage=stage_name)
+
+def start_solr_stub(catalog_csv: str) -> tuple:
+    """
+    Starts the Solr stub in its own process and waits until it is listening.
+
+    Returns:
+        tuple: The stub process and its base URL.
+    """
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(REPO_ROOT, 'Benchmarks', 'solr_stub.py'), '--catalog', catalog_csv],
+        cwd=REPO_ROOT, stdout=subprocess.PIPE, text=True
+    )
+    for line in process.stdout:
+        if line.startswith('Solr stub listening on '):
+            return process, line.split()[-1]
+    process.wait()
+    raise RuntimeError(f"Solr stub exited with code {process.returncode} before listening")
+
+def run_stage_process(stage_name: str, data_dir: str, solr_url: str, workers: int) -> dict:
+    """
+    Runs one stage in a fresh Python process and returns its summary.
+
+    Returns:
+        dict: Wall time, rows, rows per second, peak RSS and the Solr call counts of the stage.
+    """
+    report_path = stage_report_path(data_dir, stage_name)
+    command = [sys.executable, os.path.abspath(__file__), '--run-stage', stage_name, '--data-dir', data_dir, '--workers', str(workers)]
+    if solr_url:
+        command += ['--solr-url', solr_url]
+    subprocess.run(command, cwd=REPO_ROOT, check=True)
+
+    with open(report_path, encoding='utf-8') as file:
+        report = json.load(file)
+    stage = report['stages'][0]
+    return {
+        'wall_seconds': stage['wall_seconds'],
+        'rows': stage['rows'],
+        'rows_per_second': stage['rows_per_second'],
+        'peak_rss_bytes': report['memory']['peak_rss_bytes'],
+        'counters': stage['counters'],
+        'latency': report['latency'],
+    }
+
+def compare_to_baseline(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Compares stage results with the baseline of the same scale.
+
+    Args:
+        results (dict): Stage name to its summary.
+        baseline (dict): Stage name to its baseline summary.
+        tolerance (float): Allowed fractional drop in throughput and growth in peak memory.
+
+    Returns:
+        list: One message per regression.
+    """
+    regressions = []
+    for stage_name, result in results.items():
+        expected = baseline.get(stage_name)
+        if not expected:
+            continue
+        if result['rows_per_second'] and expected['rows_per_second'] and \
+                result['rows_per_second'] < expected['rows_per_second'] * (1 - tolerance):
+            regressions.append(f"{stage_name}: {result['rows_per_second']:.0f} rows/s, baseline {expected['rows_per_second']:.0f} rows/s")
+        if result['peak_rss_bytes'] > expected['peak_rss_bytes'] * (1 + tolerance):
+            regressions.append(f"{stage_name}: peak RSS {result['peak_rss_bytes'] / 2**20:.0f} MiB, baseline {expected['peak_rss_bytes'] / 2**20:.0f} MiB")
+    return regressions
+
+def print_results(results: dict, baseline: dict) -> None:
+    print(f"{'stage':<32}{'seconds':>10}{'rows':>12}{'rows/s':>12}{'vs base':>10}{'RSS MiB':>10}{'Solr calls':>12}")
+    for stage_name, result in results.items():
+        expected = baseline.get(stage_name)
+        change = ''
+        if expected and expected['rows_per_second'] and result['rows_per_second']:
+            change = f"{result['rows_per_second'] / expected['rows_per_second'] - 1:+.0%}"
+        solr_calls = sum(count for counter, count in result['counters'].items() if counter.startswith('solr.'))
+        print(f"{stage_name:<32}{result['wall_seconds']:>10.2f}{result['rows'] or 0:>12}{result['rows_per_second'] or 0:>12.0f}"
+              f"{change:>10}{result['peak_rss_bytes'] / 2**20:>10.0f}{solr_calls:>12}")
+
+def run_benchmarks(queries: int, catalog_rows: int = None, seed: int = synthetic_data.DEFAULT_SEED, stages: list = None,
+                   workers: int = 1, tolerance: float = DEFAULT_TOLERANCE, save_baseline: bool = False) -> int:
+    """
+    Generates (or reuses) the data for a scale, runs the stages against the Solr stub and
+    compares them with the stored baseline for that scale.
+
+    Args:
+        queries (int): Number of search terms.
+        catalog_rows (int): Number of catalog rows; defaults to a size derived from the number of queries.
+        seed (int): Random seed of the data.
+        stages (list): Stages to run, in pipeline order; defaults to all of them.
+        workers (int): Worker processes for search_analysis.
+        tolerance (float): Allowed fractional regression before the run fails.
+        save_baseline (bool): Whether to store these results as the baseline for the scale.
+
+    Returns:
+        int: 0 if no stage regressed, 1 otherwise.
+    """
+    data_dir = os.path.join(DATA_DIR, f'queries_{queries}_seed_{seed}')
+    manifest = synthetic_data.generate_data(data_dir, queries, catalog_rows, seed)
+    scale = f"queries={manifest['queries']},catalog_rows={manifest['catalog_rows']},seed={seed},workers={workers}"
+    stages = stages or STAGES
+
+    results = {}
+    solr_stub = None
+    try:
+        for stage_name in stages:
+            needs_solr = stage_name not in ('catalog_normalizer', 'entity_table_generator')
+            if needs_solr and solr_stub is None:
+                solr_stub, solr_url = start_solr_stub(data_paths(data_dir)['simplified_catalog'])
+            print(f"Running {stage_name}...")
+            results[stage_name] = run_stage_process(stage_name, data_dir, solr_url if needs_solr else None, workers)
+    finally:
+        if solr_stub is not None:
+            solr_stub.terminate()
+            solr_stub.wait()
+
+    baselines = {}
+    if os.path.exists(BASELINE_JSON):
+        with open(BASELINE_JSON, encoding='utf-8') as file:
+            baselines = json.load(file)
+    baseline = baselines.get(scale, {})
+
+    print(f"Benchmark results for {scale}:")
+    print_results(results, baseline)
+    with open(REPORT_JSON, mode='w', encoding='utf-8') as file:
+        json.dump({'scale': scale, 'results': results, 'baseline': baseline}, file, indent=2)
+
+    if save_baseline:
+        baselines[scale] = {**baseline, **results}
+        with open(BASELINE_JSON, mode='w', encoding='utf-8') as file:
+            json.dump(baselines, file, indent=2)
+        print(f"Baseline for {scale} saved to {BASELINE_JSON}.")
+        return 0
+
+    if not baseline:
+        print(f"No baseline for {scale} in {BASELINE_JSON}; run with --save-baseline to store one.")
+        return 0
+    regressions = compare_to_baseline(results, baseline, tolerance)
+    for regression in regressions:
+        print(f"Regression: {regression}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic data against a Solr stub.")
+    parser.add_argument('--queries', type=int, default=10000, help="Number of search terms (e.g. 10000 to 10000000)")
+    parser.add_argument('--catalog-rows', type=int, help="Number of catalog rows (default: derived from --queries)")
+    parser.add_argument('--seed', type=int, default=synthetic_data.DEFAULT_SEED, help="Random seed of the data")
+    parser.add_argument('--stages', nargs='+', choices=STAGES, help="Stages to run (default: all)")
+    parser.add_argument('--workers', type=int, default=1, help="Worker processes for search_analysis")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help="Allowed fractional regression")
+    parser.add_argument('--save-baseline', action='store_true', help="Store the results as the baseline for this scale")
+    parser.add_argument('--run-stage', choices=STAGES, help=argparse.SUPPRESS)
+    parser.add_argument('--data-dir', help=argparse.SUPPRESS)
+    parser.add_argument('--solr-url', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_stage:
+        # Child process of run_stage_process
+        stage_report = run_stage(args.run_stage, args.data_dir, args.solr_url, args.workers)
+        with open(stage_report_path(args.data_dir, args.run_stage), mode='w', encoding='utf-8') as report_file:
+            json.dump(stage_report, report_file)
+    else:
+        sys.exit(run_benchmarks(args.queries, args.catalog_rows, args.seed, args.stages, args.workers,
+                                args.tolerance, args.save_baseline))
@@ -0,0 +1,133 @@
+import argparse
+import json
+import os
+import re
+import sys
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ShingleEntityMatcher'))
+
+import catalog_bitmap_index
+import local_analyzer
+
+CORE_NAME = 'catalog_core'
+
+# A field:"phrase" clause of the filter queries built by catalog_match_checker.build_query_parts
+CLAUSE_PATTERN = re.compile(r'(\w+)_t:"((?:[^"\\]|\\.)*)"')
+ESCAPE_PATTERN = re.compile(r'\\(.)')
+
+def parse_filter_query(filter_query: str) -> list:
+    """
+    Parses one parenthesized OR group of field:"phrase" clauses back into (field, phrase) pairs.
+
+    Args:
+        filter_query (str): The filter query.
+
+    Returns:
+        list: The group's (field, phrase) clauses.
+    """
+    return [(field, ESCAPE_PATTERN.sub(r'\1', phrase)) for field, phrase in CLAUSE_PATTERN.findall(filter_query)]
+
+class SolrStubHandler(BaseHTTPRequestHandler):
+    """
+    Answers the Solr requests the pipeline sends to catalog_core, without a Solr process.
+
+    /analysis/field runs the managed-schema analyzers in-process (local_analyzer), /select
+    evaluates the filter queries against the catalog bitmap index, and /admin/luke reports
+    a version derived from the catalog file.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    # Headers and body are sent separately; with Nagle's algorithm each keep-alive response waits for a delayed ACK
+    disable_nagle_algorithm = True
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        self.respond(url.path.rstrip('/'), parse_qs(url.query))
+
+    def do_POST(self) -> None:
+        # pysolr posts the parameters as a form when the query string would be long
+        url = urlparse(self.path)
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8')
+        params = parse_qs(url.query)
+        for name, values in parse_qs(body).items():
+            params.setdefault(name, []).extend(values)
+        self.respond(url.path.rstrip('/'), params)
+
+    def respond(self, path: str, params: dict) -> None:
+        if path == f'/solr/{CORE_NAME}/analysis/field':
+            body = local_analyzer.analyze(params['analysis.fieldvalue'][0], params['analysis.fieldtype'][0])
+        elif path == f'/solr/{CORE_NAME}/select':
+            body = self.select(params)
+        elif path == f'/solr/{CORE_NAME}/admin/luke':
+            body = {'index': {'version': self.server.catalog_version}}
+        else:
+            self.send_error(404)
+            return
+
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def select(self, params: dict) -> dict:
+        """
+        Answers a rows=0 select with q=*:* and one fq per OR group.
+
+        Only whether a row matches is evaluated, so numFound is 1 or 0; the pipeline only
+        checks whether it is above zero.
+        """
+        clause_groups = [parse_filter_query(filter_query) for filter_query in params.get('fq', [])]
+        row_exists = catalog_bitmap_index.get_index().row_exists(clause_groups)
+        return {
+            'responseHeader': {'status': 0, 'QTime': 0},
+            'response': {'numFound': int(row_exists), 'start': 0, 'docs': []},
+        }
+
+    def log_message(self, format: str, *args) -> None:
+        # One line per request would dominate the benchmark's output
+        pass
+
+def catalog_version(filename: str) -> int:
+    with open(filename, 'rb') as file:
+        return zlib.crc32(file.read())
+
+def serve(catalog_csv: str, host: str = '127.0.0.1', port: int = 0) -> None:
+    """
+    Builds the analyzers and the catalog index, then serves until interrupted.
+
+    The URL is printed once the stub is ready, as "Solr stub listening on <url>".
+
+    Args:
+        catalog_csv (str): Simplified catalog answered by /select.
+        host (str): Interface to listen on.
+        port (int): Port to listen on; 0 picks a free one.
+    """
+    catalog_bitmap_index.SIMPLIFIED_CATALOG_CSV = catalog_csv
+    catalog_bitmap_index.get_index()
+    local_analyzer.get_analyzer()
+
+    server = ThreadingHTTPServer((host, port), SolrStubHandler)
+    server.daemon_threads = True
+    server.catalog_version = catalog_version(catalog_csv)
+    print(f"Solr stub listening on http://{host}:{server.server_address[1]}/solr", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the catalog_core analysis and select endpoints without Solr.")
+    parser.add_argument('--catalog', default='CatalogNormalizer/simplified_catalog.csv', help="Simplified catalog CSV to answer selects from")
+    parser.add_argument('--host', default='127.0.0.1', help="Interface to listen on")
+    parser.add_argument('--port', type=int, default=0, help="Port to listen on (0 picks a free port)")
+    args = parser.parse_args()
+
+    serve(args.catalog, args.host, args.port)
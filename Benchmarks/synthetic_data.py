@@ -0,0 +1,258 @@
+import argparse
+import csv
+import json
+import os
+import random
+
+# Seed used when none is given, so runs at the same scale see the same data
+DEFAULT_SEED = 1234
+
+# Catalog rows generated per search query when no catalog size is given, and the bounds applied to it
+CATALOG_ROWS_PER_QUERY = 0.05
+MIN_CATALOG_ROWS = 2000
+MAX_CATALOG_ROWS = 500000
+
+# Columns of the raw full catalog: the columns kept by catalog_normalizer plus a few that it drops
+FULL_CATALOG_COLUMNS = [
+    'freeReturnShipping', 'gender', 'sku_available', 'sku_colorCodeDesc', 'sku_colorGroup', 'sku_colorGroup_fr',
+    'list_price', 'sku_size', 'sku_id', 'collections', 'parentCategory_displayName', 'product_activity',
+    'product_customAttribute4', 'product_displayName', 'product_feel', 'product_fit', 'product_function',
+    'product_inseam', 'product_rise_s', 'product_title', 'product_topsLength_s', 'sku_sizeType_ss', 'product_gender'
+]
+
+# Columns of the search terms log (lulu_terms.csv, with the query column named as search_analysis reads it)
+SEARCH_TERMS_COLUMNS = [
+    'Search Query', 'Term Rank by Revenue', 'Term Rank by Visits', 'Token Count in Search Term', 'Visits',
+    'Product Views', 'Conversion Rate', 'Average Order Value (AOV)', 'Revenue', 'Visits - Views',
+    'Revenue / Visitor', '', 'revenue percentile'
+]
+
+# File names inside a generated data directory
+FULL_CATALOG_CSV = 'full_catalog.csv'
+SEARCH_TERMS_CSV = 'search_terms.csv'
+MANIFEST_JSON = 'manifest.json'
+
+GENDERS = ['Women', 'Men', 'Unisex', 'Girls', 'Boys']
+CATEGORIES = [
+    'Leggings', 'Joggers', 'Shorts', 'Sports Bras', 'Tank Tops', 'T-Shirts', 'Hoodies & Sweatshirts',
+    'Jackets & Coats', 'Pants', 'Skirts & Dresses', 'Bags', 'Hats', 'Socks', 'Underwear', 'Shoes', 'Yoga Mats'
+]
+SIZES = ['XXS', 'XS', 'S', 'M', 'L', 'XL', 'XXL', '0', '2', '4', '6', '8', '10', '12', '14', '28', '30', '32', '34', '36 DD', 'One Size']
+TOPS_LENGTHS = ['Cropped', 'Waist Length', 'Hip Length', 'Short', 'Long', '']
+COLOR_GROUPS = [
+    ('black', 'noir'), ('white', 'blanc'), ('navy', 'marine'), ('blue', 'bleu'), ('green', 'vert'),
+    ('red', 'rouge'), ('pink', 'rose'), ('purple', 'violet'), ('brown', 'brun'), ('grey', 'gris'),
+    ('neutral', 'neutre'), ('yellow', 'jaune'), ('orange', 'orange')
+]
+INSEAMS = ['23"', '25"', '28"', '30"', '32"', '4"', '6"', '7"', '']
+ACTIVITIES = ['Yoga', 'Running', 'Training', 'Hiking', 'Golf', 'Tennis', 'Casual', 'On the Move', 'Travel', 'Work', 'Dance Studio', 'Swim']
+ATTRIBUTES = ['Base Layers', 'Skorts', 'Chinos', 'Dress Pants', 'Crew Neck', 'High Rise', 'Wide Leg', 'Flared', 'Belt Bags', '']
+FEELS = ['Buttery Soft', 'Smooth', 'Cool', 'Cottony', 'Brushed', 'Crisp', '']
+FITS = ['Tight', 'Slim Fit', 'Classic Fit', 'Relaxed Fit', 'Oversized', '']
+FUNCTIONS = ['Sweat-Wicking', 'Four-Way Stretch', 'Breathable', 'Water-Repellent', 'Quick-Drying', '']
+RISES = ['High Rise', 'Super-High Rise', 'Mid Rise', '']
+
+# Word parts combined into collection, color and product names, so the number of distinct entities grows with the catalog
+NAME_PREFIXES = ['Align', 'Scuba', 'Define', 'Wunder', 'Swift', 'Pace', 'Fast', 'Free', 'Steady', 'Soft', 'City', 'Abc', 'Surge', 'Invigorate', 'Nulu', 'Everlux', 'Metal', 'Sonic', 'Dance', 'License']
+NAME_SUFFIXES = ['Train', 'Tech', 'Vent', 'Luxtreme', 'Studio', 'State', 'Sweat', 'Breeze', 'Adapt', 'Cloud', 'Glow', 'Flow', 'Trail', 'Peak', 'Wave', 'Shift']
+COLOR_WORDS = ['Sonic', 'Espresso', 'Bone', 'Heathered', 'Graphite', 'Java', 'Dark', 'Light', 'Pink', 'Mist', 'Olive', 'Rainforest', 'Storm', 'Desert', 'Sage', 'Lavender', 'Cherry', 'Nomad']
+COLOR_NOUNS = ['Pink', 'Grey', 'Green', 'Blue', 'Red', 'Black', 'White', 'Teal', 'Sand', 'Ivory', 'Navy', 'Tan']
+
+# Words that never match an entity, mixed into part of the queries
+NOISE_WORDS = ['best', 'new', 'sale', 'gift', 'cheap', 'warm', 'summer', 'winter', 'outfit', 'set', 'kids', 'lightweight', 'pocket', 'zip']
+
+IMAGE_URL = 'https://images.example.com/is/image/catalog/{}_swatch?$swatch$'
+
+def synthetic_names(rng: random.Random, first_words: list, second_words: list, count: int) -> list:
+    """
+    Returns up to count distinct two-word names, in a seeded random order.
+
+    Args:
+        rng (random.Random): The random generator.
+        first_words (list): Candidate first words.
+        second_words (list): Candidate second words.
+        count (int): Number of names wanted.
+
+    Returns:
+        list: The names.
+    """
+    names = [f"{first} {second}" for first in first_words for second in second_words if first != second]
+    rng.shuffle(names)
+    return names[:count]
+
+def catalog_vocabulary(rng: random.Random, catalog_rows: int) -> dict:
+    """
+    Returns the candidate raw values of each catalog column, sized for the catalog.
+
+    Args:
+        rng (random.Random): The random generator.
+        catalog_rows (int): Number of catalog rows to generate.
+
+    Returns:
+        dict: Column name to its candidate values.
+    """
+    distinct_names = max(10, int(catalog_rows ** 0.5))
+    products = synthetic_names(rng, NAME_PREFIXES, NAME_SUFFIXES + [category.split()[0] for category in CATEGORIES], distinct_names)
+    return {
+        'gender': GENDERS,
+        'parentCategory_displayName': CATEGORIES,
+        'sku_size': SIZES,
+        'product_topsLength_s': TOPS_LENGTHS,
+        'collections': synthetic_names(rng, NAME_PREFIXES, NAME_SUFFIXES, distinct_names // 2) + [''],
+        'sku_colorCodeDesc': synthetic_names(rng, COLOR_WORDS, COLOR_NOUNS, distinct_names),
+        'product_inseam': INSEAMS,
+        'product_activity': ACTIVITIES,
+        'product_customAttribute4': ATTRIBUTES,
+        'product_displayName': products,
+        'product_feel': FEELS,
+        'product_fit': FITS,
+        'product_function': FUNCTIONS,
+        'product_rise_s': RISES,
+    }
+
+def color_group_value(color_groups: list, language: int) -> str:
+    """
+    Formats color groups the way the raw feed does: "name|swatch url" entries joined by "::::".
+    """
+    return '::::'.join(f"{group[language]}|{IMAGE_URL.format(group[0])}" for group in color_groups)
+
+def generate_full_catalog(filename: str, catalog_rows: int, rng: random.Random) -> dict:
+    """
+    Writes a raw full catalog with the column layout of the catalog feeds.
+
+    Args:
+        filename (str): Path to the catalog CSV to write.
+        catalog_rows (int): Number of rows.
+        rng (random.Random): The random generator.
+
+    Returns:
+        dict: The vocabulary the rows were drawn from.
+    """
+    vocabulary = catalog_vocabulary(rng, catalog_rows)
+
+    with open(filename, mode='w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(FULL_CATALOG_COLUMNS)
+        for row_index in range(catalog_rows):
+            values = {column: rng.choice(candidates) for column, candidates in vocabulary.items()}
+            color_groups = rng.sample(COLOR_GROUPS, rng.randint(1, 2))
+            activities = rng.sample(ACTIVITIES, rng.randint(1, 3))
+            category = values['parentCategory_displayName']
+            values.update({
+                'freeReturnShipping': rng.choice(['True', 'False']),
+                'sku_available': rng.choice(['True', 'False']),
+                'sku_colorGroup': color_group_value(color_groups, 0),
+                'sku_colorGroup_fr': color_group_value(color_groups, 1),
+                'list_price': f"{rng.randint(18, 248)}.0",
+                'sku_id': f"us_{100000000 + row_index}",
+                'product_activity': '::::'.join(activities),
+                'product_title': f"{values['product_displayName']} {category}",
+                'sku_sizeType_ss': rng.choice(['Regular', 'Tall', 'Petite', '']),
+                'product_gender': values['gender'],
+            })
+            writer.writerow([values.get(column, '') for column in FULL_CATALOG_COLUMNS])
+    return vocabulary
+
+def query_tokens(rng: random.Random, vocabulary: dict) -> list:
+    """
+    Draws the words of one search query from the catalog vocabulary.
+
+    Most queries combine two or three catalog values, some inflect a word, some are
+    a single value and some contain words that match nothing.
+    """
+    columns = [column for column, candidates in vocabulary.items() if any(candidates)]
+    kind = rng.random()
+    value_count = 1 if kind < 0.25 else rng.randint(2, 3)
+    words = []
+    for column in rng.sample(columns, value_count):
+        value = rng.choice([candidate for candidate in vocabulary[column] if candidate])
+        words.extend(value.replace('::::', ' ').replace('&', '').replace('-', ' ').lower().split())
+    if 0.25 <= kind < 0.4:
+        # Inflected forms exercise the stemming and normalization paths
+        index = rng.randrange(len(words))
+        words[index] = words[index] + 's' if not words[index].endswith('s') else words[index][:-1]
+    if kind >= 0.85:
+        words.insert(rng.randint(0, len(words)), rng.choice(NOISE_WORDS))
+    return words
+
+def format_dollars(cents: int) -> str:
+    return f"${cents // 100:,}.{cents % 100:02d}"
+
+def generate_search_terms(filename: str, queries: int, vocabulary: dict, rng: random.Random) -> None:
+    """
+    Writes a search terms log with the column layout of lulu_terms.csv, one row at a time.
+
+    Args:
+        filename (str): Path to the search terms CSV to write.
+        queries (int): Number of rows.
+        vocabulary (dict): The catalog vocabulary the query words are drawn from.
+        rng (random.Random): The random generator.
+    """
+    with open(filename, mode='w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(SEARCH_TERMS_COLUMNS)
+        for rank in range(1, queries + 1):
+            words = query_tokens(rng, vocabulary)
+            # Visits fall off with the rank, like a real head-heavy query log
+            visits = max(1, int(2000000 / rank ** 0.8 * rng.uniform(0.8, 1.2)))
+            product_views = int(visits * rng.uniform(0.9, 1.5))
+            conversion = rng.uniform(0.0, 0.2)
+            order_value_cents = rng.randint(2000, 20000)
+            revenue_cents = int(visits * conversion * order_value_cents)
+            writer.writerow([
+                ' '.join(words), rank, rank, len(words), visits, product_views, f"{conversion:.2%}",
+                format_dollars(order_value_cents), format_dollars(revenue_cents), f"{visits - product_views:,}",
+                format_dollars(revenue_cents // visits), f"{rng.uniform(0, 5):.2f}%", f"{100 * (1 - rank / queries):.2f}%"
+            ])
+
+def generate_data(data_dir: str, queries: int, catalog_rows: int = None, seed: int = DEFAULT_SEED) -> dict:
+    """
+    Generates a full catalog and a search terms log in data_dir, unless the same data is already there.
+
+    Args:
+        data_dir (str): Directory to write the data to.
+        queries (int): Number of search terms.
+        catalog_rows (int): Number of catalog rows; defaults to a size derived from the number of queries.
+        seed (int): Random seed.
+
+    Returns:
+        dict: The manifest of the data: its scale, seed and file names.
+    """
+    if catalog_rows is None:
+        catalog_rows = min(MAX_CATALOG_ROWS, max(MIN_CATALOG_ROWS, int(queries * CATALOG_ROWS_PER_QUERY)))
+    manifest = {
+        'queries': queries,
+        'catalog_rows': catalog_rows,
+        'seed': seed,
+        'full_catalog_csv': FULL_CATALOG_CSV,
+        'search_terms_csv': SEARCH_TERMS_CSV,
+    }
+
+    manifest_path = os.path.join(data_dir, MANIFEST_JSON)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as file:
+            if json.load(file) == manifest:
+                print(f"Reusing synthetic data in {data_dir}.")
+                return manifest
+
+    os.makedirs(data_dir, exist_ok=True)
+    rng = random.Random(seed)
+    print(f"Generating a {catalog_rows}-row catalog in {data_dir}...")
+    vocabulary = generate_full_catalog(os.path.join(data_dir, FULL_CATALOG_CSV), catalog_rows, rng)
+    print(f"Generating {queries} search terms in {data_dir}...")
+    generate_search_terms(os.path.join(data_dir, SEARCH_TERMS_CSV), queries, vocabulary, rng)
+
+    # The manifest is written last, so an interrupted run is regenerated
+    with open(manifest_path, mode='w', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=2)
+    return manifest
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic catalog and search terms log.")
+    parser.add_argument('--data-dir', required=True, help="Directory to write the data to")
+    parser.add_argument('--queries', type=int, default=10000, help="Number of search terms")
+    parser.add_argument('--catalog-rows', type=int, help="Number of catalog rows (default: derived from --queries)")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help="Random seed")
+    args = parser.parse_args()
+
+    generate_data(args.data_dir, args.queries, args.catalog_rows, args.seed)
@@ -1,56 +1,131 @@
+import argparse
+import csv
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import re
 
-def clean_data(input_csv: str, output_csv: str) -> None:
+# "vectorized" cleans whole columns at once; "rowwise" is the original per-row engine
+CLEAN_ENGINE = "vectorized"
+
+# Columns kept in the cleaned catalog, in output order
+COLUMNS_TO_KEEP = [
+    'gender', 'parentCategory_displayName', 'sku_size', 'product_topsLength_s',
+    'collections', 'sku_colorCodeDesc', 'sku_colorGroup', 'sku_colorGroup_fr',
+    'product_inseam', 'product_activity', 'product_customAttribute4', 'product_displayName',
+    'product_feel', 'product_fit', 'product_function', 'sku_sizeType_ss', 'product_rise_s',
+    'product_title', 'product_gender'
+]
+
+# Columns holding pipe-separated values that may contain URLs
+URL_COLUMNS = {'sku_colorGroup', 'sku_colorGroup_fr'}
+
+URL_PATTERN = re.compile(r'\|https?:\/\/.*?(?=\||$)')
+
+# Rows per chunk and worker processes used when streaming a feed directory
+CHUNK_SIZE = 50000
+MAX_WORKERS = os.cpu_count() or 1
+
+def clean_and_lowercase(text: str) -> str:
     """
-    Cleans the data from the input CSV file and writes the cleaned data to an output CSV file.
+    Cleans and lowercases the given text.
 
     Args:
-        input_csv (str): Path to the input CSV file.
-        output_csv (str): Path to the output CSV file where cleaned data will be saved.
+        text (str): The text to clean and lowercase.
+
+    Returns:
+        str: The cleaned and lowercased text.
     """
-    # Read the input CSV into a DataFrame
-    df = pd.read_csv(input_csv)
+    if pd.isna(text):
+        return ""
+    text = str(text).lower()
+    text = text.replace('::::', ' / ')
+    text = text.replace('-', ' ')
+    text = text.replace('*', '')
+    text = text.replace('|', '')
+    return text
 
-    # Get the total number of rows to process
-    total_rows = len(df)
-    print(f"Total rows to process: {total_rows}")
+def remove_urls_and_lowercase(text: str) -> str:
+    """
+    Removes URLs from the text and lowercases it.
 
-    def clean_and_lowercase(text: str) -> str:
-        """
-        Cleans and lowercases the given text.
+    Args:
+        text (str): The text from which to remove URLs.
 
-        Args:
-            text (str): The text to clean and lowercase.
-            replace_colon (bool): Whether to replace '::::' with '/' in the text.
+    Returns:
+        str: The text with URLs removed and lowercased.
+    """
+    if pd.isna(text):
+        return ""
+    # Use regex to remove URLs
+    text = URL_PATTERN.sub('', text)
+    return text.lower()
 
-        Returns:
-            str: The cleaned and lowercased text.
-        """
-        if pd.isna(text):
-            return ""
-        text = str(text).lower()
-        text = text.replace('::::', ' / ')
-        text = text.replace('-', ' ')
-        text = text.replace('*', '')
-        text = text.replace('|', '')
-        return text
-
-    def remove_urls_and_lowercase(text: str) -> str:
-        """
-        Removes URLs from the text and lowercases it.
+def clean_column(column: pd.Series) -> pd.Series:
+    """
+    Applies the cleaning of one output column to the whole column at once.
 
-        Args:
-            text (str): The text from which to remove URLs.
+    Equivalent to calling clean_and_lowercase (or remove_urls_and_lowercase for URL
+    columns) on every value, using .str operations on Python strings so the results
+    are identical.
 
-        Returns:
-            str: The text with URLs removed and lowercased.
-        """
-        if pd.isna(text):
-            return ""
-        # Use regex to remove URLs
-        text = re.sub(r'\|https?:\/\/.*?(?=\||$)', '', text)
-        return text.lower()
+    Args:
+        column (pd.Series): The raw column as read from the catalog.
+
+    Returns:
+        pd.Series: The cleaned column, with missing values as empty strings.
+    """
+    missing = column.isna()
+    # Non-missing values are stringified like str(value); object dtype keeps Python string semantics
+    text = column.astype(object).where(~missing, '').map(str).astype(object)
+
+    if column.name in URL_COLUMNS:
+        text = text.str.replace(URL_PATTERN, '', regex=True).str.lower()
+    else:
+        text = text.str.lower()
+        text = text.str.replace('::::', ' / ', regex=False)
+        text = text.str.replace('-', ' ', regex=False)
+        text = text.str.replace('*', '', regex=False)
+        text = text.str.replace('|', '', regex=False)
+        if column.name == 'parentCategory_displayName':
+            text = text.str.replace(' & ', '/', regex=False)
+
+    return text.where(~missing, '')
+
+def clean_vectorized(df: pd.DataFrame, verbose: bool = True) -> pd.DataFrame:
+    """
+    Cleans the kept columns of the catalog column by column.
+
+    Args:
+        df (pd.DataFrame): The catalog, read with only the kept columns.
+        verbose (bool): Whether to print progress per column.
+
+    Returns:
+        pd.DataFrame: The cleaned columns in COLUMNS_TO_KEEP order.
+    """
+    cleaned_columns = {}
+    for column_name in COLUMNS_TO_KEEP:
+        if column_name in df:
+            cleaned_columns[column_name] = clean_column(df[column_name])
+        else:
+            # Missing columns come out empty, as row.get(column, '') did
+            cleaned_columns[column_name] = pd.Series('', index=df.index, dtype=object)
+        if verbose:
+            print(f"Cleaned column {column_name}")
+    return pd.DataFrame(cleaned_columns, index=df.index)
+
+def clean_rowwise(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Cleans the catalog one row at a time.
+
+    Args:
+        df (pd.DataFrame): The catalog.
+
+    Returns:
+        pd.DataFrame: The cleaned columns in COLUMNS_TO_KEEP order.
+    """
+    total_rows = len(df)
 
     def process_row(row: pd.Series, index: int) -> pd.Series:
         """
@@ -66,7 +141,7 @@ def clean_data(input_csv: str, output_csv: str) -> None:
         # Print progress for every 1000 rows processed
         if index % 1000 == 0:
             print(f"Processed {index} rows out of {total_rows}")
-        
+
         # Clean and normalize specific fields in the row
         row['parentCategory_displayName'] = clean_and_lowercase(row.get('parentCategory_displayName', '')).replace(' & ', '/')
         row['sku_colorGroup'] = remove_urls_and_lowercase(row.get('sku_colorGroup', ''))
@@ -92,24 +167,128 @@ def clean_data(input_csv: str, output_csv: str) -> None:
 
     # Apply the processing function to each row in the DataFrame
     df = df.apply(lambda row: process_row(row, df.index.get_loc(row.name)), axis=1)
+    return df[COLUMNS_TO_KEEP]
 
-    # Select the columns to keep in the final cleaned DataFrame
-    columns_to_keep = [
-        'gender', 'parentCategory_displayName', 'sku_size', 'product_topsLength_s',
-        'collections', 'sku_colorCodeDesc', 'sku_colorGroup', 'sku_colorGroup_fr',
-        'product_inseam', 'product_activity', 'product_customAttribute4', 'product_displayName', 
-        'product_feel', 'product_fit', 'product_function', 'sku_sizeType_ss', 'product_rise_s', 
-        'product_title', 'product_gender'
-    ]
-    cleaned_df = df[columns_to_keep]
+def clean_data(input_csv: str, output_csv: str, engine: str = None) -> None:
+    """
+    Cleans the data from the input CSV file and writes the cleaned data to an output CSV file.
+
+    Args:
+        input_csv (str): Path to the input CSV file.
+        output_csv (str): Path to the output CSV file where cleaned data will be saved.
+        engine (str): "vectorized" or "rowwise"; defaults to CLEAN_ENGINE.
+    """
+    engine = engine or CLEAN_ENGINE
+
+    if engine == "vectorized":
+        # Only load the columns that are kept; dtype inference is per column, so values are unchanged
+        df = pd.read_csv(input_csv, usecols=lambda column_name: column_name in COLUMNS_TO_KEEP)
+    elif engine == "rowwise":
+        df = pd.read_csv(input_csv)
+    else:
+        raise ValueError(f"Unknown clean engine: {engine}")
+
+    # Get the total number of rows to process
+    total_rows = len(df)
+    print(f"Total rows to process: {total_rows}")
+
+    cleaned_df = clean_vectorized(df) if engine == "vectorized" else clean_rowwise(df)
 
     # Write the cleaned data to the output CSV file
     cleaned_df.to_csv(output_csv, index=False, na_rep='')
 
     print(f"Processed {total_rows} rows successfully.")
 
-# Example usage
+def list_feed_files(directory: str) -> list:
+    """
+    Lists the CSV files of a catalog feed directory in name order.
+
+    Args:
+        directory (str): The feed directory.
+
+    Returns:
+        list: Paths to the CSV files.
+    """
+    return [os.path.join(directory, filename) for filename in sorted(os.listdir(directory)) if filename.endswith('.csv')]
+
+def iter_feed_chunks(feed_files: list, chunk_size: int = CHUNK_SIZE):
+    """
+    Reads the kept columns of each feed file in fixed-size chunks.
+
+    Values are read as text, so a chunk's values do not depend on how the other chunks
+    would have been type-inferred. Kept columns a file does not have are filled in when
+    the chunk is cleaned, which aligns files whose headers differ.
+
+    Args:
+        feed_files (list): Paths to the feed CSV files.
+        chunk_size (int): Number of rows per chunk.
+
+    Yields:
+        pd.DataFrame: The next chunk.
+    """
+    for feed_file in feed_files:
+        print(f"Streaming file: {feed_file}")
+        with pd.read_csv(feed_file, dtype=str, chunksize=chunk_size,
+                         usecols=lambda column_name: column_name in COLUMNS_TO_KEEP) as reader:
+            for chunk in reader:
+                yield chunk
+
+def clean_chunk(chunk: pd.DataFrame) -> str:
+    """
+    Cleans one chunk and renders it as CSV rows without a header (runs in a worker process).
+
+    Args:
+        chunk (pd.DataFrame): The raw chunk.
+
+    Returns:
+        str: The cleaned rows in CSV format.
+    """
+    return clean_vectorized(chunk, verbose=False).to_csv(index=False, header=False, na_rep='')
+
+def clean_feed_directory(directory: str, output_csv: str, chunk_size: int = CHUNK_SIZE, max_workers: int = MAX_WORKERS) -> None:
+    """
+    Streams every CSV file of a catalog feed directory into a cleaned catalog.
+
+    Chunks are cleaned in parallel across a process pool and written in input order. At most
+    two chunks per worker are in flight, so peak memory is bounded by the chunk size rather
+    than by the size of the feeds.
+
+    Args:
+        directory (str): The feed directory (e.g. one country's catalog feed files).
+        output_csv (str): Path to the output CSV file where cleaned data will be saved.
+        chunk_size (int): Number of rows per chunk.
+        max_workers (int): Number of worker processes.
+    """
+    feed_files = list_feed_files(directory)
+    print(f"Files to process: {len(feed_files)}")
+    total_rows = 0
+
+    with open(output_csv, mode='w', newline='', encoding='utf-8') as output_file, \
+         ProcessPoolExecutor(max_workers=max_workers) as executor:
+        csv.writer(output_file, lineterminator='\n').writerow(COLUMNS_TO_KEEP)
+
+        pending = deque()
+        for chunk in iter_feed_chunks(feed_files, chunk_size):
+            total_rows += len(chunk)
+            pending.append(executor.submit(clean_chunk, chunk))
+            if len(pending) >= 2 * max_workers:
+                output_file.write(pending.popleft().result())
+                print(f"Processed {total_rows} rows")
+        while pending:
+            output_file.write(pending.popleft().result())
+
+    print(f"Processed {total_rows} rows successfully.")
+
 if __name__ == "__main__":
-    input_csv = 'CatalogNormalizer/full_catalog.csv'
-    output_csv = 'CatalogNormalizer/simplified_catalog.csv'
-    clean_data(input_csv, output_csv)
+    parser = argparse.ArgumentParser(description="Clean a catalog into the simplified catalog CSV.")
+    parser.add_argument('--feed-dir', help="Stream every CSV file of a feed directory instead of one full catalog CSV")
+    parser.add_argument('--input', default='CatalogNormalizer/full_catalog.csv', help="Full catalog CSV to clean")
+    parser.add_argument('--output', default='CatalogNormalizer/simplified_catalog.csv', help="Output CSV")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Rows per chunk when streaming")
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help="Worker processes when streaming")
+    args = parser.parse_args()
+
+    if args.feed_dir:
+        clean_feed_directory(args.feed_dir, args.output, args.chunk_size, args.workers)
+    else:
+        clean_data(args.input, args.output)
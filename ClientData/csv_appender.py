@@ -1,25 +1,26 @@
+import csv
 import os
-import pandas as pd
 
 def append_csv_files(directory, output_file):
-    # Initialize an empty list to hold dataframes
-    dataframes = []
+    # Collect the CSV files in a stable order
+    filepaths = [os.path.join(directory, filename) for filename in sorted(os.listdir(directory)) if filename.endswith('.csv')]
 
-    # Loop through all files in the given directory
-    for filename in os.listdir(directory):
-        if filename.endswith('.csv'):
-            filepath = os.path.join(directory, filename)
-            # Read the CSV file into a dataframe
-            df = pd.read_csv(filepath)
-            # Append the dataframe to the list
-            dataframes.append(df)
-            print(f"Processed file: {filename}")
+    # Union of all headers, in order of first appearance, so files with different columns line up
+    fieldnames = []
+    for filepath in filepaths:
+        with open(filepath, newline='', encoding='utf-8-sig') as file:
+            header = next(csv.reader(file), [])
+        fieldnames.extend(column for column in header if column not in fieldnames)
 
-    # Concatenate all dataframes in the list
-    combined_df = pd.concat(dataframes, ignore_index=True)
+    # Stream each file row by row into the combined file instead of holding every file in memory
+    with open(output_file, mode='w', newline='', encoding='utf-8') as output:
+        writer = csv.DictWriter(output, fieldnames=fieldnames, restval='', lineterminator='\n')
+        writer.writeheader()
+        for filepath in filepaths:
+            with open(filepath, newline='', encoding='utf-8-sig') as file:
+                writer.writerows(csv.DictReader(file))
+            print(f"Processed file: {os.path.basename(filepath)}")
 
-    # Write the combined dataframe to a new CSV file
-    combined_df.to_csv(output_file, index=False)
     print(f"All files have been appended and saved to {output_file}")
 
 if __name__ == "__main__":
@@ -28,4 +29,4 @@ if __name__ == "__main__":
     output_csv = "ClientData/full_catalog.csv"
 
     # Call the function to append CSV files
-    append_csv_files(input_directory, output_csv)
\ No newline at end of file
+    append_csv_files(input_directory, output_csv)
@@ -1,5 +1,9 @@
+import argparse
 import pandas as pd
 
+# Rows read per chunk by the streaming extractor
+CHUNK_SIZE = 100000
+
 def read_config(config_file: str) -> list:
     """
     Reads the configuration file and extracts the list of columns to be used.
@@ -52,9 +56,80 @@ def create_entity_table(input_csv: str, config_file: str, output_csv: str) -> No
     # Write the output DataFrame to a new CSV file
     output_df.to_csv(output_csv, index=False)
 
+def collect_distinct_values(input_csv: str, columns: list, chunk_size: int = CHUNK_SIZE) -> dict:
+    """
+    Streams the input CSV in chunks and collects each column's distinct values with their counts.
+
+    Only the requested columns are read, as text, and missing values are skipped. Values keep
+    their catalog spelling: a numeric column with gaps yields "28" where create_entity_table's
+    float inference yields "28.0", which never matches the "28" of a normalized search query.
+
+    Args:
+        input_csv (str): Path to the input CSV file.
+        columns (list): The columns to collect; columns missing from the input are ignored.
+        chunk_size (int): Number of rows per chunk.
+
+    Returns:
+        dict: Column name to a dict of value -> count, in order of first appearance.
+    """
+    available_columns = set(pd.read_csv(input_csv, nrows=0).columns)
+    distinct_values = {column: {} for column in columns if column in available_columns}
+
+    with pd.read_csv(input_csv, dtype=str, chunksize=chunk_size,
+                     usecols=lambda column_name: column_name in distinct_values) as reader:
+        for chunk in reader:
+            for column, value_counts in distinct_values.items():
+                # value_counts(sort=False) keeps the chunk's first-appearance order
+                for value, count in chunk[column].value_counts(sort=False).items():
+                    value_counts[value] = value_counts.get(value, 0) + count
+
+    return distinct_values
+
+def create_entity_table_streaming(input_csv: str, config_file: str, output_csv: str,
+                                  counts_csv: str = None, chunk_size: int = CHUNK_SIZE) -> None:
+    """
+    Creates an entity table like create_entity_table, but streams the input in chunks.
+
+    Each column holds its distinct values in order of first appearance, and the table is
+    only as tall as the longest distinct list, so memory and time depend on the number
+    of distinct entities rather than the number of catalog rows.
+
+    Args:
+        input_csv (str): Path to the input CSV file.
+        config_file (str): Path to the configuration file that lists the columns to extract.
+        output_csv (str): Path to the output CSV file where the entity table will be saved.
+        counts_csv (str): Optional path to write the number of rows holding each value.
+        chunk_size (int): Number of rows per chunk.
+    """
+    columns = read_config(config_file)
+    distinct_values = collect_distinct_values(input_csv, columns, chunk_size)
+
+    # Pad every column with empty strings to the length of the longest distinct list
+    table_length = max((len(value_counts) for value_counts in distinct_values.values()), default=0)
+    output_df = pd.DataFrame({
+        column: list(value_counts) + [''] * (table_length - len(value_counts))
+        for column, value_counts in distinct_values.items()
+    })
+    output_df.to_csv(output_csv, index=False)
+
+    if counts_csv:
+        counts_df = pd.DataFrame(
+            [(column, value, count) for column, value_counts in distinct_values.items() for value, count in value_counts.items()],
+            columns=['entity_type', 'value', 'count']
+        )
+        counts_df.to_csv(counts_csv, index=False)
+
 if __name__ == "__main__":
-    input_csv = 'EntityTableGenerator/simplified_catalog.csv'  # Path to the input CSV file
-    config_file = 'EntityTableGenerator/config.txt'            # Path to the config file
-    output_csv = 'EntityTableGenerator/entity_table_new.csv'   # Path to the output CSV file
-    
-    create_entity_table(input_csv, config_file, output_csv)
+    parser = argparse.ArgumentParser(description="Extract the distinct entities of a simplified catalog into an entity table.")
+    parser.add_argument('--input', default='EntityTableGenerator/simplified_catalog.csv', help="Path to the input CSV file")
+    parser.add_argument('--config', default='EntityTableGenerator/config.txt', help="Path to the config file")
+    parser.add_argument('--output', default='EntityTableGenerator/entity_table_new.csv', help="Path to the output CSV file")
+    parser.add_argument('--counts', help="Also write per-value frequency counts to this CSV")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Rows per chunk")
+    parser.add_argument('--in-memory', action='store_true', help="Use the original whole-catalog extractor")
+    args = parser.parse_args()
+
+    if args.in_memory:
+        create_entity_table(args.input, args.config, args.output)
+    else:
+        create_entity_table_streaming(args.input, args.config, args.output, args.counts, args.chunk_size)
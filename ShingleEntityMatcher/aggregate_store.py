@@ -0,0 +1,345 @@
+import argparse
+import csv
+import datetime
+import hashlib
+import json
+import os
+import re
+import sqlite3
+from decimal import Decimal
+import normalizer
+import visits_revenue_aggregator
+
+AGGREGATE_STORE_PATH = 'ShingleEntityMatcher/search_aggregates.sqlite'
+LULU_TERMS_AGGREGATED_CSV = 'ShingleEntityMatcher/lulu_terms_Aggregated.csv'
+
+# Days of exports kept by --keep-days when no other value is given
+DEFAULT_KEEP_DAYS = 365
+
+# A YYYY-MM-DD date, as given after a --merge file or found in an export's file name
+DATE_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)',
+    'CREATE TABLE IF NOT EXISTS exports ('
+    'export_id INTEGER PRIMARY KEY AUTOINCREMENT, source TEXT NOT NULL, sha256 TEXT NOT NULL UNIQUE, '
+    'export_date TEXT NOT NULL, rows INTEGER NOT NULL, merged_at TEXT NOT NULL)',
+    'CREATE TABLE IF NOT EXISTS queries ('
+    'normalized_query TEXT PRIMARY KEY, seq INTEGER NOT NULL, visits INTEGER NOT NULL, revenue TEXT NOT NULL, '
+    'first_row TEXT NOT NULL, changed_in INTEGER NOT NULL) WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS queries_seq ON queries (seq)',
+    'CREATE INDEX IF NOT EXISTS queries_changed_in ON queries (changed_in)',
+    'CREATE TABLE IF NOT EXISTS contributions ('
+    'export_id INTEGER NOT NULL, normalized_query TEXT NOT NULL, visits INTEGER NOT NULL, revenue TEXT NOT NULL, '
+    'PRIMARY KEY (export_id, normalized_query)) WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS contributions_query ON contributions (normalized_query)',
+]
+
+def file_sha256(filename: str) -> str:
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def parse_revenue(revenue: str) -> Decimal:
+    return Decimal(revenue.replace('$', '').replace(',', ''))
+
+def aggregate_export(input_filename: str) -> tuple:
+    """
+    Aggregates one search terms export by normalized search query.
+
+    Rows are first summed per raw query, so each distinct raw query is normalized once.
+
+    Args:
+        input_filename (str): Path to the export CSV.
+
+    Returns:
+        tuple: The export's field names, its number of rows, and a dict from normalized query
+               to [visits, revenue, first row] in order of first occurrence.
+    """
+    raw_totals = {}
+    row_count = 0
+    with open(input_filename, mode='r', newline='', encoding='utf-8') as infile:
+        reader = csv.DictReader(infile)
+        visits_revenue_aggregator.clean_header(reader)
+        fieldnames = reader.fieldnames
+        for row in reader:
+            row_count += 1
+            totals = raw_totals.get(row['Search Query'])
+            if totals is None:
+                totals = raw_totals[row['Search Query']] = [0, Decimal('0.00'), row]
+            totals[0] += int(row['Visits'])
+            totals[1] += parse_revenue(row['Revenue'])
+
+    raw_queries = list(raw_totals)
+    print(f"Normalizing {len(raw_queries)} distinct queries out of {row_count} rows...")
+    normalized_queries = []
+    batch_size = visits_revenue_aggregator.NORMALIZATION_BATCH_SIZE
+    for start in range(0, len(raw_queries), batch_size):
+        normalized_queries.extend(normalizer.get_normalized_final_text_many(raw_queries[start:start + batch_size], 'dig_practice_char'))
+
+    groups = {}
+    for raw_query, normalized_query in zip(raw_queries, normalized_queries):
+        visits, revenue, first_row = raw_totals[raw_query]
+        group = groups.get(normalized_query)
+        if group is None:
+            groups[normalized_query] = [visits, Decimal('0.00') + revenue, first_row]
+        else:
+            group[0] += visits
+            group[1] += revenue
+    return fieldnames, row_count, groups
+
+class AggregateStore:
+    """
+    Visits and revenue totals by normalized search query, merged one export at a time.
+
+    Totals are kept per normalized query together with the first row seen for it, in order of
+    first appearance, so writing the store gives the same CSV as aggregating every merged
+    export at once. Each merge or expiry is a revision. Every query whose totals it changes
+    is marked with that revision, so downstream stages can process only the queries changed
+    since the last revision they acknowledged. Each export's contribution is kept, so exports
+    older than a rolling window can be subtracted again.
+    """
+
+    def __init__(self, db_path: str = AGGREGATE_STORE_PATH):
+        self.db_path = db_path
+        self._connection = sqlite3.connect(db_path)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        for statement in SCHEMA:
+            self._connection.execute(statement)
+        self._connection.commit()
+
+    def _meta(self, name: str, default=None):
+        row = self._connection.execute('SELECT value FROM meta WHERE name = ?', (name,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def _set_meta(self, name: str, value) -> None:
+        self._connection.execute('INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)', (name, json.dumps(value)))
+
+    @property
+    def revision(self) -> int:
+        return self._meta('revision', 0)
+
+    @property
+    def acknowledged_revision(self) -> int:
+        return self._meta('acknowledged_revision', 0)
+
+    def merge_export(self, input_filename: str, export_date: str) -> int:
+        """
+        Adds an export's totals to the store, unless an identical file was already merged.
+
+        Args:
+            input_filename (str): Path to the export CSV.
+            export_date (str): Date the export covers, as YYYY-MM-DD.
+
+        Returns:
+            int: The number of normalized queries whose totals changed.
+        """
+        sha256 = file_sha256(input_filename)
+        if self._connection.execute('SELECT 1 FROM exports WHERE sha256 = ?', (sha256,)).fetchone():
+            print(f"{input_filename} was already merged, skipping it.")
+            return 0
+
+        fieldnames, row_count, groups = aggregate_export(input_filename)
+        with self._connection:
+            if self._meta('fieldnames') is None:
+                self._set_meta('fieldnames', fieldnames)
+            revision = self.revision + 1
+            self._set_meta('revision', revision)
+            export_id = self._connection.execute(
+                'INSERT INTO exports (source, sha256, export_date, rows, merged_at) VALUES (?, ?, ?, ?, ?)',
+                (input_filename, sha256, export_date, row_count, datetime.datetime.now().isoformat(timespec='seconds'))
+            ).lastrowid
+            next_seq = self._connection.execute('SELECT COALESCE(MAX(seq), -1) + 1 FROM queries').fetchone()[0]
+
+            changed = 0
+            for normalized_query, (visits, revenue, first_row) in groups.items():
+                self._connection.execute(
+                    'INSERT INTO contributions (export_id, normalized_query, visits, revenue) VALUES (?, ?, ?, ?)',
+                    (export_id, normalized_query, visits, str(revenue))
+                )
+                existing = self._connection.execute(
+                    'SELECT visits, revenue FROM queries WHERE normalized_query = ?', (normalized_query,)
+                ).fetchone()
+                if existing is None:
+                    self._connection.execute(
+                        'INSERT INTO queries (normalized_query, seq, visits, revenue, first_row, changed_in) VALUES (?, ?, ?, ?, ?, ?)',
+                        (normalized_query, next_seq, visits, str(revenue), json.dumps(first_row, ensure_ascii=False), revision)
+                    )
+                    next_seq += 1
+                    changed += 1
+                elif visits or revenue:
+                    self._connection.execute(
+                        'UPDATE queries SET visits = ?, revenue = ?, changed_in = ? WHERE normalized_query = ?',
+                        (existing[0] + visits, str(Decimal(existing[1]) + revenue), revision, normalized_query)
+                    )
+                    changed += 1
+
+        print(f"Merged {row_count} rows of {input_filename}: {len(groups)} normalized queries, {changed} changed.")
+        return changed
+
+    def expire_exports(self, before_date: str) -> int:
+        """
+        Subtracts the exports dated before a date from the totals and forgets them.
+
+        Queries left without any contribution are removed; the others keep their first row.
+
+        Args:
+            before_date (str): Exports dated strictly before this YYYY-MM-DD date are expired.
+
+        Returns:
+            int: The number of exports expired.
+        """
+        export_ids = [row[0] for row in self._connection.execute(
+            'SELECT export_id FROM exports WHERE export_date < ? ORDER BY export_id', (before_date,)
+        )]
+        if not export_ids:
+            return 0
+
+        with self._connection:
+            revision = self.revision + 1
+            self._set_meta('revision', revision)
+            for export_id in export_ids:
+                contributions = self._connection.execute(
+                    'SELECT normalized_query, visits, revenue FROM contributions WHERE export_id = ?', (export_id,)
+                ).fetchall()
+                for normalized_query, visits, revenue in contributions:
+                    remaining = self._connection.execute(
+                        'SELECT COUNT(*) FROM contributions WHERE normalized_query = ? AND export_id != ?', (normalized_query, export_id)
+                    ).fetchone()[0]
+                    if not remaining:
+                        self._connection.execute('DELETE FROM queries WHERE normalized_query = ?', (normalized_query,))
+                        continue
+                    total_visits, total_revenue = self._connection.execute(
+                        'SELECT visits, revenue FROM queries WHERE normalized_query = ?', (normalized_query,)
+                    ).fetchone()
+                    self._connection.execute(
+                        'UPDATE queries SET visits = ?, revenue = ?, changed_in = ? WHERE normalized_query = ?',
+                        (total_visits - visits, str(Decimal(total_revenue) - Decimal(revenue)), revision, normalized_query)
+                    )
+                self._connection.execute('DELETE FROM contributions WHERE export_id = ?', (export_id,))
+                self._connection.execute('DELETE FROM exports WHERE export_id = ?', (export_id,))
+
+        print(f"Expired {len(export_ids)} exports dated before {before_date}.")
+        return len(export_ids)
+
+    def expire_older_than(self, keep_days: int) -> int:
+        """
+        Expires the exports more than keep_days older than the newest export.
+        """
+        newest = self._connection.execute('SELECT MAX(export_date) FROM exports').fetchone()[0]
+        if newest is None:
+            return 0
+        cutoff = datetime.date.fromisoformat(newest) - datetime.timedelta(days=keep_days)
+        return self.expire_exports(cutoff.isoformat())
+
+    def write_aggregates(self, output_filename: str, changed_since: int = None) -> int:
+        """
+        Writes the totals in the layout of visits_revenue_aggregator.normalize_and_aggregate.
+
+        Args:
+            output_filename (str): Path to the output CSV file.
+            changed_since (int): Only write queries changed after this revision; None writes all of them.
+
+        Returns:
+            int: The number of queries written.
+        """
+        query = 'SELECT normalized_query, visits, revenue, first_row FROM queries'
+        params = ()
+        if changed_since is not None:
+            query += ' WHERE changed_in > ?'
+            params = (changed_since,)
+        query += ' ORDER BY seq'
+
+        written = 0
+        with open(output_filename, mode='w', newline='', encoding='utf-8') as outfile:
+            writer = csv.DictWriter(outfile, fieldnames=self._meta('fieldnames', []), extrasaction='ignore')
+            writer.writeheader()
+            for normalized_query, visits, revenue, first_row in self._connection.execute(query, params):
+                row = json.loads(first_row)
+                row['Search Query'] = normalized_query
+                row['Visits'] = visits
+                row['Revenue'] = revenue
+                writer.writerow(row)
+                written += 1
+        print(f"Wrote {written} aggregated queries to {output_filename}.")
+        return written
+
+    def changed_queries(self) -> list:
+        """
+        Returns the normalized queries changed since the last acknowledged revision, in first-seen order.
+        """
+        return [row[0] for row in self._connection.execute(
+            'SELECT normalized_query FROM queries WHERE changed_in > ? ORDER BY seq', (self.acknowledged_revision,)
+        )]
+
+    def write_changed_aggregates(self, output_filename: str) -> int:
+        """
+        Writes the queries changed since the last acknowledged revision.
+        """
+        return self.write_aggregates(output_filename, changed_since=self.acknowledged_revision)
+
+    def acknowledge(self) -> None:
+        """
+        Marks every change so far as processed by the downstream stages.
+        """
+        with self._connection:
+            self._set_meta('acknowledged_revision', self.revision)
+
+    def close(self) -> None:
+        self._connection.close()
+
+def export_date(merge_arg: str, default_date: str = None) -> tuple:
+    """
+    Resolves the file and date of one --merge argument.
+
+    The date is taken from a FILE:YYYY-MM-DD argument, else from a YYYY-MM-DD date in the
+    file name, else default_date.
+
+    Args:
+        merge_arg (str): The --merge argument.
+        default_date (str): Date used when neither the argument nor the file name has one.
+
+    Returns:
+        tuple: The export file and its date, or None if no date was found.
+    """
+    filename, separator, date = merge_arg.rpartition(':')
+    if separator and DATE_PATTERN.fullmatch(date):
+        return filename, date
+    match = DATE_PATTERN.search(os.path.basename(merge_arg))
+    return merge_arg, match.group(0) if match else default_date
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge daily search term exports into the visits and revenue aggregate store.")
+    parser.add_argument('--store', default=AGGREGATE_STORE_PATH, help="Path to the aggregate store")
+    parser.add_argument('--merge', nargs='+', default=[],
+                        help="Export CSVs to merge, in date order, as FILE:YYYY-MM-DD or with the date in the file name")
+    parser.add_argument('--date', help="Date of a single merged export without one (YYYY-MM-DD, default today)")
+    parser.add_argument('--keep-days', type=int, help=f"Expire exports older than this many days before the newest (e.g. {DEFAULT_KEEP_DAYS})")
+    parser.add_argument('--output', help=f"Write every aggregated query (e.g. {LULU_TERMS_AGGREGATED_CSV})")
+    parser.add_argument('--changed-output', help="Write only the queries changed since the last --ack")
+    parser.add_argument('--ack', action='store_true', help="Mark the current changes as processed")
+    args = parser.parse_args()
+
+    # --date only stands in for one export, so a backfill is never stamped with a single date
+    default_date = args.date or datetime.date.today().isoformat() if len(args.merge) == 1 else None
+    exports = [export_date(merge_arg, default_date) for merge_arg in args.merge]
+    undated = [export_csv for export_csv, date in exports if date is None]
+    if undated:
+        parser.error(f"no date for {', '.join(undated)}; merge several exports as FILE:YYYY-MM-DD or with the date in the file name")
+
+    store = AggregateStore(args.store)
+    try:
+        for export_csv, date in exports:
+            store.merge_export(export_csv, date)
+        if args.keep_days is not None:
+            store.expire_older_than(args.keep_days)
+        if args.output:
+            store.write_aggregates(args.output)
+        if args.changed_output:
+            store.write_changed_aggregates(args.changed_output)
+        if args.ack:
+            store.acknowledge()
+    finally:
+        store.close()
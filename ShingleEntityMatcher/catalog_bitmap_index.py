@@ -0,0 +1,284 @@
+import csv
+import numpy as np
+import local_analyzer
+
+SIMPLIFIED_CATALOG_CSV = 'CatalogNormalizer/simplified_catalog.csv'
+
+# Field type of the *_t dynamic fields the catalog is ingested into (see ingest_data.py)
+CATALOG_FIELD_TYPE = 'text_general'
+
+class RowSet:
+    """
+    An immutable set of catalog row ids, stored roaring-style: a sorted uint32 array while
+    sparse, and a packed bitmap once the array would be larger than the bitmap.
+    """
+    __slots__ = ('row_count', 'ids', 'bits')
+
+    def __init__(self, row_count: int, ids=None, bits=None):
+        self.row_count = row_count
+        self.ids = ids
+        self.bits = bits
+
+    @classmethod
+    def from_ids(cls, ids, row_count: int) -> 'RowSet':
+        """
+        Creates a RowSet from sorted, unique row ids, choosing the compact container.
+        """
+        ids = np.asarray(ids, dtype=np.uint32)
+        if ids.size * 32 > row_count:
+            dense = np.zeros(row_count, dtype=bool)
+            dense[ids] = True
+            return cls(row_count, bits=np.packbits(dense))
+        return cls(row_count, ids=ids)
+
+    @classmethod
+    def empty(cls, row_count: int) -> 'RowSet':
+        return cls(row_count, ids=np.empty(0, dtype=np.uint32))
+
+    def to_bits(self) -> np.ndarray:
+        if self.bits is not None:
+            return self.bits
+        dense = np.zeros(self.row_count, dtype=bool)
+        dense[self.ids] = True
+        return np.packbits(dense)
+
+    def contains(self, ids: np.ndarray) -> np.ndarray:
+        """
+        Returns a boolean mask telling which of the given row ids are in the set.
+        """
+        if self.bits is not None:
+            return ((self.bits[ids >> 3] >> (7 - (ids & 7))) & 1).astype(bool)
+        return np.isin(ids, self.ids, assume_unique=True)
+
+    def union(self, other: 'RowSet') -> 'RowSet':
+        if self.ids is not None and other.ids is not None:
+            return RowSet.from_ids(np.union1d(self.ids, other.ids), self.row_count)
+        return RowSet(self.row_count, bits=self.to_bits() | other.to_bits())
+
+    def intersection(self, other: 'RowSet') -> 'RowSet':
+        if self.ids is not None and other.ids is not None:
+            return RowSet(self.row_count, ids=np.intersect1d(self.ids, other.ids, assume_unique=True))
+        if self.ids is not None:
+            return RowSet(self.row_count, ids=self.ids[other.contains(self.ids)])
+        if other.ids is not None:
+            return RowSet(self.row_count, ids=other.ids[self.contains(other.ids)])
+        return RowSet(self.row_count, bits=self.bits & other.bits)
+
+    def __len__(self) -> int:
+        if self.ids is not None:
+            return int(self.ids.size)
+        return int(np.unpackbits(self.bits, count=self.row_count).sum())
+
+    def __bool__(self) -> bool:
+        return bool(self.ids.size) if self.ids is not None else bool(self.bits.any())
+
+class CatalogBitmapIndex:
+    """
+    In-process co-occurrence index over the simplified catalog.
+
+    For every field it keeps the distinct analyzed values, the rows holding each value and
+    an inverted index from token to values. A field:"phrase" clause is resolved to the rows
+    whose value contains the phrase tokens at consecutive positions, mirroring the phrase
+    queries sent to the *_t fields in Solr, including the query-time synonym expansion.
+    """
+
+    def __init__(self, analyzer: local_analyzer.LocalAnalyzer = None, field_type: str = CATALOG_FIELD_TYPE):
+        analyzer = analyzer or local_analyzer.get_analyzer()
+        self.index_chain = analyzer.chain(field_type, 'index')
+        self.query_chain = analyzer.chain(field_type, 'query')
+        self.row_count = 0
+        self.field_values = {}
+        self.field_value_rows = {}
+        self.field_token_values = {}
+        self._phrase_rows = {}
+
+    @classmethod
+    def from_csv(cls, filename: str = SIMPLIFIED_CATALOG_CSV) -> 'CatalogBitmapIndex':
+        """
+        Builds the index from a simplified catalog CSV.
+
+        Args:
+            filename (str): Path to the simplified catalog CSV.
+
+        Returns:
+            CatalogBitmapIndex: The populated index.
+        """
+        print(f"Building catalog bitmap index from {filename}...")
+        index = cls()
+        value_ids = {}
+        value_rows = {}
+
+        with open(filename, mode='r', newline='', encoding='utf-8') as file:
+            reader = csv.reader(file)
+            headers = next(reader)
+            for row_id, row in enumerate(reader):
+                for field, value in zip(headers, row):
+                    if not value:
+                        continue
+                    key = (field, value)
+                    if key not in value_ids:
+                        value_ids[key] = index.add_value(field, value)
+                    value_rows.setdefault(key, []).append(row_id)
+                index.row_count = row_id + 1
+
+        for (field, value), rows in value_rows.items():
+            value_id = value_ids[(field, value)]
+            index.field_value_rows[field][value_id] = RowSet.from_ids(rows, index.row_count)
+
+        print(f"Catalog bitmap index built over {index.row_count} rows.")
+        return index
+
+    def add_value(self, field: str, value: str) -> int:
+        """
+        Registers a distinct field value and its analyzed tokens.
+
+        Args:
+            field (str): The catalog field (column) name.
+            value (str): The raw field value.
+
+        Returns:
+            int: The id of the value within its field.
+        """
+        tokens = self.index_chain.analyze_tokens(value)
+        positions = []
+        position = 0
+        for token in tokens:
+            position += token.position_increment
+            positions.append((position, token.text))
+
+        values = self.field_values.setdefault(field, [])
+        self.field_value_rows.setdefault(field, [])
+        token_values = self.field_token_values.setdefault(field, {})
+
+        value_id = len(values)
+        values.append(tuple(positions))
+        self.field_value_rows[field].append(None)
+        for _, text in positions:
+            token_values.setdefault(text, set()).add(value_id)
+        return value_id
+
+    def query_phrases(self, phrase: str) -> list:
+        """
+        Analyzes a phrase with the query analyzer and returns every token path through the
+        resulting graph (one path per synonym alternative).
+
+        Args:
+            phrase (str): The raw phrase.
+
+        Returns:
+            list: Tuples of token texts, one per alternative phrase.
+        """
+        tokens_by_position = {}
+        position = 0
+        for token in self.query_chain.analyze_tokens(phrase):
+            position += token.position_increment
+            tokens_by_position.setdefault(position, []).append(token)
+        if not tokens_by_position:
+            return []
+
+        last_position = max(tokens_by_position)
+        paths = []
+        stack = [(min(tokens_by_position), ())]
+        while stack:
+            position, path = stack.pop()
+            if position > last_position or position not in tokens_by_position:
+                paths.append(path)
+                continue
+            for token in reversed(tokens_by_position[position]):
+                stack.append((position + token.position_length, path + (token.text,)))
+        return paths
+
+    def phrase_rows(self, field: str, phrase: str) -> RowSet:
+        """
+        Returns the rows whose field matches field:"phrase" (memoized).
+
+        Args:
+            field (str): The catalog field (column) name.
+            phrase (str): The raw, unescaped phrase.
+
+        Returns:
+            RowSet: The matching rows.
+        """
+        key = (field, phrase)
+        if key in self._phrase_rows:
+            return self._phrase_rows[key]
+
+        rows = RowSet.empty(self.row_count)
+        values = self.field_values.get(field, [])
+        token_values = self.field_token_values.get(field, {})
+
+        matching_value_ids = set()
+        for path in self.query_phrases(phrase):
+            candidates = set.intersection(*(token_values.get(text, set()) for text in path)) if path else set()
+            for value_id in candidates - matching_value_ids:
+                if contains_phrase(values[value_id], path):
+                    matching_value_ids.add(value_id)
+
+        for value_id in sorted(matching_value_ids):
+            rows = rows.union(self.field_value_rows[field][value_id])
+
+        self._phrase_rows[key] = rows
+        return rows
+
+    def row_exists(self, clause_groups: list) -> bool:
+        """
+        Evaluates an AND of OR groups of field:"phrase" clauses against single catalog rows.
+
+        Args:
+            clause_groups (list): Groups of (field, phrase) clauses; a row must match at least
+                                  one clause of every group.
+
+        Returns:
+            bool: True if at least one row matches every group.
+        """
+        if not clause_groups:
+            return False
+
+        group_rows = []
+        for group in clause_groups:
+            rows = RowSet.empty(self.row_count)
+            for field, phrase in group:
+                rows = rows.union(self.phrase_rows(field, phrase))
+            if not rows:
+                return False
+            group_rows.append(rows)
+
+        # Intersect the most selective groups first and stop as soon as nothing is left
+        group_rows.sort(key=len)
+        matching = group_rows[0]
+        for rows in group_rows[1:]:
+            matching = matching.intersection(rows)
+            if not matching:
+                return False
+        return bool(matching)
+
+def contains_phrase(value_positions: tuple, path: tuple) -> bool:
+    """
+    Checks whether the path's tokens occur at consecutive positions in an analyzed value.
+
+    Args:
+        value_positions (tuple): (position, text) pairs of the analyzed value.
+        path (tuple): The phrase tokens.
+
+    Returns:
+        bool: True if the phrase occurs in the value.
+    """
+    texts_by_position = {}
+    for position, text in value_positions:
+        texts_by_position.setdefault(position, set()).add(text)
+
+    for position, text in value_positions:
+        if text == path[0] and all(path[offset] in texts_by_position.get(position + offset, ()) for offset in range(1, len(path))):
+            return True
+    return False
+
+_default_index = None
+
+def get_index() -> CatalogBitmapIndex:
+    """
+    Returns the process-wide catalog index, building it from the simplified catalog on first use.
+    """
+    global _default_index
+    if _default_index is None:
+        _default_index = CatalogBitmapIndex.from_csv(SIMPLIFIED_CATALOG_CSV)
+    return _default_index
@@ -1,10 +1,30 @@
+import hashlib
+import os
+import pickle
 import pysolr
 import re
+import requests
+import catalog_bitmap_index
+import instrumentation
+import lru_memo
 
 # Connect to the Solr server
 solr_url = 'http://localhost:8983/solr/catalog_core'
 solr = pysolr.Solr(solr_url, always_commit=True)
 
+# Engine used to answer row checks: "solr" queries catalog_core, "bitmap" intersects the
+# in-process row bitmaps of catalog_bitmap_index (no Solr process needed)
+CATALOG_CHECK_ENGINE = "solr"
+
+# Row check verdicts are memoized by their canonical clause groups, so queries whose tokens
+# resolve to the same clauses in any order are only checked once
+VERDICT_CACHE_SIZE = 200000
+verdict_cache = lru_memo.LruMemo(VERDICT_CACHE_SIZE)
+
+# Set to True to keep verdicts between runs; they are discarded when the catalog changes
+PERSIST_VERDICTS = False
+VERDICT_CACHE_PATH = 'ShingleEntityMatcher/catalog_verdicts.pickle'
+
 def escape_solr_query(value: str) -> str:
     """
     Escapes special characters in a Solr query string to avoid syntax errors.
@@ -18,43 +38,154 @@ def escape_solr_query(value: str) -> str:
     # Use regex to escape special Solr characters
     return re.sub(r'([+\-&|!(){}[\]^"~*?:\\])', r'\\\1', value)
 
-def check_normalized_values_in_row(values: list, shingles_dict: dict) -> bool:
+def build_clause_groups(values: list, shingles_dict: dict, include_normalized: bool) -> list:
     """
-    Checks if a set of normalized values exist in the same row in Solr.
+    Builds one OR group of (field, value) clauses per value found in the shingles dictionary.
 
     Args:
         values (list): List of values to check.
         shingles_dict (dict): Dictionary containing shingles information.
+        include_normalized (bool): Whether entries added by normalization (with a non-empty filter) are included.
 
     Returns:
-        bool: True if there are any rows in Solr that match the query, otherwise False.
+        list: The OR groups, one per value that produced at least one clause.
     """
-    query_parts = []
+    clause_groups = []
 
-    # Build Solr query parts based on shingles_dict entries
+    # Build clause groups based on shingles_dict entries
     for value in values:
         if value in shingles_dict:
-            value_queries = []
+            value_clauses = []
             for item in shingles_dict[value]:
-                val, _, entity_type, _ = item
-                # Append _t to entity_type to match Solr field names
-                entity_type_t = f"{entity_type}_t"
-                # Escape the value to prevent Solr syntax errors
-                escaped_val = escape_solr_query(val)
-                value_queries.append(f'{entity_type_t}:"{escaped_val}"')
-            if value_queries:
-                # Combine multiple value queries using OR
-                query_parts.append(f'({" OR ".join(value_queries)})')
-
-    # Combine all query parts into a single Solr query using AND
-    combined_query = " AND ".join(query_parts)
-
-    # Perform the Solr query
-    results = solr.search(combined_query, rows=200000)
-
-    # Check if any rows matched the query
-    rows_found = len(results)
-    return rows_found > 0
+                val, _, entity_type, filter = item
+                if include_normalized or filter == "":
+                    value_clauses.append((entity_type, val))
+            if value_clauses:
+                clause_groups.append(value_clauses)
+
+    return clause_groups
+
+def build_query_parts(clause_groups: list) -> list:
+    """
+    Formats clause groups as Solr query parts, one parenthesized OR group each.
+
+    Args:
+        clause_groups (list): Groups of (field, value) clauses.
+
+    Returns:
+        list: The Solr query parts.
+    """
+    query_parts = []
+    for value_clauses in clause_groups:
+        value_queries = []
+        for entity_type, val in value_clauses:
+            # Append _t to entity_type to match Solr field names
+            entity_type_t = f"{entity_type}_t"
+            # Escape the value to prevent Solr syntax errors
+            escaped_val = escape_solr_query(val)
+            value_queries.append(f'{entity_type_t}:"{escaped_val}"')
+        # Combine multiple value queries using OR
+        query_parts.append(f'({" OR ".join(value_queries)})')
+    return query_parts
+
+def catalog_row_exists(clause_groups: list) -> bool:
+    """
+    Checks whether at least one catalog row satisfies every OR group.
+
+    With the Solr engine, each group is sent as its own filter query so Solr's filterCache
+    can reuse it across search queries, and no documents are requested: only numFound is read.
+
+    Args:
+        clause_groups (list): Groups of (field, value) clauses that must all match the same row.
+
+    Returns:
+        bool: True if there are any rows in the catalog that match all groups, otherwise False.
+    """
+    # An empty query matches nothing in Solr, so there is nothing to ask
+    if not clause_groups:
+        return False
+
+    key = canonical_clause_groups(clause_groups)
+    verdict = verdict_cache.get(key)
+    if verdict is None:
+        if CATALOG_CHECK_ENGINE == "bitmap":
+            with instrumentation.recorder.timed("bitmap.row_exists"):
+                verdict = catalog_bitmap_index.get_index().row_exists(clause_groups)
+        else:
+            with instrumentation.recorder.timed("solr.select"):
+                verdict = solr.search('*:*', fq=build_query_parts(clause_groups), rows=0).hits > 0
+        verdict_cache.put(key, verdict)
+    return verdict
+
+def canonical_clause_groups(clause_groups: list) -> frozenset:
+    """
+    Returns an order- and duplicate-insensitive key for an AND of OR groups.
+
+    Args:
+        clause_groups (list): Groups of (field, value) clauses.
+
+    Returns:
+        frozenset: The set of groups, each as a set of clauses.
+    """
+    return frozenset(frozenset(group) for group in clause_groups)
+
+def catalog_fingerprint() -> str:
+    """
+    Identifies the catalog the verdicts were computed against: the simplified catalog file
+    for the bitmap engine, or the index version of catalog_core for Solr.
+
+    Returns:
+        str: The fingerprint.
+    """
+    if CATALOG_CHECK_ENGINE == "bitmap":
+        with open(catalog_bitmap_index.SIMPLIFIED_CATALOG_CSV, 'rb') as file:
+            return f"bitmap:{hashlib.sha256(file.read()).hexdigest()}"
+
+    response = requests.get(f'{solr.url}/admin/luke', params={'numTerms': 0, 'wt': 'json'}, timeout=30)
+    response.raise_for_status()
+    return f"solr:{response.json()['index']['version']}"
+
+def load_verdicts(path: str = VERDICT_CACHE_PATH) -> None:
+    """
+    Loads verdicts saved by an earlier run, if they were computed against the current catalog.
+
+    Args:
+        path (str): Path to the saved verdicts.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb') as file:
+        saved = pickle.load(file)
+    if saved.get('fingerprint') == catalog_fingerprint():
+        verdict_cache.update(saved['verdicts'])
+        print(f"Loaded {len(saved['verdicts'])} catalog verdicts from {path}.")
+    else:
+        print(f"Ignoring catalog verdicts in {path}: the catalog has changed.")
+
+def save_verdicts(path: str = VERDICT_CACHE_PATH) -> None:
+    """
+    Saves the memoized verdicts together with the current catalog fingerprint.
+
+    Args:
+        path (str): Path to save the verdicts to.
+    """
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'wb') as file:
+        pickle.dump({'fingerprint': catalog_fingerprint(), 'verdicts': verdict_cache.items()}, file)
+    os.replace(temp_path, path)
+
+def check_normalized_values_in_row(values: list, shingles_dict: dict) -> bool:
+    """
+    Checks if a set of normalized values exist in the same row in Solr.
+
+    Args:
+        values (list): List of values to check.
+        shingles_dict (dict): Dictionary containing shingles information.
+
+    Returns:
+        bool: True if there are any rows in Solr that match the query, otherwise False.
+    """
+    return catalog_row_exists(build_clause_groups(values, shingles_dict, include_normalized=True))
 
 def check_unnormalized_values_in_row(values: list, shingles_dict: dict) -> bool:
     """
@@ -67,32 +198,4 @@ def check_unnormalized_values_in_row(values: list, shingles_dict: dict) -> bool:
     Returns:
         bool: True if there are any rows in Solr that match the query, otherwise False.
     """
-    query_parts = []
-
-    # Build Solr query parts based on shingles_dict entries
-    for value in values:
-        if value in shingles_dict:
-            value_queries = []
-            for item in shingles_dict[value]:
-                val, _, entity_type, filter = item
-                if filter == "":
-                    # Append _t to entity_type to match Solr field names
-                    entity_type_t = f"{entity_type}_t"
-                    # Escape the value to prevent Solr syntax errors
-                    escaped_val = escape_solr_query(val)
-                    value_queries.append(f'{entity_type_t}:"{escaped_val}"')
-            if value_queries:
-                # Combine multiple value queries using OR
-                query_parts.append(f'({" OR ".join(value_queries)})')
-
-    # Combine all query parts into a single Solr query using AND
-    combined_query = " AND ".join(query_parts)
-    # Optionally, print the combined query for debugging purposes
-    # print(f"Combined Solr Query: {combined_query}")
-
-    # Perform the Solr query
-    results = solr.search(combined_query, rows=200000)
-
-    # Check if any rows matched the query
-    rows_found = len(results)
-    return rows_found > 0
+    return catalog_row_exists(build_clause_groups(values, shingles_dict, include_normalized=False))
@@ -1,16 +1,44 @@
-import pysolr
+import argparse
 import csv
+import hashlib
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import pysolr
+import requests
+from requests.adapters import HTTPAdapter
 
 # Initialize Solr client with increased timeout
 SOLR_URL = 'http://localhost:8983/solr/catalog_core'
 solr = pysolr.Solr(SOLR_URL, always_commit=True, timeout=60)
 
+# Parallel ingest: documents per /update request, concurrent requests, and the commitWithin
+# (in milliseconds) sent with every batch; None relies on the single commit at the end
+INGEST_BATCH_SIZE = 5000
+INGEST_WORKERS = 4
+COMMIT_WITHIN_MS = None
+INGEST_TIMEOUT = 300
+
+# Ids of the rows indexed by the last incremental ingest, one per line
+MANIFEST_PATH = 'ShingleEntityMatcher/ingest_manifest.txt'
+
+# Prefix of the content-hash ids assigned by the incremental ingest
+ROW_ID_PREFIX = 'row-'
+
+# Ids per cursorMark page when listing the indexed rows of catalog_core
+ID_PAGE_SIZE = 10000
+
 def delete_all_documents() -> None:
     """
     Deletes all documents in the Solr collection.
     """
     solr.delete(q='*:*')
     solr.commit()
+    # The incremental manifest no longer describes the core
+    if os.path.exists(MANIFEST_PATH):
+        os.remove(MANIFEST_PATH)
     print("All documents deleted successfully.")
 
 def convert_to_dynamic_fields(document: dict) -> dict:
@@ -58,5 +86,292 @@ def read_and_ingest_to_solr(filename: str, batch_size: int = 100) -> None:
 
     print("Data ingested into Solr successfully.")
 
+def iter_document_batches(filename: str, batch_size: int = INGEST_BATCH_SIZE):
+    """
+    Streams the catalog CSV as batches of dynamic-field documents.
+
+    Args:
+        filename (str): Path to the CSV file containing the data.
+        batch_size (int): Number of documents per batch.
+
+    Yields:
+        list: The next batch of documents.
+    """
+    with open(filename, mode='r', newline='', encoding='utf-8') as file:
+        reader = csv.reader(file)
+        headers = next(reader)  # Read the header row to get field names
+
+        documents = []
+        for row in reader:
+            document = {headers[i]: row[i] for i in range(len(headers))}
+            documents.append(convert_to_dynamic_fields(document))
+            if len(documents) >= batch_size:
+                yield documents
+                documents = []
+        if documents:
+            yield documents
+
+def create_update_session(workers: int = INGEST_WORKERS) -> requests.Session:
+    """
+    Creates an HTTP session with one pooled connection per ingest worker.
+
+    Update requests are not retried, since documents without an id would be added twice.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def post_update(session: requests.Session, payload, commit_within_ms: int = COMMIT_WITHIN_MS) -> None:
+    """
+    Sends one JSON command to the /update handler without committing.
+
+    Args:
+        session (requests.Session): The pooled HTTP session.
+        payload (list or dict): A list of documents to add, or a JSON update command.
+        commit_within_ms (int): Optional commitWithin for the request, in milliseconds.
+    """
+    params = {'wt': 'json'}
+    if commit_within_ms is not None:
+        params['commitWithin'] = commit_within_ms
+    response = session.post(
+        f'{SOLR_URL}/update',
+        params=params,
+        data=json.dumps(payload, ensure_ascii=False).encode('utf-8'),
+        headers={'Content-Type': 'application/json'},
+        timeout=INGEST_TIMEOUT
+    )
+    response.raise_for_status()
+
+def post_documents(session: requests.Session, documents: list, commit_within_ms: int = COMMIT_WITHIN_MS) -> int:
+    """
+    Sends one batch of documents to the JSON /update handler without committing.
+
+    Args:
+        session (requests.Session): The pooled HTTP session.
+        documents (list): The documents to add.
+        commit_within_ms (int): Optional commitWithin for the batch, in milliseconds.
+
+    Returns:
+        int: The number of documents sent.
+    """
+    post_update(session, documents, commit_within_ms)
+    return len(documents)
+
+def commit(session: requests.Session) -> None:
+    """
+    Issues a hard commit, making every update sent so far visible at once.
+    """
+    session.get(f'{SOLR_URL}/update', params={'commit': 'true', 'wt': 'json'}, timeout=INGEST_TIMEOUT).raise_for_status()
+
+def send_batches(session: requests.Session, batches, workers: int = INGEST_WORKERS,
+                 commit_within_ms: int = COMMIT_WITHIN_MS) -> int:
+    """
+    Posts document batches concurrently, holding at most two batches per worker in memory.
+
+    Args:
+        session (requests.Session): The pooled HTTP session.
+        batches (iterable): Lists of documents.
+        workers (int): Number of concurrent /update requests.
+        commit_within_ms (int): Optional commitWithin sent with every batch, in milliseconds.
+
+    Returns:
+        int: The number of documents sent.
+    """
+    start_time = time.perf_counter()
+    ingested = 0
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for documents in batches:
+            pending.append(executor.submit(post_documents, session, documents, commit_within_ms))
+            if len(pending) >= 2 * workers:
+                ingested += pending.popleft().result()
+                elapsed = time.perf_counter() - start_time
+                print(f"Ingested {ingested} documents ({ingested / elapsed:.0f} docs/s)")
+        while pending:
+            ingested += pending.popleft().result()
+
+    return ingested
+
+def ingest_parallel(filename: str, batch_size: int = INGEST_BATCH_SIZE, workers: int = INGEST_WORKERS,
+                    commit_within_ms: int = COMMIT_WITHIN_MS) -> None:
+    """
+    Reindexes the catalog by streaming large JSON batches to /update from several threads,
+    followed by a single hard commit.
+
+    Args:
+        filename (str): Path to the CSV file containing the data.
+        batch_size (int): Number of documents per /update request.
+        workers (int): Number of concurrent /update requests.
+        commit_within_ms (int): Optional commitWithin sent with every batch, in milliseconds.
+    """
+    delete_all_documents()  # Ensure Solr is cleared before ingesting new data
+    print(f"Reading data from catalog and ingesting into Solr with {workers} workers...")
+
+    session = create_update_session(workers)
+    start_time = time.perf_counter()
+    ingested = send_batches(session, iter_document_batches(filename, batch_size), workers, commit_within_ms)
+    commit(session)
+
+    elapsed = time.perf_counter() - start_time
+    print(f"Data ingested into Solr successfully: {ingested} documents in {elapsed:.1f}s "
+          f"({ingested / elapsed if elapsed else 0:.0f} docs/s).")
+
+def iter_identified_rows(filename: str):
+    """
+    Streams the catalog CSV as (document id, document) pairs with stable, content-derived ids.
+
+    The id is a hash of the header and the row values, suffixed with the occurrence number
+    of that content, so identical rows keep distinct documents and a row keeps its id
+    wherever it moves in the file.
+
+    Args:
+        filename (str): Path to the CSV file containing the data.
+
+    Yields:
+        tuple: The document id and the dynamic-field document without the id.
+    """
+    occurrences = {}
+    with open(filename, mode='r', newline='', encoding='utf-8') as file:
+        reader = csv.reader(file)
+        headers = next(reader)
+        header_digest = hashlib.sha1('\x1f'.join(headers).encode('utf-8'))
+
+        for row in reader:
+            digest = header_digest.copy()
+            digest.update(b'\x1e')
+            digest.update('\x1f'.join(row).encode('utf-8'))
+            content_hash = digest.hexdigest()
+            occurrence = occurrences.get(content_hash, 0)
+            occurrences[content_hash] = occurrence + 1
+
+            document = {headers[i]: row[i] for i in range(len(headers))}
+            yield f"{ROW_ID_PREFIX}{content_hash}-{occurrence}", convert_to_dynamic_fields(document)
+
+def load_manifest(manifest_path: str = MANIFEST_PATH):
+    """
+    Reads the ids recorded by the last incremental ingest.
+
+    Returns:
+        set or None: The indexed ids, or None if there is no manifest.
+    """
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, mode='r', encoding='utf-8') as file:
+        return {line.rstrip('\n') for line in file if line.strip()}
+
+def save_manifest(document_ids: list, manifest_path: str = MANIFEST_PATH) -> None:
+    """
+    Atomically replaces the manifest with the given ids.
+    """
+    temp_path = f'{manifest_path}.tmp'
+    with open(temp_path, mode='w', encoding='utf-8') as file:
+        for document_id in document_ids:
+            file.write(f'{document_id}\n')
+    os.replace(temp_path, manifest_path)
+
+def fetch_indexed_ids(session: requests.Session, page_size: int = ID_PAGE_SIZE) -> set:
+    """
+    Lists the content-hash ids indexed in catalog_core, paging through them with cursorMark.
+
+    Args:
+        session (requests.Session): The pooled HTTP session.
+        page_size (int): Number of ids per page.
+
+    Returns:
+        set: The indexed ids that start with ROW_ID_PREFIX.
+    """
+    indexed_ids = set()
+    cursor_mark = '*'
+    while True:
+        response = session.get(f'{SOLR_URL}/select', params={
+            'q': f'{{!prefix f=id}}{ROW_ID_PREFIX}',
+            'fl': 'id',
+            'sort': 'id asc',
+            'rows': page_size,
+            'cursorMark': cursor_mark,
+            'wt': 'json',
+        }, timeout=INGEST_TIMEOUT)
+        response.raise_for_status()
+        result = response.json()
+        indexed_ids.update(document['id'] for document in result['response']['docs'])
+        if result['nextCursorMark'] == cursor_mark:
+            return indexed_ids
+        cursor_mark = result['nextCursorMark']
+
+def ingest_incremental(filename: str, manifest_path: str = MANIFEST_PATH, batch_size: int = INGEST_BATCH_SIZE,
+                       workers: int = INGEST_WORKERS, reconcile: bool = False) -> None:
+    """
+    Brings catalog_core in line with the catalog CSV by adding only new rows and deleting
+    only removed ones, then committing once, so the core stays queryable throughout.
+
+    Without a manifest (or with reconcile) the indexed ids are listed from the core instead,
+    so documents of rows removed since a lost or stale manifest are still deleted, and
+    documents without a content-hash id (left by a full ingest) are deleted in the same commit.
+
+    Args:
+        filename (str): Path to the CSV file containing the data.
+        manifest_path (str): Path to the manifest of indexed ids.
+        batch_size (int): Number of documents per /update request.
+        workers (int): Number of concurrent /update requests.
+        reconcile (bool): Whether to list the indexed ids from the core even if there is a manifest.
+    """
+    start_time = time.perf_counter()
+    session = create_update_session(workers)
+    indexed_ids = None if reconcile else load_manifest(manifest_path)
+    from_manifest = indexed_ids is not None
+    if from_manifest:
+        print("Comparing catalog with the ingest manifest...")
+    else:
+        print("Listing the rows indexed in catalog_core...")
+        indexed_ids = fetch_indexed_ids(session)
+
+    current_ids = [document_id for document_id, _ in iter_identified_rows(filename)]
+    current_id_set = set(current_ids)
+    removed_ids = sorted(indexed_ids - current_id_set)
+
+    def new_document_batches():
+        documents = []
+        for document_id, document in iter_identified_rows(filename):
+            if document_id not in indexed_ids:
+                document['id'] = document_id
+                documents.append(document)
+                if len(documents) >= batch_size:
+                    yield documents
+                    documents = []
+        if documents:
+            yield documents
+
+    added = send_batches(session, new_document_batches(), workers)
+
+    for i in range(0, len(removed_ids), batch_size):
+        post_update(session, {'delete': removed_ids[i:i + batch_size]})
+    if not from_manifest:
+        post_update(session, {'delete': {'query': f'*:* -id:{ROW_ID_PREFIX}*'}})
+
+    commit(session)
+    save_manifest(current_ids, manifest_path)
+
+    elapsed = time.perf_counter() - start_time
+    print(f"Incremental ingest completed in {elapsed:.1f}s: {added} added, {len(removed_ids)} deleted, "
+          f"{len(current_id_set) - added} unchanged.")
+
 if __name__ == "__main__":
-    read_and_ingest_to_solr('CatalogNormalizer/simplified_catalog.csv')
+    parser = argparse.ArgumentParser(description="Reindex the simplified catalog into catalog_core.")
+    parser.add_argument('--input', default='CatalogNormalizer/simplified_catalog.csv', help="Catalog CSV to ingest")
+    parser.add_argument('--serial', action='store_true', help="Use the original serial ingest with per-batch commits")
+    parser.add_argument('--incremental', action='store_true', help="Only add new rows and delete removed ones, using the manifest")
+    parser.add_argument('--reconcile', action='store_true', help="With --incremental, list the indexed rows from the core instead of trusting the manifest")
+    parser.add_argument('--batch-size', type=int, default=INGEST_BATCH_SIZE, help="Documents per /update request")
+    parser.add_argument('--workers', type=int, default=INGEST_WORKERS, help="Concurrent /update requests")
+    parser.add_argument('--commit-within', type=int, default=COMMIT_WITHIN_MS, help="commitWithin per batch, in milliseconds")
+    args = parser.parse_args()
+
+    if args.serial:
+        read_and_ingest_to_solr(args.input)
+    elif args.incremental:
+        ingest_incremental(args.input, batch_size=args.batch_size, workers=args.workers, reconcile=args.reconcile)
+    else:
+        ingest_parallel(args.input, args.batch_size, args.workers, args.commit_within)
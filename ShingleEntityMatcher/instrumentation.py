@@ -0,0 +1,332 @@
+import bisect
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Upper bounds (in milliseconds) of the latency histogram buckets; slower calls go in an overflow bucket
+LATENCY_BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Number of functions listed in the text summary written next to each profile
+PROFILE_TOP_FUNCTIONS = 40
+
+class LatencyHistogram:
+    """
+    Counts call latencies in fixed buckets, with their total and maximum.
+    """
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, milliseconds: float) -> None:
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, milliseconds)] += 1
+        self.count += 1
+        self.total_ms += milliseconds
+        self.max_ms = max(self.max_ms, milliseconds)
+
+    def merge(self, other: 'LatencyHistogram') -> None:
+        for index, bucket_count in enumerate(other.buckets):
+            self.buckets[index] += bucket_count
+        self.count += other.count
+        self.total_ms += other.total_ms
+        self.max_ms = max(self.max_ms, other.max_ms)
+
+    def percentile(self, fraction: float) -> float:
+        """
+        Returns the upper bound of the bucket holding the given fraction of the calls
+        (the maximum latency for the overflow bucket).
+        """
+        if not self.count:
+            return 0.0
+        threshold = fraction * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if seen >= threshold:
+                return LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def to_dict(self) -> dict:
+        bucket_labels = [f"<={bound}ms" for bound in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+        return {
+            "count": self.count,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "buckets": {label: bucket_count for label, bucket_count in zip(bucket_labels, self.buckets) if bucket_count},
+        }
+
+class StageRecord:
+    """
+    The measurements of one pipeline stage. Callers set rows once they know how many rows the stage handled.
+    """
+
+    def __init__(self, name: str, depth: int):
+        self.name = name
+        self.depth = depth
+        self.rows = None
+        self.wall_seconds = 0.0
+        self.counters = {}
+        self.peak_rss_bytes = 0
+        self.tracemalloc_peak_bytes = None
+        self.profile_path = None
+
+    def to_dict(self) -> dict:
+        stage = {
+            "name": self.name,
+            "depth": self.depth,
+            "wall_seconds": round(self.wall_seconds, 6),
+            "rows": self.rows,
+            "rows_per_second": round(self.rows / self.wall_seconds, 1) if self.rows is not None and self.wall_seconds else None,
+            "counters": self.counters,
+            "peak_rss_bytes": self.peak_rss_bytes,
+        }
+        if self.tracemalloc_peak_bytes is not None:
+            stage["tracemalloc_peak_bytes"] = self.tracemalloc_peak_bytes
+        if self.profile_path:
+            stage["profile"] = self.profile_path
+        return stage
+
+def peak_rss_bytes() -> int:
+    """
+    Returns the peak resident set size of this process and its finished children.
+    """
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) * scale
+
+class RunRecorder:
+    """
+    Collects stage timings, call counters, latency histograms and cache hit rates for one
+    pipeline run, and renders them as a JSON report.
+
+    Counters and histograms may be updated from worker threads. Forked worker processes
+    start from reset_metrics() and send their snapshot() back to be merged.
+    """
+
+    def __init__(self):
+        self.profile_dir = None
+        self.trace_memory = False
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Discards everything recorded so far.
+        """
+        self.started_at = datetime.now(timezone.utc)
+        self.stages = []
+        self._stage_stack = []
+        self.reset_metrics()
+
+    def reset_metrics(self) -> None:
+        """
+        Discards the counters, histograms and cache totals, keeping the stages.
+        """
+        with self._lock:
+            self.counters = {}
+            self.histograms = {}
+            self.caches = {}
+
+    def configure(self, profile_dir: str = None, trace_memory: bool = False) -> None:
+        """
+        Enables per-stage cProfile dumps and tracemalloc peaks for the following stages.
+
+        Args:
+            profile_dir (str): Directory for the profile dumps, or None to disable profiling.
+            trace_memory (bool): Whether to trace Python allocations (slows the run down noticeably).
+        """
+        self.profile_dir = profile_dir
+        self.trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name: str, seconds: float) -> None:
+        """
+        Counts one call of the given kind and adds its latency to the kind's histogram.
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = LatencyHistogram()
+            histogram.observe(seconds * 1000)
+
+    @contextmanager
+    def timed(self, name: str):
+        """
+        Times the enclosed call and records it with observe().
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def record_cache(self, label: str, hits: int, misses: int) -> None:
+        """
+        Adds hit and miss counts to a cache's totals.
+        """
+        with self._lock:
+            total_hits, total_misses = self.caches.get(label, (0, 0))
+            self.caches[label] = (total_hits + hits, total_misses + misses)
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Measures the enclosed pipeline stage: wall time, the counters it incremented and the
+        memory peak. Nested stages are recorded as "outer / inner". With a profile directory
+        configured, outermost stages are also profiled with cProfile.
+
+        Yields:
+            StageRecord: The stage's record, whose rows the caller may set.
+        """
+        parent = self._stage_stack[-1] if self._stage_stack else None
+        full_name = f"{parent.name} / {name}" if parent else name
+        record = StageRecord(full_name, len(self._stage_stack))
+        self.stages.append(record)
+        self._stage_stack.append(record)
+
+        with self._lock:
+            counters_before = dict(self.counters)
+        if self.trace_memory:
+            # Resetting the peak would hide the parent's peak so far, so credit it to the parent first
+            record.tracemalloc_peak_bytes = 0
+            if parent:
+                parent.tracemalloc_peak_bytes = max(parent.tracemalloc_peak_bytes or 0, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        profiler = cProfile.Profile() if self.profile_dir and record.depth == 0 else None
+
+        start = time.perf_counter()
+        if profiler:
+            profiler.enable()
+        try:
+            yield record
+        finally:
+            if profiler:
+                profiler.disable()
+            record.wall_seconds = time.perf_counter() - start
+            self._stage_stack.pop()
+
+            with self._lock:
+                record.counters = {
+                    counter: value - counters_before.get(counter, 0)
+                    for counter, value in self.counters.items()
+                    if value != counters_before.get(counter, 0)
+                }
+            record.peak_rss_bytes = peak_rss_bytes()
+            if self.trace_memory:
+                record.tracemalloc_peak_bytes = max(record.tracemalloc_peak_bytes or 0, tracemalloc.get_traced_memory()[1])
+                if parent:
+                    parent.tracemalloc_peak_bytes = max(parent.tracemalloc_peak_bytes or 0, record.tracemalloc_peak_bytes)
+            if profiler:
+                record.profile_path = self._dump_profile(profiler, full_name)
+
+    def _dump_profile(self, profiler: cProfile.Profile, stage_name: str) -> str:
+        """
+        Writes a stage's profile in pstats format, plus a text summary sorted by cumulative time.
+
+        Returns:
+            str: Path to the pstats dump.
+        """
+        os.makedirs(self.profile_dir, exist_ok=True)
+        slug = re.sub(r'[^a-z0-9]+', '_', stage_name.lower()).strip('_')
+        profile_path = os.path.join(self.profile_dir, f'{slug}.prof')
+        profiler.dump_stats(profile_path)
+
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(PROFILE_TOP_FUNCTIONS)
+        with open(os.path.join(self.profile_dir, f'{slug}.txt'), mode='w', encoding='utf-8') as summary_file:
+            summary_file.write(summary.getvalue())
+        return profile_path
+
+    def snapshot(self) -> tuple:
+        """
+        Returns the counters, histograms and cache totals, to be merged into another process's recorder.
+        """
+        with self._lock:
+            return dict(self.counters), dict(self.histograms), dict(self.caches)
+
+    def merge(self, snapshot: tuple) -> None:
+        """
+        Adds a snapshot taken in another process to this recorder.
+        """
+        counters, histograms, caches = snapshot
+        for name, amount in counters.items():
+            self.count(name, amount)
+        with self._lock:
+            for name, histogram in histograms.items():
+                self.histograms.setdefault(name, LatencyHistogram()).merge(histogram)
+        for label, (hits, misses) in caches.items():
+            self.record_cache(label, hits, misses)
+
+    def report(self, **run_info) -> dict:
+        """
+        Returns the run report.
+
+        Args:
+            **run_info: Extra top-level fields (e.g. the number of workers).
+        """
+        with self._lock:
+            report = {
+                "started_at": self.started_at.isoformat(),
+                "command": sys.argv,
+                **run_info,
+                "stages": [stage.to_dict() for stage in self.stages],
+                "counters": dict(sorted(self.counters.items())),
+                "latency": {name: histogram.to_dict() for name, histogram in sorted(self.histograms.items())},
+                "caches": {
+                    label: {"hits": hits, "misses": misses, "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0}
+                    for label, (hits, misses) in self.caches.items()
+                },
+                "memory": {"peak_rss_bytes": peak_rss_bytes()},
+            }
+        if tracemalloc.is_tracing():
+            # Stages reset the tracemalloc peak, so the run's peak is the largest of theirs
+            current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+            stage_peaks = [stage.tracemalloc_peak_bytes or 0 for stage in self.stages]
+            report["memory"]["tracemalloc_current_bytes"] = current_bytes
+            report["memory"]["tracemalloc_peak_bytes"] = max([peak_bytes] + stage_peaks)
+        return report
+
+    def write_report(self, path: str, **run_info) -> None:
+        """
+        Writes the run report as JSON and prints a one-line summary per stage.
+
+        Args:
+            path (str): Path to the JSON report.
+            **run_info: Extra top-level fields (e.g. the number of workers).
+        """
+        report = self.report(**run_info)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, mode='w', encoding='utf-8') as report_file:
+            json.dump(report, report_file, indent=2)
+
+        for stage in report["stages"]:
+            rate = f", {stage['rows_per_second']:.0f} rows/s" if stage["rows_per_second"] is not None else ""
+            print(f"{'  ' * stage['depth']}{stage['name']}: {stage['wall_seconds']:.2f}s{rate}")
+        print(f"Run report written to {path}")
+
+# Process-wide recorder shared by the pipeline modules
+recorder = RunRecorder()
@@ -0,0 +1,1068 @@
+import argparse
+import csv
+import functools
+import os
+import re
+import xml.etree.ElementTree as ET
+
+SCHEMA_PATH = 'ShingleEntityMatcher/solr-8.11.3/server/solr/catalog_core/conf/managed-schema'
+
+POSITION_LENGTH_KEY = 'org.apache.lucene.analysis.tokenattributes.PositionLengthAttribute#positionLength'
+
+# Characters for which Java's Character.isWhitespace is true (non-breaking spaces are excluded)
+JAVA_WHITESPACE = '\t\n\x0b\x0c\r\x1c-\x1f \u1680\u2000-\u2006\u2008-\u200a\u2028\u2029\u205f\u3000'
+WHITESPACE_TOKEN_PATTERN = re.compile(f'[^{JAVA_WHITESPACE}]+')
+MAX_TOKEN_LENGTH = 255
+
+# Approximation of the UAX#29 word boundaries used by StandardTokenizer: runs of word
+# characters, joined by apostrophes/periods (letters or digits), colons (letters) or
+# commas/semicolons (digits)
+STANDARD_TOKEN_PATTERN = re.compile(
+    r"\w+(?:(?:[.'\u2019]|(?<=[^\W\d_]):(?=[^\W\d_])|(?<=\d)[,;](?=\d))\w+)*"
+)
+
+class Token:
+    """
+    A token flowing through an analysis chain, with the attributes Solr reports per phase.
+    """
+    __slots__ = ('text', 'start', 'end', 'position_increment', 'position_length', 'type', 'history')
+
+    def __init__(self, text: str, start: int, end: int, position_increment: int = 1, position_length: int = 1,
+                 type: str = 'word', history: tuple = ()):
+        self.text = text
+        self.start = start
+        self.end = end
+        self.position_increment = position_increment
+        self.position_length = position_length
+        self.type = type
+        self.history = history
+
+    def derive(self, text: str) -> 'Token':
+        """
+        Returns a copy of this token with new text, as produced by a token filter.
+        """
+        return Token(text, self.start, self.end, self.position_increment, self.position_length, self.type, self.history)
+
+def java_replacement(replacement: str) -> str:
+    """
+    Converts a java.util.regex replacement string ($1, \\$) into Python re.sub syntax.
+
+    Args:
+        replacement (str): The Java replacement string.
+
+    Returns:
+        str: The equivalent Python replacement string.
+    """
+    converted = []
+    index = 0
+    while index < len(replacement):
+        char = replacement[index]
+        if char == '\\' and index + 1 < len(replacement):
+            converted.append(replacement[index + 1].replace('\\', '\\\\'))
+            index += 2
+        elif char == '$' and index + 1 < len(replacement) and replacement[index + 1].isdigit():
+            group = re.match(r'\d+', replacement[index + 1:]).group()
+            converted.append(f'\\g<{group}>')
+            index += 1 + len(group)
+        else:
+            converted.append('\\\\' if char == '\\' else char)
+            index += 1
+    return ''.join(converted)
+
+class PatternReplaceCharFilter:
+    """
+    Replaces every match of a regular expression in the raw text before tokenization.
+    """
+    class_name = 'org.apache.lucene.analysis.pattern.PatternReplaceCharFilter'
+
+    def __init__(self, args: dict, conf_dir: str):
+        self.pattern = re.compile(args['pattern'])
+        self.replacement = java_replacement(args.get('replacement', ''))
+
+    def filter(self, text: str) -> str:
+        """
+        Applies the char filter to the raw text.
+
+        Args:
+            text (str): The text to filter.
+
+        Returns:
+            str: The filtered text.
+        """
+        return self.pattern.sub(self.replacement, text)
+
+class WhitespaceTokenizer:
+    """
+    Splits text on Java whitespace, cutting tokens longer than maxTokenLen.
+    """
+    class_name = 'org.apache.lucene.analysis.core.WhitespaceTokenizer'
+
+    def __init__(self, args: dict, conf_dir: str):
+        self.max_token_length = int(args.get('maxTokenLen', MAX_TOKEN_LENGTH))
+
+    def tokenize(self, text: str) -> list:
+        """
+        Splits text into tokens.
+
+        Args:
+            text (str): The text to tokenize.
+
+        Returns:
+            list: The Token objects, in order.
+        """
+        tokens = []
+        for match in WHITESPACE_TOKEN_PATTERN.finditer(text):
+            # CharTokenizer splits tokens that exceed the maximum token length
+            for start in range(match.start(), match.end(), self.max_token_length):
+                end = min(start + self.max_token_length, match.end())
+                tokens.append(Token(text[start:end], start, end))
+        return tokens
+
+class StandardTokenizer:
+    """
+    Splits text on approximated UAX#29 word boundaries, cutting tokens longer than maxTokenLength.
+    """
+    class_name = 'org.apache.lucene.analysis.standard.StandardTokenizer'
+
+    def __init__(self, args: dict, conf_dir: str):
+        self.max_token_length = int(args.get('maxTokenLength', MAX_TOKEN_LENGTH))
+
+    def tokenize(self, text: str) -> list:
+        """
+        Splits text into tokens.
+
+        Args:
+            text (str): The text to tokenize.
+
+        Returns:
+            list: The Token objects, in order.
+        """
+        return [
+            Token(match.group()[:self.max_token_length], match.start(), min(match.end(), match.start() + self.max_token_length), type='<ALPHANUM>')
+            for match in STANDARD_TOKEN_PATTERN.finditer(text)
+        ]
+
+class KeywordTokenizer:
+    """
+    Emits the whole text as a single token.
+    """
+    class_name = 'org.apache.lucene.analysis.core.KeywordTokenizer'
+
+    def __init__(self, args: dict, conf_dir: str):
+        pass
+
+    def tokenize(self, text: str) -> list:
+        """
+        Splits text into tokens.
+
+        Args:
+            text (str): The text to tokenize.
+
+        Returns:
+            list: The Token objects, in order.
+        """
+        return [Token(text, 0, len(text))] if text else []
+
+class PatternReplaceFilter:
+    """
+    Replaces the first or every match of a regular expression in each token.
+    """
+    class_name = 'org.apache.lucene.analysis.pattern.PatternReplaceFilter'
+
+    def __init__(self, args: dict, conf_dir: str):
+        self.pattern = re.compile(args['pattern'])
+        self.replacement = java_replacement(args.get('replacement', ''))
+        self.count = 0 if args.get('replace', 'all') == 'all' else 1
+
+    def filter(self, tokens: list) -> list:
+        """
+        Applies the token filter to a token stream.
+
+        Args:
+            tokens (list): The incoming Token objects.
+
+        Returns:
+            list: The outgoing Token objects.
+        """
+        return [token.derive(self.pattern.sub(self.replacement, token.text, count=self.count)) for token in tokens]
+
+def java_lowercase(text: str) -> str:
+    """
+    Lowercases text one character at a time, like Java's Character.toLowerCase.
+
+    Args:
+        text (str): The text to lowercase.
+
+    Returns:
+        str: The lowercased text.
+    """
+    if text.isascii():
+        return text.lower()
+    lowered = []
+    for char in text:
+        lowered_char = char.lower()
+        # Python expands a few characters (e.g. 'İ') to several code points; Java maps them to one
+        lowered.append(lowered_char if len(lowered_char) == 1 else lowered_char[0])
+    return ''.join(lowered)
+
+class LowerCaseFilter:
+    """
+    Lowercases each token like Java's Character.toLowerCase.
+    """
+    class_name = 'org.apache.lucene.analysis.LowerCaseFilter'
+
+    def __init__(self, args: dict, conf_dir: str):
+        pass
+
+    def filter(self, tokens: list) -> list:
+        """
+        Applies the token filter to a token stream.
+
+        Args:
+            tokens (list): The incoming Token objects.
+
+        Returns:
+            list: The outgoing Token objects.
+        """
+        return [token.derive(java_lowercase(token.text)) for token in tokens]
+
+def read_word_list(conf_dir: str, file_names: str) -> list:
+    """
+    Reads one or more comma-separated resource files from the core's conf directory,
+    skipping comments and blank lines.
+
+    Args:
+        conf_dir (str): The core's conf directory.
+        file_names (str): Comma-separated resource file names.
+
+    Returns:
+        list: The lines of the resource files.
+    """
+    lines = []
+    for file_name in filter(None, (name.strip() for name in file_names.split(','))):
+        with open(os.path.join(conf_dir, file_name), mode='r', encoding='utf-8') as resource_file:
+            for line in resource_file:
+                line = line.rstrip('\r\n').lstrip('\ufeff')
+                if line and not line.startswith('#'):
+                    lines.append(line)
+    return lines
+
+class StopFilter:
+    """
+    Removes the tokens listed in the stop word files, carrying their positions over to the next kept token.
+    """
+    class_name = 'org.apache.lucene.analysis.core.StopFilter'
+
+    def __init__(self, args: dict, conf_dir: str):
+        self.ignore_case = args.get('ignoreCase', 'false') == 'true'
+        words = [word.strip() for word in read_word_list(conf_dir, args['words'])] if args.get('words') else []
+        self.words = {java_lowercase(word) if self.ignore_case else word for word in words}
+
+    def filter(self, tokens: list) -> list:
+        """
+        Applies the token filter to a token stream.
+
+        Args:
+            tokens (list): The incoming Token objects.
+
+        Returns:
+            list: The outgoing Token objects.
+        """
+        kept = []
+        skipped_positions = 0
+        for token in tokens:
+            text = java_lowercase(token.text) if self.ignore_case else token.text
+            if text in self.words:
+                skipped_positions += token.position_increment
+                continue
+            kept_token = token.derive(token.text)
+            kept_token.position_increment += skipped_positions
+            skipped_positions = 0
+            kept.append(kept_token)
+        return kept
+
+@functools.lru_cache(maxsize=100000)
+def english_minimal_stem(word: str) -> str:
+    """
+    Applies Lucene's EnglishMinimalStemmer (a plural-only "S-stemmer") to a word.
+
+    Args:
+        word (str): The word to stem.
+
+    Returns:
+        str: The stemmed word.
+    """
+    length = len(word)
+    if length < 3 or word[-1] != 's':
+        return word
+
+    second_last = word[-2]
+    if second_last in ('u', 's'):
+        return word
+    if second_last == 'e':
+        if length > 3 and word[-3] == 'i' and word[-4] not in ('a', 'e'):
+            return word[:-3] + 'y'
+        if word[-3] in ('i', 'a', 'o', 'e'):
+            return word
+    return word[:-1]
+
+class EnglishMinimalStemFilter:
+    """
+    Stems each token with EnglishMinimalStemmer (plural "s" removal only).
+    """
+    class_name = 'org.apache.lucene.analysis.en.EnglishMinimalStemFilter'
+
+    def __init__(self, args: dict, conf_dir: str):
+        pass
+
+    def filter(self, tokens: list) -> list:
+        """
+        Applies the token filter to a token stream.
+
+        Args:
+            tokens (list): The incoming Token objects.
+
+        Returns:
+            list: The outgoing Token objects.
+        """
+        return [token.derive(english_minimal_stem(token.text)) for token in tokens]
+
+class PorterStemmer:
+    """
+    A port of Lucene's PorterStemmer (the original Porter algorithm with Lucene's departures).
+    """
+
+    def __init__(self):
+        self.b = []
+        self.k = 0
+        self.j = 0
+
+    def stem(self, word: str) -> str:
+        """
+        Stems a word.
+
+        Args:
+            word (str): The word to stem.
+
+        Returns:
+            str: The stemmed word.
+        """
+        if len(word) <= 2:
+            return word
+        self.b = list(word)
+        self.k = len(word) - 1
+        self.j = 0
+        self.step1()
+        self.step2()
+        self.step3()
+        self.step4()
+        self.step5()
+        self.step6()
+        return ''.join(self.b[:self.k + 1])
+
+    def cons(self, i: int) -> bool:
+        """
+        Returns whether b[i] is a consonant ('y' is one unless it follows a consonant).
+        """
+        char = self.b[i]
+        if char in 'aeiou':
+            return False
+        if char == 'y':
+            return True if i == 0 else not self.cons(i - 1)
+        return True
+
+    def m(self) -> int:
+        """
+        Returns the measure of b[0..j]: the number of vowel-consonant sequences in it.
+        """
+        n = 0
+        i = 0
+        while True:
+            if i > self.j:
+                return n
+            if not self.cons(i):
+                break
+            i += 1
+        i += 1
+        while True:
+            while True:
+                if i > self.j:
+                    return n
+                if self.cons(i):
+                    break
+                i += 1
+            i += 1
+            n += 1
+            while True:
+                if i > self.j:
+                    return n
+                if not self.cons(i):
+                    break
+                i += 1
+            i += 1
+
+    def vowel_in_stem(self) -> bool:
+        """
+        Returns whether b[0..j] contains a vowel.
+        """
+        return any(not self.cons(i) for i in range(self.j + 1))
+
+    def double_consonant(self, j: int) -> bool:
+        """
+        Returns whether b[j-1..j] is a double consonant.
+        """
+        return j >= 1 and self.b[j] == self.b[j - 1] and self.cons(j)
+
+    def cvc(self, i: int) -> bool:
+        """
+        Returns whether b[i-2..i] is consonant-vowel-consonant with a last consonant other than w, x or y.
+        """
+        if i < 2 or not self.cons(i) or self.cons(i - 1) or not self.cons(i - 2):
+            return False
+        return self.b[i] not in 'wxy'
+
+    def ends(self, suffix: str) -> bool:
+        """
+        Returns whether b[0..k] ends with suffix, setting j to the end of the stem before it.
+        """
+        length = len(suffix)
+        if length > self.k + 1:
+            return False
+        if ''.join(self.b[self.k - length + 1:self.k + 1]) != suffix:
+            return False
+        self.j = self.k - length
+        return True
+
+    def set_to(self, suffix: str) -> None:
+        """
+        Replaces b[j+1..k] with suffix and moves k to its end.
+        """
+        self.b[self.j + 1:] = list(suffix)
+        self.k = self.j + len(suffix)
+
+    def r(self, suffix: str) -> None:
+        """
+        Replaces the matched suffix with suffix if the stem's measure is positive.
+        """
+        if self.m() > 0:
+            self.set_to(suffix)
+
+    def step1(self) -> None:
+        """
+        Removes plurals and -ed or -ing endings.
+        """
+        del self.b[self.k + 1:]
+        if self.b[self.k] == 's':
+            if self.ends('sses'):
+                self.k -= 2
+            elif self.ends('ies'):
+                self.set_to('i')
+            elif self.b[self.k - 1] != 's':
+                self.k -= 1
+        del self.b[self.k + 1:]
+
+        if self.ends('eed'):
+            if self.m() > 0:
+                self.k -= 1
+        elif (self.ends('ed') or self.ends('ing')) and self.vowel_in_stem():
+            self.k = self.j
+            del self.b[self.k + 1:]
+            if self.ends('at'):
+                self.set_to('ate')
+            elif self.ends('bl'):
+                self.set_to('ble')
+            elif self.ends('iz'):
+                self.set_to('ize')
+            elif self.double_consonant(self.k):
+                if self.b[self.k] not in 'lsz':
+                    self.k -= 1
+            elif self.m() == 1 and self.cvc(self.k):
+                self.set_to('e')
+        del self.b[self.k + 1:]
+
+    def step2(self) -> None:
+        """
+        Turns a terminal 'y' into 'i' when there is another vowel in the stem.
+        """
+        if self.ends('y') and self.vowel_in_stem():
+            self.b[self.k] = 'i'
+
+    def step3(self) -> None:
+        """
+        Maps double suffixes to single ones, e.g. -ization to -ize.
+        """
+        if self.k == 0:
+            return
+        for suffix, replacement in STEP3_SUFFIXES.get(self.b[self.k - 1], ()):
+            if self.ends(suffix):
+                self.r(replacement)
+                break
+        del self.b[self.k + 1:]
+
+    def step4(self) -> None:
+        """
+        Reduces or removes -icate, -ative, -alize, -iciti, -ical, -ful and -ness endings.
+        """
+        for suffix, replacement in STEP4_SUFFIXES.get(self.b[self.k], ()):
+            if self.ends(suffix):
+                self.r(replacement)
+                break
+        del self.b[self.k + 1:]
+
+    def step5(self) -> None:
+        """
+        Removes -ant, -ence and similar endings when the stem's measure is above one.
+        """
+        if self.k == 0:
+            return
+        for suffix in STEP5_SUFFIXES.get(self.b[self.k - 1], ()):
+            if self.ends(suffix):
+                if suffix == 'ion' and not (self.j >= 0 and self.b[self.j] in 'st'):
+                    continue
+                if self.m() > 1:
+                    self.k = self.j
+                    del self.b[self.k + 1:]
+                return
+
+    def step6(self) -> None:
+        """
+        Removes a final 'e' and reduces a final double 'l' when the measure allows.
+        """
+        self.j = self.k
+        if self.b[self.k] == 'e':
+            measure = self.m()
+            if measure > 1 or (measure == 1 and not self.cvc(self.k - 1)):
+                self.k -= 1
+        if self.b[self.k] == 'l' and self.double_consonant(self.k) and self.m() > 1:
+            self.k -= 1
+        del self.b[self.k + 1:]
+
+STEP3_SUFFIXES = {
+    'a': (('ational', 'ate'), ('tional', 'tion')),
+    'c': (('enci', 'ence'), ('anci', 'ance')),
+    'e': (('izer', 'ize'),),
+    'l': (('bli', 'ble'), ('alli', 'al'), ('entli', 'ent'), ('eli', 'e'), ('ousli', 'ous')),
+    'o': (('ization', 'ize'), ('ation', 'ate'), ('ator', 'ate')),
+    's': (('alism', 'al'), ('iveness', 'ive'), ('fulness', 'ful'), ('ousness', 'ous')),
+    't': (('aliti', 'al'), ('iviti', 'ive'), ('biliti', 'ble')),
+    'g': (('logi', 'log'),),
+}
+
+STEP4_SUFFIXES = {
+    'e': (('icate', 'ic'), ('ative', ''), ('alize', 'al')),
+    'i': (('iciti', 'ic'),),
+    'l': (('ical', 'ic'), ('ful', '')),
+    's': (('ness', ''),),
+}
+
+STEP5_SUFFIXES = {
+    'a': ('al',),
+    'c': ('ance', 'ence'),
+    'e': ('er',),
+    'i': ('ic',),
+    'l': ('able', 'ible'),
+    'n': ('ant', 'ement', 'ment', 'ent'),
+    'o': ('ion', 'ou'),
+    's': ('ism',),
+    't': ('ate', 'iti'),
+    'u': ('ous',),
+    'v': ('ive',),
+    'z': ('ize',),
+}
+
+class PorterStemFilter:
+    """
+    Stems each token with the Porter stemmer.
+    """
+    class_name = 'org.apache.lucene.analysis.en.PorterStemFilter'
+
+    def __init__(self, args: dict, conf_dir: str):
+        self.stem = functools.lru_cache(maxsize=100000)(PorterStemmer().stem)
+
+    def filter(self, tokens: list) -> list:
+        """
+        Applies the token filter to a token stream.
+
+        Args:
+            tokens (list): The incoming Token objects.
+
+        Returns:
+            list: The outgoing Token objects.
+        """
+        return [token.derive(self.stem(token.text)) for token in tokens]
+
+def split_synonym_rule(text: str, separator: str) -> list:
+    """
+    Splits a synonym rule on a separator, honouring backslash escapes like Solr's parser.
+
+    Args:
+        text (str): The rule text to split.
+        separator (str): The separator ("," or "=>").
+
+    Returns:
+        list: The trimmed, unescaped parts.
+    """
+    parts = []
+    current = []
+    index = 0
+    while index < len(text):
+        if text.startswith(separator, index):
+            parts.append(''.join(current).strip())
+            current = []
+            index += len(separator)
+            continue
+        char = text[index]
+        if char == '\\' and index + 1 < len(text):
+            current.append(text[index + 1])
+            index += 2
+            continue
+        current.append(char)
+        index += 1
+    parts.append(''.join(current).strip())
+    return parts
+
+class SynonymGraphFilter:
+    """
+    Solr-format synonyms applied as a token graph, following Lucene's SynonymGraphFilter:
+    greedy longest matches, multi-word side paths and SYNONYM-typed output tokens.
+    """
+    class_name = 'org.apache.lucene.analysis.synonym.SynonymGraphFilter'
+
+    def __init__(self, args: dict, conf_dir: str):
+        self.ignore_case = args.get('ignoreCase', 'false') == 'true'
+        self.expand = args.get('expand', 'true') == 'true'
+        self.rules = {}
+        for line in read_word_list(conf_dir, args['synonyms']):
+            self.add_rule(line)
+        self.max_input_length = max((len(words) for words in self.rules), default=0)
+
+    def analyze_term(self, term: str) -> tuple:
+        """
+        Splits one side of a synonym rule into words, lowercased when ignoreCase is set.
+
+        Args:
+            term (str): The term as written in the synonyms file.
+
+        Returns:
+            tuple: The term's words.
+        """
+        words = WHITESPACE_TOKEN_PATTERN.findall(term)
+        return tuple(java_lowercase(word) for word in words) if self.ignore_case else tuple(words)
+
+    def add_rule(self, line: str) -> None:
+        """
+        Parses one line of the synonyms file ("a, b" or "a => b") into input -> outputs rules.
+
+        Args:
+            line (str): The synonym rule.
+        """
+        if '=>' in line:
+            sides = split_synonym_rule(line, '=>')
+            if len(sides) != 2:
+                raise ValueError(f"more than one explicit mapping specified on the same line: {line}")
+            inputs = [self.analyze_term(term) for term in split_synonym_rule(sides[0], ',')]
+            outputs = [self.analyze_term(term) for term in split_synonym_rule(sides[1], ',')]
+            pairs = [(input_words, output_words, False) for input_words in inputs for output_words in outputs]
+        else:
+            inputs = [self.analyze_term(term) for term in split_synonym_rule(line, ',')]
+            if self.expand:
+                pairs = [(inputs[i], inputs[j], True) for i in range(len(inputs)) for j in range(len(inputs)) if i != j]
+            else:
+                pairs = [(input_words, inputs[0], False) for input_words in inputs]
+
+        for input_words, output_words, include_original in pairs:
+            if not input_words or not output_words:
+                continue
+            entry = self.rules.setdefault(input_words, [[], False])
+            if output_words not in entry[0]:
+                entry[0].append(output_words)
+            entry[1] = entry[1] or include_original
+
+    def filter(self, tokens: list) -> list:
+        """
+        Applies the token filter to a token stream.
+
+        Args:
+            tokens (list): The incoming Token objects.
+
+        Returns:
+            list: The outgoing Token objects.
+        """
+        output = []
+        next_node = 0
+        last_node = -1
+
+        def emit(source: Token, text: str, start_node: int, end_node: int, type: str, start: int, end: int) -> None:
+            nonlocal last_node
+            output.append(Token(text, start, end, start_node - last_node, end_node - start_node, type, source.history))
+            last_node = start_node
+
+        index = 0
+        while index < len(tokens):
+            match_length = 0
+            match = None
+            for length in range(min(self.max_input_length, len(tokens) - index), 0, -1):
+                key = tuple(token.text for token in tokens[index:index + length])
+                if self.ignore_case:
+                    key = tuple(java_lowercase(text) for text in key)
+                if key in self.rules:
+                    match_length, match = length, self.rules[key]
+                    break
+
+            if match is None:
+                token = tokens[index]
+                emit(token, token.text, next_node, next_node + 1, token.type, token.start, token.end)
+                next_node += 1
+                index += 1
+                continue
+
+            paths, keep_original = match
+            matched = tokens[index:index + match_length]
+            start, end = matched[0].start, matched[-1].end
+            total_path_nodes = (match_length - 1 if keep_original else 0) + sum(len(path) - 1 for path in paths)
+            start_node = next_node
+            end_node = start_node + total_path_nodes + 1
+
+            # Fan out the first token of every side path from the start node
+            first_end_nodes = []
+            new_node_count = 0
+            for path in paths:
+                if len(path) == 1:
+                    path_end_node = end_node
+                else:
+                    path_end_node = next_node + new_node_count + 1
+                    new_node_count += len(path) - 1
+                first_end_nodes.append(path_end_node)
+                emit(matched[0], path[0], start_node, path_end_node, 'SYNONYM', start, end)
+
+            if keep_original:
+                original_end_node = end_node if match_length == 1 else next_node + new_node_count + 1
+                emit(matched[0], matched[0].text, start_node, original_end_node, matched[0].type, matched[0].start, matched[0].end)
+
+            # Then the remaining tokens of each multi-word side path
+            for path, node in zip(paths, first_end_nodes):
+                for word in path[1:-1]:
+                    emit(matched[0], word, node, node + 1, 'SYNONYM', start, end)
+                    node += 1
+                if len(path) > 1:
+                    emit(matched[0], path[-1], node, end_node, 'SYNONYM', start, end)
+
+            if keep_original and match_length > 1:
+                node = original_end_node
+                for token in matched[1:-1]:
+                    emit(token, token.text, node, node + 1, token.type, token.start, token.end)
+                    node += 1
+                emit(matched[-1], matched[-1].text, node, end_node, matched[-1].type, matched[-1].start, matched[-1].end)
+
+            next_node = end_node
+            index += match_length
+
+        return output
+
+CHAR_FILTER_FACTORIES = {
+    'solr.PatternReplaceCharFilterFactory': PatternReplaceCharFilter,
+}
+
+TOKENIZER_FACTORIES = {
+    'solr.WhitespaceTokenizerFactory': WhitespaceTokenizer,
+    'solr.StandardTokenizerFactory': StandardTokenizer,
+    'solr.KeywordTokenizerFactory': KeywordTokenizer,
+}
+
+FILTER_FACTORIES = {
+    'solr.PatternReplaceFilterFactory': PatternReplaceFilter,
+    'solr.LowerCaseFilterFactory': LowerCaseFilter,
+    'solr.StopFilterFactory': StopFilter,
+    'solr.EnglishMinimalStemFilterFactory': EnglishMinimalStemFilter,
+    'solr.PorterStemFilterFactory': PorterStemFilter,
+    'solr.SynonymGraphFilterFactory': SynonymGraphFilter,
+}
+
+def raw_bytes(text: str) -> str:
+    """
+    Formats the UTF-8 bytes of a term the way Solr's analysis handler reports them.
+    """
+    return '[' + text.encode('utf-8').hex(' ') + ']'
+
+class AnalysisChain:
+    """
+    An in-process equivalent of one <analyzer> of a Solr field type.
+    """
+
+    def __init__(self, char_filters: list, tokenizer, filters: list):
+        self.char_filters = char_filters
+        self.tokenizer = tokenizer
+        self.filters = filters
+
+    def analyze_phases(self, text: str) -> list:
+        """
+        Runs the chain and returns the per-phase analysis in the shape of Solr's
+        /analysis/field response (json.nl=arrmap) for a single field value.
+
+        Args:
+            text (str): The text to analyze.
+
+        Returns:
+            list: One single-key dictionary per char filter, tokenizer and filter.
+        """
+        phases = []
+        for char_filter in self.char_filters:
+            text = char_filter.filter(text)
+            phases.append({char_filter.class_name: text})
+
+        tokens = self.tokenizer.tokenize(text)
+        phases.append({self.tokenizer.class_name: self.describe_tokens(tokens)})
+
+        for token_filter in self.filters:
+            tokens = token_filter.filter(tokens)
+            phases.append({token_filter.class_name: self.describe_tokens(tokens)})
+
+        return phases
+
+    def analyze_tokens(self, text: str) -> list:
+        """
+        Runs the chain and returns only the final tokens, skipping the per-phase report.
+
+        Args:
+            text (str): The text to analyze.
+
+        Returns:
+            list: The final Token objects.
+        """
+        for char_filter in self.char_filters:
+            text = char_filter.filter(text)
+        tokens = self.tokenizer.tokenize(text)
+        for token_filter in self.filters:
+            tokens = token_filter.filter(tokens)
+        return tokens
+
+    @staticmethod
+    def describe_tokens(tokens: list) -> list:
+        """
+        Formats tokens the way Solr's analysis handler reports a tokenizer or filter phase,
+        adding each token's position to its position history.
+
+        Args:
+            tokens (list): The Token objects of the phase.
+
+        Returns:
+            list: One dictionary of attributes per token.
+        """
+        described = []
+        position = 0
+        for token in tokens:
+            position += token.position_increment
+            token.history = token.history + (position,)
+            described.append({
+                'text': token.text,
+                'raw_bytes': raw_bytes(token.text),
+                'start': token.start,
+                'end': token.end,
+                POSITION_LENGTH_KEY: token.position_length,
+                'type': token.type,
+                'termFrequency': 1,
+                'position': position,
+                'positionHistory': list(token.history)
+            })
+        return described
+
+def build_component(element: ET.Element, factories: dict, conf_dir: str):
+    """
+    Builds the char filter, tokenizer or token filter an element of an <analyzer> declares,
+    raising ValueError if no component implements its factory class.
+
+    Args:
+        element (ET.Element): The <charFilter>, <tokenizer> or <filter> element.
+        factories (dict): Solr factory class name to the component class implementing it.
+        conf_dir (str): The core's conf directory, used to resolve resource files.
+
+    Returns:
+        The component, built from the element's attributes.
+    """
+    factory = factories.get(element.get('class'))
+    if factory is None:
+        raise ValueError(f"Unsupported analysis component: {element.get('class')}")
+    return factory(dict(element.attrib), conf_dir)
+
+def build_chain(analyzer_element: ET.Element, conf_dir: str) -> AnalysisChain:
+    """
+    Builds an AnalysisChain from an <analyzer> element of the managed-schema.
+
+    Args:
+        analyzer_element (ET.Element): The <analyzer> element.
+        conf_dir (str): The core's conf directory, used to resolve resource files.
+
+    Returns:
+        AnalysisChain: The in-process analysis chain.
+    """
+    char_filters = [build_component(element, CHAR_FILTER_FACTORIES, conf_dir) for element in analyzer_element.findall('charFilter')]
+    tokenizer = build_component(analyzer_element.find('tokenizer'), TOKENIZER_FACTORIES, conf_dir)
+    filters = [build_component(element, FILTER_FACTORIES, conf_dir) for element in analyzer_element.findall('filter')]
+    return AnalysisChain(char_filters, tokenizer, filters)
+
+class LocalAnalyzer:
+    """
+    Parses the <fieldType> definitions of the catalog_core managed-schema and runs their
+    analyzer chains in-process.
+    """
+
+    def __init__(self, schema_path: str = SCHEMA_PATH):
+        self.schema_path = schema_path
+        self.conf_dir = os.path.dirname(schema_path)
+        self.field_types = {
+            element.get('name'): element
+            for element in ET.parse(schema_path).getroot().iter('fieldType')
+        }
+        self._chains = {}
+
+    def chain(self, field_type: str, analyzer_type: str = 'index') -> AnalysisChain:
+        """
+        Returns the analysis chain for a field type, building it on first use.
+
+        Args:
+            field_type (str): The Solr field type.
+            analyzer_type (str): "index" or "query".
+
+        Returns:
+            AnalysisChain: The analysis chain.
+        """
+        key = (field_type, analyzer_type)
+        if key not in self._chains:
+            if field_type not in self.field_types:
+                raise ValueError(f"Field type {field_type} is not defined in {self.schema_path}")
+            analyzers = self.field_types[field_type].findall('analyzer')
+            analyzer_element = next(
+                (element for element in analyzers if element.get('type') == analyzer_type),
+                next((element for element in analyzers if element.get('type') is None), None)
+            )
+            if analyzer_element is None:
+                raise ValueError(f"Field type {field_type} has no {analyzer_type} analyzer")
+            self._chains[key] = build_chain(analyzer_element, self.conf_dir)
+        return self._chains[key]
+
+    def analyze(self, text_to_analyze: str, field_type: str) -> dict:
+        """
+        Analyzes text like Solr's /analysis/field endpoint does for a field value.
+
+        Args:
+            text_to_analyze (str): The text to analyze.
+            field_type (str): The Solr field type to use for analysis.
+
+        Returns:
+            dict: A response with the same structure as normalizer.analyze_text returns.
+        """
+        phases = self.chain(field_type).analyze_phases(text_to_analyze)
+        return {'analysis': {'field_types': {field_type: {'index': phases}}}}
+
+_default_analyzer = None
+
+def get_analyzer() -> LocalAnalyzer:
+    """
+    Returns the process-wide LocalAnalyzer for the catalog_core schema.
+    """
+    global _default_analyzer
+    if _default_analyzer is None:
+        _default_analyzer = LocalAnalyzer()
+    return _default_analyzer
+
+def analyze(text_to_analyze: str, field_type: str) -> dict:
+    """
+    Analyzes text in-process with the catalog_core schema.
+
+    Args:
+        text_to_analyze (str): The text to analyze.
+        field_type (str): The Solr field type to use for analysis.
+
+    Returns:
+        dict: A response with the same structure as normalizer.analyze_text returns.
+    """
+    return get_analyzer().analyze(text_to_analyze, field_type)
+
+def final_text(text_to_analyze: str, field_type: str) -> str:
+    """
+    Returns the final normalized text for a field type without building the per-phase report.
+
+    Args:
+        text_to_analyze (str): The text to analyze.
+        field_type (str): The Solr field type to use for analysis.
+
+    Returns:
+        str: The final token texts joined by single spaces.
+    """
+    return ' '.join(token.text for token in get_analyzer().chain(field_type).analyze_tokens(text_to_analyze))
+
+def summarize_phases(phases: list) -> list:
+    """
+    Reduces per-phase analysis output to the attributes the pipeline depends on.
+    """
+    summary = []
+    for phase in phases:
+        for class_name, tokens in phase.items():
+            if isinstance(tokens, str):
+                summary.append((class_name.split('.')[-1], tokens))
+            else:
+                summary.append((class_name.split('.')[-1], [
+                    (token['text'], token['position'], token[POSITION_LENGTH_KEY]) for token in tokens
+                ]))
+    return summary
+
+def run_parity_test(sample_csv: str, field_types: list, limit: int) -> int:
+    """
+    Analyzes a sample corpus both locally and with a live Solr and reports every difference.
+
+    Args:
+        sample_csv (str): CSV file whose first column holds the texts to analyze.
+        field_types (list): The field types to compare.
+        limit (int): Maximum number of texts to compare.
+
+    Returns:
+        int: The number of mismatching (text, field type) pairs.
+    """
+    import normalizer
+
+    with open(sample_csv, mode='r', newline='', encoding='utf-8') as sample_file:
+        reader = csv.reader(sample_file)
+        next(reader)
+        texts = [row[0] for row, _ in zip(reader, range(limit)) if row]
+
+    mismatches = 0
+    for field_type in field_types:
+        solr_results = [
+            normalizer.analyze_text(normalizer.SOLR_URL, normalizer.CORE_NAME, field_type, text)
+            for text in texts
+        ]
+        for text, solr_result in zip(texts, solr_results):
+            local_result = analyze(text, field_type)
+            solr_phases = normalizer.extract_index_phases(solr_result, field_type)
+            local_phases = normalizer.extract_index_phases(local_result, field_type)
+
+            solr_normalized = normalizer.get_normalized_result(solr_result, field_type, text)
+            local_normalized = normalizer.get_normalized_result(local_result, field_type, text)
+
+            if summarize_phases(solr_phases) != summarize_phases(local_phases) or solr_normalized != local_normalized:
+                mismatches += 1
+                print(f"[{field_type}] {text!r}")
+                print(f"    solr:  {summarize_phases(solr_phases)}")
+                print(f"    local: {summarize_phases(local_phases)}")
+
+        print(f"{field_type}: compared {len(texts)} texts")
+
+    print(f"Parity test finished with {mismatches} mismatches.")
+    return mismatches
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="In-process replica of the catalog_core analyzer chains.")
+    parser.add_argument('--parity', metavar='SAMPLE_CSV', help="Diff local analysis against a live Solr over a sample corpus")
+    parser.add_argument('--field-type', action='append', dest='field_types',
+                        help="Field type to analyze (may be repeated)")
+    parser.add_argument('--limit', type=int, default=1000, help="Maximum number of sample texts to compare")
+    parser.add_argument('text', nargs='?', help="Text to analyze")
+    args = parser.parse_args()
+
+    field_types = args.field_types or ['dig_practice_char', 'dig_practice_char_stem', 'dig_practice_char_syns_stem']
+    if args.parity:
+        raise SystemExit(1 if run_parity_test(args.parity, field_types, args.limit) else 0)
+
+    for field_type in field_types:
+        phases = analyze(args.text or '', field_type)['analysis']['field_types'][field_type]['index']
+        print(field_type, summarize_phases(phases))
@@ -0,0 +1,62 @@
+from collections import OrderedDict
+
+class LruMemo:
+    """
+    A bounded memo table with least-recently-used eviction and hit/miss counters.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, key, default=None):
+        """
+        Looks up a memoized value, counting the lookup as a hit or a miss.
+
+        Args:
+            key: The memo key.
+            default: Returned on a miss.
+
+        Returns:
+            The memoized value, or default.
+        """
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value) -> None:
+        """
+        Memoizes a value, evicting the least recently used entry when full.
+        """
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def update(self, items) -> None:
+        """
+        Memoizes (key, value) pairs without touching the counters (e.g. when loading a saved memo).
+        """
+        for key, value in items:
+            self.put(key, value)
+
+    def items(self) -> list:
+        return list(self._entries.items())
+
+    def clear(self) -> None:
+        """
+        Removes every entry and resets the counters.
+        """
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
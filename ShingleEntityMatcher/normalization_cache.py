@@ -0,0 +1,210 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+
+SCHEMA_PATH = 'ShingleEntityMatcher/solr-8.11.3/server/solr/catalog_core/conf/managed-schema'
+CACHE_DB_PATH = 'ShingleEntityMatcher/normalization_cache.sqlite'
+LRU_SIZE = 100000
+COMMIT_EVERY = 1000
+SCHEMA_CHECK_INTERVAL = 1.0
+
+# Attributes of analyzer components that point at resource files next to the schema
+RESOURCE_ATTRIBUTES = ('synonyms', 'words', 'protected', 'dictionary', 'articles')
+
+def analyzer_fingerprint(field_type: str, schema_path: str = SCHEMA_PATH) -> str:
+    """
+    Computes a fingerprint of a field type's analyzer chain in the managed-schema.
+
+    The fingerprint covers the <fieldType> definition itself and the contents of any
+    resource files (e.g. synonyms.txt) referenced by its char filters, tokenizer or filters.
+
+    Args:
+        field_type (str): The Solr field type to fingerprint.
+        schema_path (str): Path to the core's managed-schema file.
+
+    Returns:
+        str: A hex digest identifying the analyzer chain, or an empty string if the
+             field type is not defined in the schema.
+    """
+    root = ET.parse(schema_path).getroot()
+    conf_dir = os.path.dirname(schema_path)
+
+    for field_type_element in root.iter('fieldType'):
+        if field_type_element.get('name') != field_type:
+            continue
+
+        digest = hashlib.sha256(ET.tostring(field_type_element))
+        for component in field_type_element.iter():
+            for attribute in RESOURCE_ATTRIBUTES:
+                for resource in filter(None, (component.get(attribute) or '').split(',')):
+                    resource_path = os.path.join(conf_dir, resource.strip())
+                    if os.path.exists(resource_path):
+                        with open(resource_path, 'rb') as resource_file:
+                            digest.update(resource_file.read())
+        return digest.hexdigest()
+
+    return ''
+
+class NormalizationCache:
+    """
+    Two-level cache of Solr analysis responses: an in-process LRU in front of a SQLite file.
+
+    Entries are keyed by field type, input text and the analyzer fingerprint of the field
+    type, so editing the managed-schema (or a resource file it references) invalidates the
+    affected entries automatically.
+    """
+
+    def __init__(self, db_path: str = CACHE_DB_PATH, schema_path: str = SCHEMA_PATH, lru_size: int = LRU_SIZE):
+        self.db_path = db_path
+        self.schema_path = schema_path
+        self.lru_size = lru_size
+        self.hits = 0
+        self.misses = 0
+
+        self._lru = OrderedDict()
+        self._fingerprints = {}
+        self._schema_stamp = None
+        self._last_schema_check = 0.0
+        self._pending_writes = 0
+        self._lock = threading.RLock()
+
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS analysis ('
+            'field_type TEXT NOT NULL, fingerprint TEXT NOT NULL, text TEXT NOT NULL, response TEXT NOT NULL, '
+            'PRIMARY KEY (field_type, fingerprint, text)) WITHOUT ROWID'
+        )
+        self._connection.commit()
+
+    def fingerprint(self, field_type: str) -> str:
+        """
+        Returns the current analyzer fingerprint for a field type, recomputing it when the
+        schema or its resource files have changed on disk.
+
+        Args:
+            field_type (str): The Solr field type.
+
+        Returns:
+            str: The analyzer fingerprint.
+        """
+        with self._lock:
+            self._check_schema()
+            if field_type not in self._fingerprints:
+                fingerprint = analyzer_fingerprint(field_type, self.schema_path)
+                self._fingerprints[field_type] = fingerprint
+                self._prune_stale_entries(field_type, fingerprint)
+            return self._fingerprints[field_type]
+
+    def get(self, field_type: str, text: str):
+        """
+        Looks up a cached analysis response.
+
+        Args:
+            field_type (str): The Solr field type used for analysis.
+            text (str): The analyzed text.
+
+        Returns:
+            dict or None: The cached Solr analysis response, or None on a cache miss.
+        """
+        with self._lock:
+            key = (field_type, self.fingerprint(field_type), text)
+
+            response = self._lru.get(key)
+            if response is not None:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return response
+
+            row = self._connection.execute(
+                'SELECT response FROM analysis WHERE field_type = ? AND fingerprint = ? AND text = ?', key
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            response = json.loads(row[0])
+            self._remember(key, response)
+            self.hits += 1
+            return response
+
+    def put(self, field_type: str, text: str, response: dict) -> None:
+        """
+        Stores an analysis response in both cache levels.
+
+        Args:
+            field_type (str): The Solr field type used for analysis.
+            text (str): The analyzed text.
+            response (dict): The Solr analysis response to cache.
+        """
+        with self._lock:
+            key = (field_type, self.fingerprint(field_type), text)
+            self._remember(key, response)
+            self._connection.execute(
+                'INSERT OR REPLACE INTO analysis (field_type, fingerprint, text, response) VALUES (?, ?, ?, ?)',
+                key + (json.dumps(response, separators=(',', ':')),)
+            )
+            self._pending_writes += 1
+            if self._pending_writes >= COMMIT_EVERY:
+                self.flush()
+
+    def flush(self) -> None:
+        """
+        Commits pending writes to the SQLite file.
+        """
+        with self._lock:
+            self._connection.commit()
+            self._pending_writes = 0
+
+    def clear(self) -> None:
+        """
+        Removes every entry from both cache levels.
+        """
+        with self._lock:
+            self._lru.clear()
+            self._connection.execute('DELETE FROM analysis')
+            self.flush()
+
+    def close(self) -> None:
+        """
+        Flushes pending writes and closes the SQLite connection.
+        """
+        with self._lock:
+            self.flush()
+            self._connection.close()
+
+    def _remember(self, key: tuple, response: dict) -> None:
+        self._lru[key] = response
+        self._lru.move_to_end(key)
+        if len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def _check_schema(self) -> None:
+        # Stat the schema and resource files at most once per interval to keep LRU hits cheap
+        now = time.monotonic()
+        if now - self._last_schema_check < SCHEMA_CHECK_INTERVAL:
+            return
+        self._last_schema_check = now
+
+        conf_dir = os.path.dirname(self.schema_path)
+        stamp = tuple(
+            (entry.name, entry.stat().st_mtime_ns, entry.stat().st_size)
+            for entry in sorted(os.scandir(conf_dir), key=lambda entry: entry.name)
+            if entry.is_file()
+        )
+        if stamp != self._schema_stamp:
+            self._schema_stamp = stamp
+            self._fingerprints.clear()
+            self._lru.clear()
+
+    def _prune_stale_entries(self, field_type: str, fingerprint: str) -> None:
+        self._connection.execute(
+            'DELETE FROM analysis WHERE field_type = ? AND fingerprint != ?', (field_type, fingerprint)
+        )
+        self._connection.commit()
@@ -1,8 +1,131 @@
+import atexit
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import instrumentation
+import local_analyzer
+import normalization_cache
 
 SOLR_URL = "http://localhost:8983/solr"
 CORE_NAME = "catalog_core"
 
+# Analysis backend: "solr" sends requests to the /analysis/field endpoint, "local" runs the
+# managed-schema analyzer chains in-process (see local_analyzer.py)
+ANALYSIS_BACKEND = "solr"
+
+# Set to False to always go to Solr (e.g. while iterating on the managed-schema)
+CACHE_ENABLED = True
+
+# Concurrency and retry policy for batched analysis requests
+MAX_WORKERS = 16
+MAX_RETRIES = 3
+RETRY_BACKOFF_FACTOR = 0.5
+REQUEST_TIMEOUT = 30
+
+_cache = None
+_session = None
+_session_lock = threading.Lock()
+
+def get_cache():
+    """
+    Returns the process-wide normalization cache, opening it on first use.
+
+    Returns:
+        NormalizationCache or None: The cache, or None if caching is disabled.
+    """
+    global _cache
+    if CACHE_ENABLED and _cache is None:
+        _cache = normalization_cache.NormalizationCache()
+        atexit.register(_cache.close)
+    return _cache if CACHE_ENABLED else None
+
+def get_session() -> requests.Session:
+    """
+    Returns the process-wide HTTP session, whose connection pool is shared by all analysis requests.
+
+    Transient failures (connection errors and 429/5xx responses) are retried with exponential backoff.
+
+    Returns:
+        requests.Session: The pooled session.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=MAX_RETRIES,
+                backoff_factor=RETRY_BACKOFF_FACTOR,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset(['GET'])
+            )
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_WORKERS, max_retries=retry)
+            _session = requests.Session()
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+        return _session
+
+def fetch_analysis(text_to_analyze: str, desired_field_type: str) -> dict:
+    """
+    Returns Solr's analysis response for the text, served from the normalization cache when possible.
+
+    Args:
+        text_to_analyze (str): The text to be analyzed.
+        desired_field_type (str): The Solr field type to use for analysis.
+
+    Returns:
+        dict: The JSON response from Solr containing the analysis result.
+    """
+    return fetch_analysis_many([text_to_analyze], desired_field_type)[0]
+
+def fetch_analysis_many(texts: list, desired_field_type: str) -> list:
+    """
+    Returns Solr's analysis responses for many texts, in input order.
+
+    Duplicate texts are analyzed once. With the "local" backend the texts are analyzed
+    in-process; otherwise cached responses are reused and the remaining texts are sent to
+    Solr concurrently over the pooled session.
+
+    Args:
+        texts (list): The texts to be analyzed.
+        desired_field_type (str): The Solr field type to use for analysis.
+
+    Returns:
+        list: The JSON responses from Solr, one per input text.
+    """
+    if ANALYSIS_BACKEND == "local":
+        responses = {}
+        for text in dict.fromkeys(texts):
+            with instrumentation.recorder.timed("local.analysis"):
+                responses[text] = local_analyzer.analyze(text, desired_field_type)
+        return [responses[text] for text in texts]
+
+    cache = get_cache()
+    responses = {}
+    texts_to_fetch = []
+
+    for text in dict.fromkeys(texts):
+        cached_result = cache.get(desired_field_type, text) if cache is not None else None
+        if cached_result is not None:
+            responses[text] = cached_result
+        else:
+            texts_to_fetch.append(text)
+
+    if cache is not None:
+        instrumentation.recorder.record_cache("Normalization cache", len(responses), len(texts_to_fetch))
+
+    if texts_to_fetch:
+        def fetch(text: str) -> dict:
+            return analyze_text(solr_url=SOLR_URL, core_name=CORE_NAME, field_type=desired_field_type, text_to_analyze=text)
+
+        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(texts_to_fetch))) as executor:
+            for text, analysis_result in zip(texts_to_fetch, executor.map(fetch, texts_to_fetch)):
+                responses[text] = analysis_result
+                if cache is not None:
+                    cache.put(desired_field_type, text, analysis_result)
+
+    return [responses[text] for text in texts]
+
 def normalize(text_to_analyze: str, desired_field_type: str) -> dict:
     """
     Normalizes text by analyzing it using Solr's analysis endpoint.
@@ -14,8 +137,21 @@ def normalize(text_to_analyze: str, desired_field_type: str) -> dict:
     Returns:
         dict: A dictionary containing the normalized text and filter changes.
     """
-    analysis_result = analyze_text(solr_url=SOLR_URL, core_name=CORE_NAME, field_type=desired_field_type, text_to_analyze=text_to_analyze)
-    return get_normalized_result(analysis_result, desired_field_type, text_to_analyze)
+    return normalize_many([text_to_analyze], desired_field_type)[0]
+
+def normalize_many(texts: list, desired_field_type: str) -> list:
+    """
+    Normalizes many texts with batched, concurrent requests to Solr's analysis endpoint.
+
+    Args:
+        texts (list): The texts to be analyzed and normalized.
+        desired_field_type (str): The Solr field type to use for analysis.
+
+    Returns:
+        list: One dictionary of normalized text and filter changes per input text, in input order.
+    """
+    analysis_results = fetch_analysis_many(texts, desired_field_type)
+    return [get_normalized_result(analysis_result, desired_field_type, text) for text, analysis_result in zip(texts, analysis_results)]
 
 def get_raw_normalized_result(text_to_analyze: str, desired_field_type: str) -> list:
     """
@@ -28,8 +164,21 @@ def get_raw_normalized_result(text_to_analyze: str, desired_field_type: str) ->
     Returns:
         list: A list of tokenized results from Solr's analysis.
     """
-    analysis_result = analyze_text(solr_url=SOLR_URL, core_name=CORE_NAME, field_type=desired_field_type, text_to_analyze=text_to_analyze)
-    return analysis_result.get('analysis', {}).get('field_types', {}).get(desired_field_type, {}).get('index', [])
+    return get_raw_normalized_result_many([text_to_analyze], desired_field_type)[0]
+
+def get_raw_normalized_result_many(texts: list, desired_field_type: str) -> list:
+    """
+    Retrieves the raw normalized results for many texts from Solr's analysis responses.
+
+    Args:
+        texts (list): The texts to be analyzed.
+        desired_field_type (str): The Solr field type to use for analysis.
+
+    Returns:
+        list: One list of tokenized results per input text, in input order.
+    """
+    analysis_results = fetch_analysis_many(texts, desired_field_type)
+    return [extract_index_phases(analysis_result, desired_field_type) for analysis_result in analysis_results]
 
 def get_normalized_final_text(text_to_analyze: str, desired_field_type: str) -> str:
     """
@@ -42,8 +191,51 @@ def get_normalized_final_text(text_to_analyze: str, desired_field_type: str) ->
     Returns:
         str: The final normalized text, concatenated as a single string.
     """
-    normalized_result = get_raw_normalized_result(text_to_analyze, desired_field_type)
+    return get_normalized_final_text_many([text_to_analyze], desired_field_type)[0]
+
+def get_normalized_final_text_many(texts: list, desired_field_type: str) -> list:
+    """
+    Extracts and returns the final normalized text for many texts.
+
+    Args:
+        texts (list): The texts to be analyzed.
+        desired_field_type (str): The Solr field type to use for analysis.
+
+    Returns:
+        list: One final normalized string per input text, in input order.
+    """
+    if ANALYSIS_BACKEND == "local":
+        final_texts = {}
+        for text in dict.fromkeys(texts):
+            with instrumentation.recorder.timed("local.analysis"):
+                final_texts[text] = local_analyzer.final_text(text, desired_field_type)
+        return [final_texts[text] for text in texts]
+
+    return [extract_final_text(normalized_result) for normalized_result in get_raw_normalized_result_many(texts, desired_field_type)]
+
+def extract_index_phases(response: dict, field_type: str) -> list:
+    """
+    Extracts the per-phase index analysis from Solr's analysis response.
+
+    Args:
+        response (dict): The JSON response from Solr's analysis.
+        field_type (str): The Solr field type used for analysis.
+
+    Returns:
+        list: A list of tokenized results, one entry per char filter, tokenizer and filter.
+    """
+    return response.get('analysis', {}).get('field_types', {}).get(field_type, {}).get('index', [])
+
+def extract_final_text(normalized_result: list) -> str:
+    """
+    Joins the token texts of the last analysis phase into a single string.
 
+    Args:
+        normalized_result (list): A list of tokenized results from Solr's analysis.
+
+    Returns:
+        str: The final normalized text, concatenated as a single string.
+    """
     # Extract the 'text' fields from the last filter phase
     last_filter = normalized_result[-1] if normalized_result else {}
     texts = [token['text'] for token in list(last_filter.values())[0]] if last_filter else []
@@ -70,7 +262,8 @@ def analyze_text(solr_url: str, core_name: str, field_type: str, text_to_analyze
         'analysis.fieldtype': field_type,
         'analysis.fieldvalue': text_to_analyze
     }
-    response = requests.get(analysis_url, params=params)
+    with instrumentation.recorder.timed("solr.analysis"):
+        response = get_session().get(analysis_url, params=params, timeout=REQUEST_TIMEOUT)
     response.raise_for_status()  # Raise an exception for HTTP errors
     return response.json()
 
@@ -86,7 +279,7 @@ def get_normalized_result(response: dict, field_type: str, original_text: str) -
     Returns:
         dict: A dictionary with filter changes and the final normalized result.
     """
-    analysis_result = response.get('analysis', {}).get('field_types', {}).get(field_type, {}).get('index', [])
+    analysis_result = extract_index_phases(response, field_type)
     if not analysis_result:
         return {}
 
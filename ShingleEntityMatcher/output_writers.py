@@ -0,0 +1,144 @@
+import csv
+import os
+import sys
+import time
+from typing import Union
+
+# Rows buffered per output file before they are written with writerows
+BUFFER_ROWS = 5000
+
+# Minimum number of seconds between two progress lines
+PROGRESS_INTERVAL = 5.0
+
+def sync_file(file) -> int:
+    """
+    Flushes a file to disk and returns its position.
+    """
+    file.flush()
+    os.fsync(file.fileno())
+    return file.tell()
+
+class BufferedCsvWriter:
+    """
+    A CSV writer that keeps its file open for the whole stage and writes rows in batches.
+
+    Rows passed to writerow are buffered and written with a single writerows call once
+    buffer_rows of them are pending, and on flush or close.
+    """
+
+    def __init__(self, file_name: str, mode: str = 'a', buffer_rows: int = BUFFER_ROWS):
+        self.file_name = file_name
+        self.buffer_rows = buffer_rows
+        self.rows_written = 0
+        self._file = open(file_name, mode=mode, newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        self._buffer = []
+
+    def writerow(self, row: list) -> None:
+        self._buffer.append(row)
+        if len(self._buffer) >= self.buffer_rows:
+            self.flush()
+
+    def writerows(self, rows) -> None:
+        for row in rows:
+            self.writerow(row)
+
+    def flush(self) -> None:
+        """
+        Writes the buffered rows and flushes the file.
+        """
+        if self._buffer:
+            self._writer.writerows(self._buffer)
+            self.rows_written += len(self._buffer)
+            self._buffer.clear()
+        self._file.flush()
+
+    def sync(self) -> int:
+        """
+        Writes the buffered rows, flushes the file to disk and returns its size.
+        """
+        self.flush()
+        return sync_file(self._file)
+
+    def close(self) -> None:
+        """
+        Writes any buffered rows and closes the file.
+        """
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self) -> 'BufferedCsvWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+class RowCollector:
+    """
+    Collects the rows passed to writerow and writerows instead of writing them to a file.
+    """
+
+    def __init__(self):
+        self.rows = []
+
+    def writerow(self, row: list) -> None:
+        self.rows.append(row)
+
+    def writerows(self, rows) -> None:
+        self.rows.extend(rows)
+
+# What the search analysis writes its output rows to: a buffered output file, or a
+# collector capturing one query's rows for the search result cache
+RowWriter = Union[BufferedCsvWriter, RowCollector]
+
+class ProgressReporter:
+    """
+    Prints a progress line at most once per interval, with the processing rate and any
+    extra counters, instead of one line per processed item.
+    """
+
+    def __init__(self, label: str, total: int = None, interval: float = PROGRESS_INTERVAL, stream=None):
+        self.label = label
+        self.total = total
+        self.interval = interval
+        self.stream = stream or sys.stdout
+        self.count = 0
+        self.counters = {}
+        self._start_time = time.monotonic()
+        self._last_report = self._start_time
+
+    def update(self, count: int = 1, **counters) -> None:
+        """
+        Records processed items and increments named counters, reporting if the interval has passed.
+
+        Args:
+            count (int): Number of items processed since the last update.
+            **counters: Amounts to add to named counters (e.g. problematic=1).
+        """
+        self.count += count
+        for name, amount in counters.items():
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+        now = time.monotonic()
+        if now - self._last_report >= self.interval:
+            self._last_report = now
+            self.report()
+
+    def report(self) -> None:
+        """
+        Prints the current progress line.
+        """
+        elapsed = time.monotonic() - self._start_time
+        rate = self.count / elapsed if elapsed else 0.0
+        progress = f"{self.count}/{self.total}" if self.total is not None else f"{self.count}"
+        extras = ''.join(f", {name}: {value}" for name, value in self.counters.items())
+        print(f"{self.label}: {progress} ({rate:.0f}/s{extras})", file=self.stream, flush=True)
+
+    def finish(self) -> None:
+        """
+        Prints the final totals.
+        """
+        elapsed = time.monotonic() - self._start_time
+        extras = ''.join(f", {name}: {value}" for name, value in self.counters.items())
+        print(f"{self.label}: {self.count} done in {elapsed:.1f}s{extras}", file=self.stream, flush=True)
@@ -1,11 +1,12 @@
 import csv
+import instrumentation
 import normalizer
 import synonym_string_list_generator
 
-def rollup_queries(input_csv_path, output_csv_path):
-    normalized_queries = []
-    normalized_queries_expanded = []
+# Upper bound on the synonym variants expanded per query; heavily-synonymed queries are truncated
+MAX_SYNONYM_EXPANSIONS = 1024
 
+def rollup_queries(input_csv_path, output_csv_path):
     with open(input_csv_path, newline='', encoding='utf-8') as csvfile:
         csvreader = csv.reader(csvfile)
         # Skip the header
@@ -13,17 +14,22 @@ def rollup_queries(input_csv_path, output_csv_path):
 
         print ("Rolling up similar queries...")
 
-        for row in csvreader:
-            if row:
-                original_query = row[0]
-                normalized_query = normalizer.get_normalized_final_text(original_query, 'dig_practice_char_stem')
-                normalized_queries.append(normalized_query)
-
-                normalized_query_expanded_result = normalizer.get_raw_normalized_result(original_query, 'dig_practice_char_syns_stem')
-                normalized_query_expanded = synonym_string_list_generator.reconstruct_strings(normalized_query_expanded_result)
-                normalized_queries_expanded.append('/'.join(normalized_query_expanded))
-
-        process_csv(input_csv_path, output_csv_path, normalized_queries, normalized_queries_expanded)
+        original_queries = [row[0] for row in csvreader if row]
+
+        # Normalize all queries with batched analysis requests for both field types
+        with instrumentation.recorder.stage("normalization") as stage:
+            stage.rows = len(original_queries)
+            normalized_queries = normalizer.get_normalized_final_text_many(original_queries, 'dig_practice_char_stem')
+            normalized_queries_expanded = [
+                '/'.join(synonym_string_list_generator.iter_strings(
+                    normalized_query_expanded_result, max_expansions=MAX_SYNONYM_EXPANSIONS, unique=True
+                ))
+                for normalized_query_expanded_result in normalizer.get_raw_normalized_result_many(original_queries, 'dig_practice_char_syns_stem')
+            ]
+
+        with instrumentation.recorder.stage("aggregation") as stage:
+            stage.rows = len(original_queries)
+            process_csv(input_csv_path, output_csv_path, normalized_queries, normalized_queries_expanded)
         print ("Roll up completed.")
 
 # Function to normalize revenue (removing $ and commas)
@@ -34,6 +40,24 @@ def normalize_revenue(revenue_str):
 def format_revenue(revenue_float):
     return f"${revenue_float:,.2f}"
 
+# Function to index the rows of List B by each of their expanded query variants
+def build_variant_index(list_b):
+    """
+    Builds an inverted index from each expanded query variant to the rows that contain it.
+
+    Args:
+        list_b (list): Slash-separated expanded variants of each row's query.
+
+    Returns:
+        dict: Variant to the ascending list of row indices whose expansion contains it,
+              with each row listed at most once per variant.
+    """
+    variant_index = {}
+    for b_index, query_b in enumerate(list_b):
+        for variant in set(query_b.split('/')):
+            variant_index.setdefault(variant, []).append(b_index)
+    return variant_index
+
 # Function to process the input CSV and generate the output CSV
 def process_csv(input_csv, output_csv, list_a, list_b):
     rows = []
@@ -45,6 +69,9 @@ def process_csv(input_csv, output_csv, list_a, list_b):
         for row in reader:
             rows.append(row)
 
+    # Look up the rows whose expansion contains a normalized query instead of scanning all of List B
+    variant_index = build_variant_index(list_b)
+
     # Iterate through List A
     for a_index, normalized_query in enumerate(list_a):
         if a_index in rolled_up_indices:
@@ -54,27 +81,28 @@ def process_csv(input_csv, output_csv, list_a, list_b):
         revenue_a = normalize_revenue(rows[a_index]['Revenue'])
         normalization_filters_a = rows[a_index]['Normalization Filters'].split('/')
 
-        aggregation_dict[normalized_query] = [a_index, visits_a, revenue_a, [], set(normalization_filters_a)]
-
-        for b_index, query_b in enumerate(list_b):
-            queries_b_split = query_b.split('/')
-            if normalized_query in queries_b_split and b_index != a_index:
-                matched_row = rows[b_index]
-                visits_b = int(matched_row['Visits'])
-                revenue_b = normalize_revenue(matched_row['Revenue'])
-                normalization_filters = matched_row['Normalization Filters'].split('/')     
-
-                if normalized_query in aggregation_dict:
-                    if visits_b > aggregation_dict[normalized_query][1]:
-                        aggregation_dict[normalized_query][0] = b_index  # Update best index if current visits are higher
-                        
-                    aggregation_dict[normalized_query][1] += visits_b  # Aggregate visits
-                    aggregation_dict[normalized_query][2] += revenue_b  # Aggregate revenue
-                    aggregation_dict[normalized_query][3].append(rows[b_index]["Problematic Search Query"])  # Add the matched query to the list
-                    aggregation_dict[normalized_query][4].update(normalization_filters)  # Add normalization filters
-
-                # Add the b_index to the rolled_up_indices set to ignore it later
-                rolled_up_indices.add(b_index)
+        aggregation = [a_index, visits_a, revenue_a, [], set(normalization_filters_a)]
+        aggregation_dict[normalized_query] = aggregation
+
+        for b_index in variant_index.get(normalized_query, ()):
+            if b_index == a_index:
+                continue
+
+            matched_row = rows[b_index]
+            visits_b = int(matched_row['Visits'])
+            revenue_b = normalize_revenue(matched_row['Revenue'])
+            normalization_filters = matched_row['Normalization Filters'].split('/')
+
+            if visits_b > aggregation[1]:
+                aggregation[0] = b_index  # Update best index if current visits are higher
+
+            aggregation[1] += visits_b  # Aggregate visits
+            aggregation[2] += revenue_b  # Aggregate revenue
+            aggregation[3].append(matched_row["Problematic Search Query"])  # Add the matched query to the list
+            aggregation[4].update(normalization_filters)  # Add normalization filters
+
+            # Add the b_index to the rolled_up_indices set to ignore it later
+            rolled_up_indices.add(b_index)
 
     # Write the final CSV
     with open(output_csv, mode='w', newline='', encoding='utf-8') as file:
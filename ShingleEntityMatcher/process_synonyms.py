@@ -1,16 +1,13 @@
 import csv
-import shingles_dict_generator
-from sortedcontainers import SortedDict
+import shingle_dictionary_artifact
 
 ENTITY_TABLE_CSV = 'ShingleEntityMatcher/entity_table_new.csv'
 SYNONYMS_TXT = 'ShingleEntityMatcher/lulu_solr_synonyms.txt'
 SYNONYM_MATCHES_CSV = 'ShingleEntityMatcher/Output/SynonymExpansions.csv'
 REWRITTEN_SYNONYMS_TXT = 'ShingleEntityMatcher/Output/synonyms.txt'
 
-# Global SortedDict to store shingles with their corresponding details
-shingles_dict = SortedDict()
-
-shingles_dict_generator.read_csv_and_populate_shingles_dict(ENTITY_TABLE_CSV, shingles_dict)
+# Global shingles dictionary with their corresponding details, mapped from the compiled artifact
+shingles_dict, _ = shingle_dictionary_artifact.load_or_build(ENTITY_TABLE_CSV)
 
 def process_synonyms(shingles_dict: dict) -> None:
     """
@@ -0,0 +1,273 @@
+import argparse
+import csv
+import itertools
+import os
+import re
+import sqlite3
+from decimal import Decimal, ROUND_HALF_EVEN
+import pandas as pd
+
+RESULTS_DB_PATH = 'ShingleEntityMatcher/Output/analysis_results.sqlite'
+MATCHED_TABLE_CSV = 'ShingleEntityMatcher/Output/MatchedTable.csv'
+UNMATCHED_TABLE_CSV = 'ShingleEntityMatcher/Output/UnmatchedTable.csv'
+PROBLEMATIC_SEARCHES_CSV = 'ShingleEntityMatcher/Output/potentially_problematic_searches.csv'
+ROLLED_UP_PROBLEMATIC_SEARCHES_CSV = 'ShingleEntityMatcher/Output/rolled_up_searches.csv'
+
+# Rows inserted per executemany call while bulk loading
+BULK_INSERT_ROWS = 50000
+
+# A field(value) entry of the Catalog Field column, e.g. "collections(define)". The value is
+# the entry's dictionary tokens, sorted and joined with '_', e.g. "collections(train_wunder)"
+CATALOG_FIELD_PATTERN = re.compile(r'(\w+)\(([^()]*)\)')
+
+SCHEMA = [
+    'CREATE TABLE matched (id INTEGER PRIMARY KEY, matched_shingle TEXT NOT NULL, entities TEXT NOT NULL, '
+    'shingle_type TEXT NOT NULL, entity_type TEXT NOT NULL, search_query TEXT NOT NULL, visits INTEGER NOT NULL, '
+    'revenue_cents INTEGER NOT NULL, overlap TEXT NOT NULL, entity_overlaps INTEGER NOT NULL, '
+    'entity_type_overlaps INTEGER NOT NULL)',
+    'CREATE TABLE matched_entity_types (matched_id INTEGER NOT NULL, entity_type TEXT NOT NULL)',
+    'CREATE TABLE unmatched (id INTEGER PRIMARY KEY, unmatched_shingle TEXT NOT NULL, search_query TEXT NOT NULL, '
+    'visits INTEGER NOT NULL, revenue_cents INTEGER NOT NULL)',
+    'CREATE TABLE problematic (id INTEGER PRIMARY KEY, search_query TEXT NOT NULL, legitimate TEXT NOT NULL, '
+    'catalog_field TEXT NOT NULL, normalization_filters TEXT NOT NULL, visits INTEGER NOT NULL, '
+    'revenue_cents INTEGER NOT NULL)',
+    'CREATE TABLE rolled_up (id INTEGER PRIMARY KEY, search_query TEXT NOT NULL, legitimate TEXT NOT NULL, '
+    'catalog_field TEXT NOT NULL, normalization_filters TEXT NOT NULL, visits INTEGER NOT NULL, '
+    'revenue_cents INTEGER NOT NULL, rolled_up_queries TEXT NOT NULL)',
+    'CREATE TABLE catalog_fields (source TEXT NOT NULL, row_id INTEGER NOT NULL, entry INTEGER NOT NULL, '
+    'field TEXT NOT NULL, value TEXT NOT NULL, token TEXT NOT NULL)',
+]
+
+# Created after the bulk load, which is faster than maintaining them row by row
+INDEXES = [
+    'CREATE INDEX matched_shingle ON matched (matched_shingle)',
+    'CREATE INDEX matched_query ON matched (search_query)',
+    'CREATE INDEX matched_entity_types_type ON matched_entity_types (entity_type, matched_id)',
+    'CREATE INDEX unmatched_shingle ON unmatched (unmatched_shingle)',
+    'CREATE INDEX unmatched_query ON unmatched (search_query)',
+    'CREATE INDEX problematic_query ON problematic (search_query)',
+    'CREATE INDEX rolled_up_query ON rolled_up (search_query)',
+    'CREATE INDEX catalog_fields_token ON catalog_fields (field, token, source, row_id, entry)',
+]
+
+def parse_visits(visits: str) -> int:
+    return int(visits.replace(',', ''))
+
+def parse_revenue_cents(revenue: str) -> int:
+    """
+    Parses a revenue string such as "$412,133.45" into integer cents.
+    """
+    amount = Decimal(revenue.replace('$', '').replace(',', '')) * 100
+    return int(amount.to_integral_value(rounding=ROUND_HALF_EVEN))
+
+def read_rows(csv_path: str):
+    """
+    Yields the rows of an output CSV after its header.
+    """
+    with open(csv_path, newline='', encoding='utf-8') as csv_file:
+        reader = csv.reader(csv_file)
+        next(reader, None)
+        for row in reader:
+            if row:
+                yield row
+
+def insert_bulk(connection: sqlite3.Connection, statement: str, rows) -> int:
+    """
+    Inserts rows with executemany in chunks of BULK_INSERT_ROWS.
+
+    Returns:
+        int: The number of rows inserted.
+    """
+    inserted = 0
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, BULK_INSERT_ROWS))
+        if not chunk:
+            return inserted
+        connection.executemany(statement, chunk)
+        inserted += len(chunk)
+
+def matched_rows(csv_path: str, entity_types: list):
+    for row_id, row in enumerate(read_rows(csv_path), start=1):
+        shingle, entities, shingle_type, entity_type, query, visits, revenue, overlap, entity_overlaps, entity_type_overlaps = row
+        entity_types.extend((row_id, name) for name in entity_type.split('|') if name)
+        yield (row_id, shingle, entities, shingle_type, entity_type, query, parse_visits(visits), parse_revenue_cents(revenue),
+               overlap, int(entity_overlaps), int(entity_type_overlaps))
+
+def unmatched_rows(csv_path: str):
+    for row_id, (shingle, query, visits, revenue) in enumerate(read_rows(csv_path), start=1):
+        yield row_id, shingle, query, parse_visits(visits), parse_revenue_cents(revenue)
+
+def problematic_rows(csv_path: str, source: str, catalog_fields: list):
+    for row_id, row in enumerate(read_rows(csv_path), start=1):
+        query, legitimate, catalog_field, filters, visits, revenue = row[:6]
+        # One row per token of every field(value) entry, so a multi-word value matches in any order
+        for entry, (field, value) in enumerate(CATALOG_FIELD_PATTERN.findall(catalog_field)):
+            catalog_fields.extend((source, row_id, entry, field, value, token) for token in value.split('_'))
+        yield (row_id, query, legitimate, catalog_field, filters, parse_visits(visits), parse_revenue_cents(revenue)) + tuple(row[6:7])
+
+def load_results(db_path: str = RESULTS_DB_PATH, matched_csv: str = MATCHED_TABLE_CSV, unmatched_csv: str = UNMATCHED_TABLE_CSV,
+                 problematic_csv: str = PROBLEMATIC_SEARCHES_CSV, rolled_up_csv: str = ROLLED_UP_PROBLEMATIC_SEARCHES_CSV) -> dict:
+    """
+    Bulk loads the analysis output CSVs into an indexed SQLite results store.
+
+    Visits and revenue are stored as integers (revenue in cents). Entity types of matched
+    shingles and the field(value) entries of Catalog Field are split into their own indexed
+    tables. The store is built next to db_path and replaces it only once complete.
+
+    Args:
+        db_path (str): Path to the SQLite results store.
+        matched_csv (str): Path to the MatchedTable CSV.
+        unmatched_csv (str): Path to the UnmatchedTable CSV.
+        problematic_csv (str): Path to the potentially problematic searches CSV.
+        rolled_up_csv (str): Path to the rolled up searches CSV.
+
+    Returns:
+        dict: Table name to the number of rows loaded.
+    """
+    print(f"Loading analysis results into {db_path}...")
+    temp_path = f'{db_path}.tmp'
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+
+    connection = sqlite3.connect(temp_path)
+    connection.execute('PRAGMA journal_mode=OFF')
+    connection.execute('PRAGMA synchronous=OFF')
+    counts = {}
+    try:
+        with connection:
+            for statement in SCHEMA:
+                connection.execute(statement)
+
+            entity_types = []
+            counts['matched'] = insert_bulk(connection, 'INSERT INTO matched VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                            matched_rows(matched_csv, entity_types))
+            insert_bulk(connection, 'INSERT INTO matched_entity_types VALUES (?, ?)', entity_types)
+            counts['unmatched'] = insert_bulk(connection, 'INSERT INTO unmatched VALUES (?, ?, ?, ?, ?)', unmatched_rows(unmatched_csv))
+
+            catalog_fields = []
+            counts['problematic'] = insert_bulk(connection, 'INSERT INTO problematic VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                                problematic_rows(problematic_csv, 'problematic', catalog_fields))
+            counts['rolled_up'] = insert_bulk(connection, 'INSERT INTO rolled_up VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                              problematic_rows(rolled_up_csv, 'rolled_up', catalog_fields))
+            insert_bulk(connection, 'INSERT INTO catalog_fields VALUES (?, ?, ?, ?, ?, ?)', catalog_fields)
+
+            for statement in INDEXES:
+                connection.execute(statement)
+        connection.execute('ANALYZE')
+    finally:
+        connection.close()
+    os.replace(temp_path, db_path)
+
+    print("Loaded " + ", ".join(f"{count} {table}" for table, count in counts.items()) + " rows.")
+    return counts
+
+def top_unmatched_shingles(connection: sqlite3.Connection, limit: int, query: str = None) -> pd.DataFrame:
+    """
+    Unmatched shingles by total revenue, optionally only those of queries containing a word.
+    """
+    where, params = '', []
+    if query:
+        where, params = "WHERE search_query = ? OR ' ' || search_query || ' ' LIKE ?", [query, f'% {query} %']
+    return pd.read_sql_query(
+        f'SELECT unmatched_shingle AS "Unmatched Shingle", COUNT(*) AS "Queries", SUM(visits) AS "Visits", '
+        f'SUM(revenue_cents) / 100.0 AS "Revenue" FROM unmatched {where} '
+        'GROUP BY unmatched_shingle ORDER BY SUM(revenue_cents) DESC LIMIT ?',
+        connection, params=params + [limit]
+    )
+
+def top_matched_shingles(connection: sqlite3.Connection, limit: int, entity_type: str = None) -> pd.DataFrame:
+    """
+    Matched shingles by total revenue, optionally only those matching an entity type.
+    """
+    join, params = '', []
+    if entity_type:
+        join, params = 'JOIN matched_entity_types t ON t.matched_id = m.id AND t.entity_type = ?', [entity_type]
+    return pd.read_sql_query(
+        'SELECT m.matched_shingle AS "Matched Shingle", m.entity_type AS "Entity Type", COUNT(*) AS "Queries", '
+        f'SUM(m.visits) AS "Visits", SUM(m.revenue_cents) / 100.0 AS "Revenue" FROM matched m {join} '
+        'GROUP BY m.matched_shingle, m.entity_type ORDER BY SUM(m.revenue_cents) DESC LIMIT ?',
+        connection, params=params + [limit]
+    )
+
+def problematic_queries(connection: sqlite3.Connection, limit: int, field: str = None, value: str = None,
+                        legitimate: str = None, rolled_up: bool = False) -> pd.DataFrame:
+    """
+    Problematic queries by revenue, optionally only those whose Catalog Field has field(value).
+
+    Catalog Field values are the entry's dictionary tokens, sorted and joined with '_' (a
+    collection "Wunder Train" is stored as collections(train_wunder)). value is split on
+    spaces and underscores and matches an entry of field holding all of its tokens in any
+    order, so "wunder train", "train_wunder" and "train" all find collections(train_wunder).
+    """
+    table = 'rolled_up' if rolled_up else 'problematic'
+    conditions, params = [], []
+    if field:
+        condition = f"p.id IN (SELECT row_id FROM catalog_fields WHERE source = '{table}' AND field = ?"
+        params.append(field)
+        tokens = sorted({token for token in re.split(r'[\s_]+', value.lower()) if token}) if value else []
+        if tokens:
+            condition += (f" AND token IN ({', '.join('?' * len(tokens))}) "
+                          'GROUP BY row_id, entry HAVING COUNT(DISTINCT token) = ?')
+            params.extend(tokens + [len(tokens)])
+        conditions.append(condition + ')')
+    if legitimate:
+        conditions.append('p.legitimate = ?')
+        params.append(legitimate)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    return pd.read_sql_query(
+        'SELECT p.search_query AS "Problematic Search Query", p.legitimate AS "Legitimate", p.catalog_field AS "Catalog Field", '
+        f'p.visits AS "Visits", p.revenue_cents / 100.0 AS "Revenue" FROM {table} p {where} '
+        'ORDER BY p.revenue_cents DESC LIMIT ?',
+        connection, params=params + [limit]
+    )
+
+def query_shingles(connection: sqlite3.Connection, search_query: str) -> pd.DataFrame:
+    """
+    Every matched and unmatched shingle of one search query.
+    """
+    return pd.read_sql_query(
+        'SELECT matched_shingle AS "Shingle", \'matched\' AS "Table", entity_type AS "Entity Type", visits AS "Visits", '
+        'revenue_cents / 100.0 AS "Revenue" FROM matched WHERE search_query = ? '
+        'UNION ALL SELECT unmatched_shingle, \'unmatched\', \'\', visits, revenue_cents / 100.0 FROM unmatched WHERE search_query = ?',
+        connection, params=[search_query, search_query]
+    )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load the analysis results into SQLite and run the common reports.")
+    parser.add_argument('--db', default=RESULTS_DB_PATH, help="Path to the results store")
+    parser.add_argument('--load', action='store_true', help="(Re)build the store from the output CSVs first")
+    parser.add_argument('report', nargs='?', choices=['top-unmatched', 'top-matched', 'problematic', 'query'],
+                        help="Report to run")
+    parser.add_argument('--limit', type=int, default=50, help="Rows to show")
+    parser.add_argument('--entity-type', help="top-matched: only shingles matching this entity type")
+    parser.add_argument('--query', help="top-unmatched: only queries containing this word; query: the search query to show")
+    parser.add_argument('--field', help="problematic: only queries with this catalog field, e.g. collections")
+    parser.add_argument('--value', help="problematic: only queries whose catalog field entry has all these tokens, in any order; "
+                                        "values are stored as sorted '_'-joined tokens, e.g. 'wunder train' finds train_wunder")
+    parser.add_argument('--legitimate', choices=['Y', 'N'], help="problematic: only queries with this verdict")
+    parser.add_argument('--rolled-up', action='store_true', help="problematic: report the rolled up searches")
+    parser.add_argument('--csv', help="Write the report to this CSV instead of printing it")
+    args = parser.parse_args()
+
+    if args.load:
+        load_results(args.db)
+    if args.report:
+        connection = sqlite3.connect(f'file:{args.db}?mode=ro', uri=True)
+        try:
+            if args.report == 'top-unmatched':
+                report = top_unmatched_shingles(connection, args.limit, args.query)
+            elif args.report == 'top-matched':
+                report = top_matched_shingles(connection, args.limit, args.entity_type)
+            elif args.report == 'problematic':
+                report = problematic_queries(connection, args.limit, args.field, args.value, args.legitimate, args.rolled_up)
+            else:
+                if not args.query:
+                    parser.error("the query report needs --query")
+                report = query_shingles(connection, args.query)
+        finally:
+            connection.close()
+        if args.csv:
+            report.to_csv(args.csv, index=False)
+        else:
+            print(report.to_string(index=False))
@@ -1,12 +1,31 @@
+import argparse
 import csv
-from sortedcontainers import SortedDict
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import shutil
+from array import array
+from collections.abc import Mapping
+from shingle_dictionary import ShingleDictionary
 import visits_revenue_aggregator
 import catalog_match_checker
-import shingles_dict_generator
+import shingle_dictionary_artifact
 import problematic_query_rollup
+import shingle_matcher
+import output_writers
+import lru_memo
+import catalog_bitmap_index
+import instrumentation
+import search_checkpoint
+import search_result_cache
+import aggregate_store
+import results_store
 
 # Global Constants for filenames
 ENTITY_TABLE_CSV = 'ShingleEntityMatcher/entity_table_new.csv'
+DICTIONARY_TXT = 'ShingleEntityMatcher/dictionary.txt'
 MATCHED_TABLE_CSV = 'ShingleEntityMatcher/Output/MatchedTable.csv'
 UNMATCHED_TABLE_CSV = 'ShingleEntityMatcher/Output/UnmatchedTable.csv'
 LULU_TERMS_CSV = 'ClientData/lululemon search terms - may-aug.csv'
@@ -15,79 +34,88 @@ SYNONYMS_TXT = 'ShingleEntityMatcher/lulu_solr_synonyms.txt'
 SYNONYM_MATCHES_CSV = 'ShingleEntityMatcher/SynonymExpansions.csv'
 PROBLEMATIC_SEARCHES_CSV = 'ShingleEntityMatcher/Output/potentially_problematic_searches.csv'
 ROLLED_UP_PROBLEMATIC_SEARCHES_CSV = 'ShingleEntityMatcher/Output/rolled_up_searches.csv'
+RUN_REPORT_JSON = 'ShingleEntityMatcher/Output/run_report.json'
+PROFILE_DIR = 'ShingleEntityMatcher/Output/profiles'
+CHECKPOINT_PATH = 'ShingleEntityMatcher/Output/search_analysis_checkpoint.json'
+RESULTS_DB_PATH = 'ShingleEntityMatcher/Output/analysis_results.sqlite'
 
-# Global SortedDict to store shingles with their corresponding details
-shingles_dict = SortedDict()
+# Global shingles dictionary with their corresponding details, mapped from the compiled artifact in main()
+shingles_dict = ShingleDictionary()
 
-def write_dict_to_file(dictionary: SortedDict, file_name: str) -> None:
+# Token trie over the shingles_dict keys, built once the dictionary is populated
+shingle_trie = shingle_matcher.ShingleTrie()
+
+# Shards per worker process in --workers mode, so slow shards do not leave workers idle
+SHARDS_PER_WORKER = 4
+
+# Per-token entity types and filters used by extract_dict_info, by (token, info type)
+DICT_INFO_CACHE_SIZE = 200000
+dict_info_cache = lru_memo.LruMemo(DICT_INFO_CACHE_SIZE)
+
+# Set to True to reuse the output rows of earlier runs for unchanged query rows; the cache
+# file is not evicted and grows with every distinct query row analyzed
+RESULT_CACHE_ENABLED = False
+
+# Namespace of the search result cache for the current dictionary and catalog, set before shard workers fork
+_result_cache_namespace = None
+
+def write_dict_to_file(dictionary: Mapping, file_name: str) -> None:
     """
     Write the sorted dictionary to a text file.
 
     Args:
-        dictionary (SortedDict): The dictionary to write.
+        dictionary (Mapping): The shingles dictionary to write.
         file_name (str): The name of the file to write to.
     """
     with open(file_name, 'w') as file:
         for key, value in dictionary.items():
             file.write(f'{key}: {value}\n')
 
-def write_to_matched_unmatched_csvs(search_query: str, shingles: list, visits: str, revenue: str) -> None:
+def write_to_matched_unmatched_csvs(search_query: str, tokens: list, matched_spans: set, visits: str, revenue: str,
+                                    matched_writer: output_writers.RowWriter, unmatched_writer: output_writers.RowWriter) -> None:
     """
     Write matched and unmatched shingles to their respective CSV files.
 
+    Every contiguous span of the query's tokens is a shingle; spans found by the shingle
+    trie are matched, all others are unmatched.
+
     Args:
         search_query (str): The search query.
-        shingles (list): List of shingles to process.
+        tokens (list): The whitespace-separated tokens of the search query.
+        matched_spans (set): (start, end) token spans that are keys of the shingles dictionary.
         visits (str): Number of visits for the query.
         revenue (str): Revenue generated by the query.
+        matched_writer (RowWriter): Writer for the MatchedTable rows.
+        unmatched_writer (RowWriter): Writer for the UnmatchedTable rows.
     """
-    with open(MATCHED_TABLE_CSV, mode='a', newline='', encoding='utf-8') as matched_file, \
-         open(UNMATCHED_TABLE_CSV, mode='a', newline='', encoding='utf-8') as unmatched_file:
-        
-        matched_writer = csv.writer(matched_file)
-        unmatched_writer = csv.writer(unmatched_file)
-        
-        for shingle in shingles:
-            lower_shingle = shingle.lower()
-            if lower_shingle in shingles_dict:
+    # Spans are visited in the same order as shingles_dict_generator.generate_shingles
+    for start in range(len(tokens)):
+        for end in range(start + 1, len(tokens) + 1):
+            shingle = ' '.join(tokens[start:end])
+            if (start, end) in matched_spans:
                 write_matched_shingles(matched_writer, shingle, search_query, visits, revenue)
             else:
                 unmatched_writer.writerow([shingle, search_query, visits, revenue])
 
-def write_matched_shingles(writer: csv.writer, shingle: str, search_query: str, visits: str, revenue: str) -> None:
+def write_matched_shingles(writer: output_writers.RowWriter, shingle: str, search_query: str, visits: str, revenue: str) -> None:
     """
     Write matched shingles to the matched CSV file.
 
+    Everything that depends only on the shingle comes from the dictionary's precomputed match record.
+
     Args:
-        writer (csv.writer): CSV writer object.
+        writer (RowWriter): Writer for the MatchedTable rows.
         shingle (str): Shingle to write.
         search_query (str): Search query associated with the shingle.
         visits (str): Number of visits for the query.
         revenue (str): Revenue generated by the query.
     """
-    lower_shingle = shingle.lower()
-    matched_entities = {}
-    partial_matches = []
-
-    for entry in shingles_dict[lower_shingle]:
-        entity = entry[0]
-        entity_type = entry[2]
-        matched_entities.setdefault(entity_type, []).append(entity)
-        if entry[1] == "partial":
-            partial_matches.append(entity)
-
-    entity_overlap = len({item for sublist in matched_entities.values() for item in sublist}) > 1
-    entity_type_overlap = len(matched_entities) > 1
-
-    entity_types_str = '|'.join(matched_entities.keys())
-    partial_matches_str = '|'.join(partial_matches) if partial_matches else shingle
+    record = shingles_dict.match_record(shingle.lower())
 
     writer.writerow([
-        shingle, partial_matches_str, "partial" if partial_matches else "full", 
-        entity_types_str, search_query, visits, revenue,
-        "Y" if entity_overlap or entity_type_overlap else "N",
-        len({item for sublist in matched_entities.values() for item in sublist}),
-        len(matched_entities)
+        shingle, record.partial_matches if record.shingle_type == "partial" else shingle, record.shingle_type,
+        record.entity_types, search_query, visits, revenue,
+        record.overlap, record.entity_overlaps, record.entity_type_overlaps
     ])
 
 def initialize_csvs() -> None:
@@ -126,93 +154,512 @@ def extract_dict_info(tokens: list, info_type: str) -> str:
     info_to_tokens = {}
 
     for token in tokens:
-        if token in shingles_dict:
-            lists = shingles_dict[token]
-            for sublist in lists:
-                key_index = 2 if info_type == "entity_type" else -1
-                if sublist[key_index]:
-                    info_to_tokens.setdefault(sublist[key_index], set()).add(token)
+        for info in token_dict_info(token, info_type):
+            info_to_tokens.setdefault(info, set()).add(token)
 
     # Create the final string with unique tokens in parentheses
     final_result = "/".join([f"{key}({ '_'.join(sorted(info_to_tokens[key])) })" for key in info_to_tokens])
 
     return final_result
 
+def token_dict_info(token: str, info_type: str) -> tuple:
+    """
+    Returns the non-empty entity types or filters of a token's dictionary entries, in entry order (memoized).
 
-def process_search_queries() -> None:
+    Args:
+        token (str): The token to look up.
+        info_type (str): Type of information to extract ("entity_type" or "filter").
+
+    Returns:
+        tuple: The information of each entry, empty if the token is not in the dictionary.
     """
-    Process search queries from the aggregated terms CSV and populate matched/unmatched tables.
+    key = (token, info_type)
+    infos = dict_info_cache.get(key)
+    if infos is None:
+        infos = ()
+        if token in shingles_dict:
+            key_index = 2 if info_type == "entity_type" else -1
+            infos = tuple(sublist[key_index] for sublist in shingles_dict[token] if sublist[key_index])
+        dict_info_cache.put(key, infos)
+    return infos
+
+
+def open_search_queries_reader(search_queries_file) -> csv.DictReader:
+    """
+    Creates a CSV reader over the aggregated search terms, with any BOM removed from the header.
+
+    Args:
+        search_queries_file: The opened aggregated search terms CSV.
+
+    Returns:
+        csv.DictReader: The reader.
+    """
+    reader = csv.DictReader(search_queries_file)
+
+    # Check for and remove any Byte Order Mark (BOM) from the first field name, if present
+    if reader.fieldnames and reader.fieldnames[0].startswith('\ufeff'):
+        reader.fieldnames[0] = reader.fieldnames[0].replace('\ufeff', '')
+    return reader
+
+def analyze_search_query(search_phrase: str, visits: str, revenue: str, matched_writer: output_writers.RowWriter,
+                         unmatched_writer: output_writers.RowWriter, problematic_writer: output_writers.RowWriter) -> bool:
+    """
+    Matches one search query and writes its shingles and, if it is problematic, its problematic search row.
+
+    Args:
+        search_phrase (str): The search query.
+        visits (str): Number of visits for the query.
+        revenue (str): Revenue generated by the query.
+        matched_writer (RowWriter): Writer for the MatchedTable rows.
+        unmatched_writer (RowWriter): Writer for the UnmatchedTable rows.
+        problematic_writer (RowWriter): Writer for the problematic search rows.
+
+    Returns:
+        bool: Whether the query was written as a problematic search.
     """
-    # Open the aggregated search terms CSV for reading and the problematic searches CSV for appending
-    with open(LULU_TERMS_AGGREGATED_CSV, mode='r', newline='', encoding='utf-8') as search_queries_file, \
-         open(PROBLEMATIC_SEARCHES_CSV, mode='a', newline='', encoding='utf-8') as problematic_file:
+    # Tokenize the search phrase and find every dictionary span in one trie walk
+    tokens = search_phrase.split()
+    matched_spans = {(start, end) for start, end, _ in shingle_trie.find_matches(tokens)}
+
+    # Write the search phrase and related info to matched/unmatched CSVs
+    write_to_matched_unmatched_csvs(search_phrase, tokens, matched_spans, visits, revenue, matched_writer, unmatched_writer)
+
+    # Filter tokens present in the shingles dictionary
+    tokens_in_dict = [token for index, token in enumerate(tokens) if (index, index + 1) in matched_spans]
+
+    # Extract entity types associated with the tokens
+    entity_types = extract_dict_info(tokens, "entity_type")
+
+    # Check if the search phrase has more than one token and more than one entity type
+    if len(tokens) > 1 and len(entity_types.split("/")) > 1 and tokens == tokens_in_dict:        
         
-        # Create a CSV reader to process the input search queries
-        reader = csv.DictReader(search_queries_file)
+        # If unnormalized values in the row do not match the catalog, mark as problematic
+        if not catalog_match_checker.check_unnormalized_values_in_row(tokens_in_dict, shingles_dict):
+            problematic_query_row = [search_phrase, "N", entity_types, "", visits, revenue]
+
+            # If normalized values match, update the legitimacy and filter info accordingly
+            if catalog_match_checker.check_normalized_values_in_row(tokens_in_dict, shingles_dict):
+                problematic_query_row = [
+                    search_phrase, "Y", entity_types, 
+                    extract_dict_info(tokens_in_dict, "filter"), visits, revenue
+                ]
+            else:
+                problematic_query_row = [
+                    search_phrase, "N", entity_types, 
+                    extract_dict_info(tokens_in_dict, "filter"), visits, revenue
+                ]
 
-        # Check for and remove any Byte Order Mark (BOM) from the first field name, if present
-        if reader.fieldnames and reader.fieldnames[0].startswith('\ufeff'):
-            reader.fieldnames[0] = reader.fieldnames[0].replace('\ufeff', '')
+            # Write the problematic search query to the problematic searches CSV
+            problematic_writer.writerow(problematic_query_row)
+            return True
 
-        # Initialize the CSV writer for the problematic searches file
-        problematic_writer = csv.writer(problematic_file)
-        print("Processing search queries...")
+    return False
+
+def process_search_query_rows(rows, matched_writer: output_writers.BufferedCsvWriter,
+                              unmatched_writer: output_writers.BufferedCsvWriter,
+                              problematic_writer: output_writers.BufferedCsvWriter, progress: output_writers.ProgressReporter = None,
+                              result_cache: search_result_cache.SearchResultCache = None) -> None:
+    """
+    Matches a sequence of search query rows and writes their shingles and problematic queries.
+
+    Args:
+        rows (iterable): Rows of the aggregated search terms CSV, as dictionaries.
+        matched_writer (BufferedCsvWriter): Writer for the MatchedTable CSV.
+        unmatched_writer (BufferedCsvWriter): Writer for the UnmatchedTable CSV.
+        problematic_writer (BufferedCsvWriter): Writer for the problematic searches CSV.
+        progress (ProgressReporter): Optional progress reporter, updated once per row.
+        result_cache (SearchResultCache): Optional cache of the output rows of earlier runs;
+                                          rows found in it are written without being analyzed.
+    """
+    # Iterate over each row in the aggregated search terms CSV
+    for row in rows:
+        search_phrase = row['Search Query']  # Extract the search query phrase
+        visits = row['Visits']              # Extract the number of visits
+        revenue = row['Revenue']            # Extract the associated revenue
+
+        if result_cache is None:
+            problematic = analyze_search_query(search_phrase, visits, revenue, matched_writer, unmatched_writer, problematic_writer)
+        else:
+            row_key = result_cache.row_key(search_phrase, visits, revenue)
+            result = result_cache.get(row_key)
+            if result is None:
+                collectors = (output_writers.RowCollector(), output_writers.RowCollector(), output_writers.RowCollector())
+                analyze_search_query(search_phrase, visits, revenue, *collectors)
+                result = [collector.rows for collector in collectors]
+                result_cache.put(row_key, *result)
+
+            matched_rows, unmatched_rows, problematic_rows = result
+            matched_writer.writerows(matched_rows)
+            unmatched_writer.writerows(unmatched_rows)
+            problematic_writer.writerows(problematic_rows)
+            problematic = bool(problematic_rows)
+
+        if progress:
+            if problematic:
+                progress.update(0, problematic=1)
+            progress.update()
+
+def dictionary_identity() -> dict:
+    """
+    Identifies the loaded shingles dictionary by its entity table and analyzer fingerprint.
+    """
+    return {
+        'entity_table_sha256': shingles_dict.entity_table_sha256.hex(),
+        'fingerprint': shingles_dict.fingerprint.hex(),
+    }
 
-        # Iterate over each row in the aggregated search terms CSV
-        for row in reader:
-            search_phrase = row['Search Query']  # Extract the search query phrase
-            visits = row['Visits']              # Extract the number of visits
-            revenue = row['Revenue']            # Extract the associated revenue
-
-            # Generate shingles (substrings) from the search phrase
-            shingles = shingles_dict_generator.generate_shingles(search_phrase)
-            
-            # Write the search phrase and related info to matched/unmatched CSVs
-            write_to_matched_unmatched_csvs(search_phrase, shingles, visits, revenue)
-
-            # Tokenize the search phrase and filter tokens present in the shingles dictionary
-            tokens = search_phrase.split()
-            tokens_in_dict = [token for token in tokens if token.lower() in shingles_dict]
-
-            # Extract entity types associated with the tokens
-            entity_types = extract_dict_info(tokens, "entity_type")
-
-            # Check if the search phrase has more than one token and more than one entity type
-            if len(tokens) > 1 and len(entity_types.split("/")) > 1 and tokens == tokens_in_dict:        
-                
-                # If unnormalized values in the row do not match the catalog, mark as problematic
-                if not catalog_match_checker.check_unnormalized_values_in_row(tokens_in_dict, shingles_dict):
-                    problematic_query_row = [search_phrase, "N", entity_types, "", visits, revenue]
-
-                    # If normalized values match, update the legitimacy and filter info accordingly
-                    if catalog_match_checker.check_normalized_values_in_row(tokens_in_dict, shingles_dict):
-                        problematic_query_row = [
-                            search_phrase, "Y", entity_types, 
-                            extract_dict_info(tokens_in_dict, "filter"), visits, revenue
-                        ]
-                    else:
-                        problematic_query_row = [
-                            search_phrase, "N", entity_types, 
-                            extract_dict_info(tokens_in_dict, "filter"), visits, revenue
-                        ]
-
-                    # Write the problematic search query to the problematic searches CSV
-                    problematic_writer.writerow(problematic_query_row)
-                    print(f"Processed search query: {search_phrase}")
+def result_cache_namespace() -> str:
+    """
+    Returns the search result cache namespace of the loaded dictionary and the current catalog.
+    """
+    return json.dumps({**dictionary_identity(), 'catalog': catalog_match_checker.catalog_fingerprint()}, sort_keys=True)
 
+def open_result_cache():
+    """
+    Opens the search result cache of the current namespace.
+
+    Returns:
+        SearchResultCache or None: The cache, or None if the result cache is disabled.
+    """
+    if _result_cache_namespace is None:
+        return None
+    return search_result_cache.SearchResultCache(_result_cache_namespace)
+
+def checkpoint_identity() -> dict:
+    """
+    Identifies the run a checkpoint belongs to: its input, outputs and dictionary.
+    """
+    return {
+        'input': os.path.abspath(LULU_TERMS_AGGREGATED_CSV),
+        'outputs': [os.path.abspath(path) for path in (MATCHED_TABLE_CSV, UNMATCHED_TABLE_CSV, PROBLEMATIC_SEARCHES_CSV)],
+        **dictionary_identity(),
+    }
+
+def save_checkpoint(checkpoint: search_checkpoint.SearchCheckpoint, input_offset: int, rows_done: int, writers: tuple) -> None:
+    """
+    Syncs the outputs to disk and records them in a checkpoint.
+    """
+    checkpoint.save(input_offset, rows_done, {writer.file_name: writer.sync() for writer in writers})
+
+def checkpointed_rows(rows, lines: search_checkpoint.CountingLineReader, checkpoint: search_checkpoint.SearchCheckpoint,
+                      rows_done: int, writers: tuple):
+    """
+    Yields the input rows, saving a checkpoint between two rows whenever one is due.
+
+    Args:
+        rows (iterable): The input rows, read from lines.
+        lines (CountingLineReader): The input lines, whose offset is where the next row starts.
+        checkpoint (SearchCheckpoint): The checkpoint to save.
+        rows_done (int): Number of input rows processed before the first of rows.
+        writers (tuple): The output writers.
+    """
+    for row in rows:
+        yield row
+        # The consumer asks for the next row only once this one is written
+        rows_done += 1
+        if checkpoint.due():
+            save_checkpoint(checkpoint, lines.offset, rows_done, writers)
+
+def process_search_queries(workers: int = 1, resume_state: dict = None,
+                           checkpoint: search_checkpoint.SearchCheckpoint = None) -> int:
+    """
+    Process search queries from the aggregated terms CSV and populate matched/unmatched tables.
+
+    Args:
+        workers (int): Number of worker processes; more than one processes the input in shards.
+        resume_state (dict): Checkpoint to resume from; the outputs must already be truncated to it.
+        checkpoint (SearchCheckpoint): Optional checkpoint to save progress to.
+
+    Returns:
+        int: The number of search queries processed.
+    """
+    global _result_cache_namespace
+    _result_cache_namespace = result_cache_namespace() if RESULT_CACHE_ENABLED else None
+
+    if workers > 1:
+        return process_search_queries_sharded(workers, resume_state, checkpoint)
+
+    rows_done = resume_state['rows_done'] if resume_state else 0
+    result_cache = open_result_cache()
+
+    # Open the aggregated search terms CSV for reading and every output once, for appending with buffered writes
+    with open(LULU_TERMS_AGGREGATED_CSV, mode='rb') as search_queries_file, \
+         output_writers.BufferedCsvWriter(MATCHED_TABLE_CSV) as matched_writer, \
+         output_writers.BufferedCsvWriter(UNMATCHED_TABLE_CSV) as unmatched_writer, \
+         output_writers.BufferedCsvWriter(PROBLEMATIC_SEARCHES_CSV) as problematic_writer:
+
+        writers = (matched_writer, unmatched_writer, problematic_writer)
+        lines = search_checkpoint.CountingLineReader(search_queries_file)
+        reader = open_search_queries_reader(lines)
+        if resume_state:
+            lines.seek(resume_state['input_offset'])
+
+        print("Processing search queries...")
+        progress = output_writers.ProgressReporter("Search queries processed")
+        rows = checkpointed_rows(reader, lines, checkpoint, rows_done, writers) if checkpoint else reader
+        process_search_query_rows(rows, matched_writer, unmatched_writer, problematic_writer, progress, result_cache)
+        if checkpoint:
+            save_checkpoint(checkpoint, lines.offset, rows_done + progress.count, writers)
+        progress.finish()
+        report_cache_hit_rates(cache_stats(result_cache))
         print("Finished processing all search queries.")
 
-def main() -> None:
+    if result_cache is not None:
+        result_cache.close()
+    return progress.count
+
+def cache_stats(result_cache: search_result_cache.SearchResultCache = None) -> dict:
+    """
+    Returns the hit and miss counts of this process's dictionary info and catalog verdict memos,
+    and of the search result cache if one is given.
+    """
+    stats = {
+        "Dictionary info cache": (dict_info_cache.hits, dict_info_cache.misses),
+        "Catalog verdict cache": (catalog_match_checker.verdict_cache.hits, catalog_match_checker.verdict_cache.misses),
+    }
+    if result_cache is not None:
+        stats["Search result cache"] = (result_cache.hits, result_cache.misses)
+    return stats
+
+def report_cache_hit_rates(stats: dict = None) -> None:
+    """
+    Prints the hit rates of the dictionary info and catalog verdict memos and adds them to the run report.
+
+    Args:
+        stats (dict): Label to (hits, misses); defaults to this process's memos.
+    """
+    for label, (hits, misses) in (stats or cache_stats()).items():
+        instrumentation.recorder.record_cache(label, hits, misses)
+        lookups = hits + misses
+        print(f"{label}: {hits}/{lookups} lookups served from cache ({hits / lookups if lookups else 0:.1%})")
+
+def shard_partial_paths(shard_index: int) -> tuple:
+    """
+    Returns the matched, unmatched and problematic partial output paths of a shard.
+    """
+    return tuple(f"{path}.part{shard_index}" for path in (MATCHED_TABLE_CSV, UNMATCHED_TABLE_CSV, PROBLEMATIC_SEARCHES_CSV))
+
+def process_shard(shard: tuple) -> tuple:
+    """
+    Processes one shard of the input rows into its own partial outputs (runs in a forked worker).
+
+    Args:
+        shard (tuple): The shard index, the byte offsets where its rows start and end in
+                       LULU_TERMS_AGGREGATED_CSV, and its number of rows.
+
+    Returns:
+        tuple: The shard index, its number of rows, its memo hit/miss counts, the catalog verdicts
+               it added and its instrumentation snapshot.
+    """
+    # Only count this shard's calls; the parent's counters were inherited by the fork
+    instrumentation.recorder.reset_metrics()
+    # Memos are kept across the shards of a worker, so this shard's counts are taken as deltas
+    memo_stats_start = cache_stats()
+    known_verdicts = {key for key, _ in catalog_match_checker.verdict_cache.items()} \
+        if catalog_match_checker.PERSIST_VERDICTS else set()
+    shard_index, start_offset, _, row_count = shard
+    result_cache = open_result_cache()
+    matched_path, unmatched_path, problematic_path = shard_partial_paths(shard_index)
+    with open(LULU_TERMS_AGGREGATED_CSV, mode='rb') as search_queries_file, \
+         output_writers.BufferedCsvWriter(matched_path, mode='w') as matched_writer, \
+         output_writers.BufferedCsvWriter(unmatched_path, mode='w') as unmatched_writer, \
+         output_writers.BufferedCsvWriter(problematic_path, mode='w') as problematic_writer:
+        # The reader takes its field names from the header, then streams the shard's rows from its offset
+        lines = search_checkpoint.CountingLineReader(search_queries_file)
+        reader = open_search_queries_reader(lines)
+        lines.seek(start_offset)
+        process_search_query_rows(itertools.islice(reader, row_count), matched_writer, unmatched_writer, problematic_writer,
+                                  result_cache=result_cache)
+
+    # Memos live in each worker, so their counters (and new verdicts, if persisted) are sent back
+    verdicts = [
+        (key, verdict) for key, verdict in catalog_match_checker.verdict_cache.items() if key not in known_verdicts
+    ] if catalog_match_checker.PERSIST_VERDICTS else []
+    stats = cache_stats(result_cache)
+    for label, (start_hits, start_misses) in memo_stats_start.items():
+        hits, misses = stats[label]
+        stats[label] = (hits - start_hits, misses - start_misses)
+    if result_cache is not None:
+        result_cache.close()
+    return shard_index, row_count, stats, verdicts, instrumentation.recorder.snapshot()
+
+def process_search_queries_sharded(workers: int, resume_state: dict = None,
+                                   checkpoint: search_checkpoint.SearchCheckpoint = None) -> int:
+    """
+    Processes the search queries in contiguous shards across forked worker processes.
+
+    The parent only records where every row ends in the input; each worker seeks to its
+    shard's first row and streams the shard's rows itself, so the parent's memory does not
+    grow with the rows. Workers inherit the shingles dictionary and the trie copy-on-write,
+    write partial outputs per shard, and the partials are appended to the outputs in shard
+    order, so the results are identical to a serial run. A checkpoint is saved between two
+    shards whenever one is due.
+
+    Args:
+        workers (int): Number of worker processes.
+        resume_state (dict): Checkpoint to resume from; the outputs must already be truncated to it.
+        checkpoint (SearchCheckpoint): Optional checkpoint to save progress to.
+
+    Returns:
+        int: The number of search queries processed.
+    """
+    rows_done = resume_state['rows_done'] if resume_state else 0
+
+    # Byte offset of the end of every row, to start and checkpoint shards at row boundaries
+    row_offsets = array('Q')
+    with open(LULU_TERMS_AGGREGATED_CSV, mode='rb') as search_queries_file:
+        lines = search_checkpoint.CountingLineReader(search_queries_file)
+        reader = open_search_queries_reader(lines)
+        if resume_state:
+            lines.seek(resume_state['input_offset'])
+        first_offset = lines.offset
+        for _ in reader:
+            row_offsets.append(lines.offset)
+        end_offset = lines.offset
+    row_count = len(row_offsets)
+
+    # Build shared state before forking so workers do not each build their own
+    if catalog_match_checker.CATALOG_CHECK_ENGINE == "bitmap":
+        catalog_bitmap_index.get_index()
+    # Opening the result cache once here applies any namespace change before the workers open it
+    result_cache = open_result_cache()
+    if result_cache is not None:
+        result_cache.close()
+
+    shard_size = max(1, math.ceil(row_count / (workers * SHARDS_PER_WORKER)))
+    shards = []
+    for shard_index, start in enumerate(range(0, row_count, shard_size)):
+        end = min(start + shard_size, row_count)
+        shards.append((shard_index, row_offsets[start - 1] if start else first_offset, row_offsets[end - 1], end - start))
+    print(f"Processing search queries in {len(shards)} shards with {workers} workers...")
+    progress = output_writers.ProgressReporter("Search queries processed", total=row_count)
+    output_paths = (MATCHED_TABLE_CSV, UNMATCHED_TABLE_CSV, PROBLEMATIC_SEARCHES_CSV)
+
+    try:
+        cache_totals = {}
+        # The outputs already hold their headers (or the rows up to the checkpoint); shards are appended in order
+        with multiprocessing.get_context('fork').Pool(workers) as pool, \
+             open(MATCHED_TABLE_CSV, mode='ab') as matched_file, \
+             open(UNMATCHED_TABLE_CSV, mode='ab') as unmatched_file, \
+             open(PROBLEMATIC_SEARCHES_CSV, mode='ab') as problematic_file:
+            output_files = (matched_file, unmatched_file, problematic_file)
+
+            for shard_index, row_count, shard_stats, verdicts, shard_metrics in pool.imap(process_shard, shards):
+                progress.update(row_count)
+                instrumentation.recorder.merge(shard_metrics)
+                catalog_match_checker.verdict_cache.update(verdicts)
+                for label, (hits, misses) in shard_stats.items():
+                    total_hits, total_misses = cache_totals.get(label, (0, 0))
+                    cache_totals[label] = (total_hits + hits, total_misses + misses)
+
+                for output_file, partial_path in zip(output_files, shard_partial_paths(shard_index)):
+                    with open(partial_path, mode='rb') as partial_file:
+                        shutil.copyfileobj(partial_file, output_file)
+                    os.remove(partial_path)
+
+                rows_done += row_count
+                if checkpoint and checkpoint.due():
+                    _, _, shard_end_offset, _ = shards[shard_index]
+                    checkpoint.save(shard_end_offset, rows_done, {
+                        path: output_writers.sync_file(output_file) for path, output_file in zip(output_paths, output_files)
+                    })
+
+            if checkpoint:
+                checkpoint.save(end_offset, rows_done, {
+                    path: output_writers.sync_file(output_file) for path, output_file in zip(output_paths, output_files)
+                })
+    finally:
+        for shard_index, _, _, _ in shards:
+            for partial_path in shard_partial_paths(shard_index):
+                if os.path.exists(partial_path):
+                    os.remove(partial_path)
+
+    progress.finish()
+    report_cache_hit_rates(cache_totals)
+    print("Finished processing all search queries.")
+    return progress.count
+
+def main(workers: int = 1, profile: bool = False, trace_memory: bool = False, resume: bool = False,
+         aggregate_store_path: str = None, results_db: bool = False) -> None:
     """
     Main function to execute the pipeline for processing search queries and writing results.
+
+    Each stage is timed and the run report is written to RUN_REPORT_JSON. Progress of the
+    search query stage is checkpointed to CHECKPOINT_PATH until the run completes.
+
+    With an aggregate store, LULU_TERMS_AGGREGATED_CSV is written from it first and its changes
+    are acknowledged once the run completes. Rows of queries the latest exports did not change
+    are then answered from the search result cache when it is enabled, so only the changed
+    queries are analyzed.
+    With results_db, the outputs are also bulk loaded into the indexed store at RESULTS_DB_PATH.
+
+    Args:
+        workers (int): Number of worker processes for the search query stage.
+        profile (bool): Whether to write a cProfile dump per stage to PROFILE_DIR.
+        trace_memory (bool): Whether to record tracemalloc peaks per stage.
+        resume (bool): Whether to continue from the checkpoint of an interrupted run instead of starting over.
+        aggregate_store_path (str): Aggregate store to take the search queries from, if any.
+        results_db (bool): Whether to load the outputs into the SQLite results store.
     """
-    shingles_dict_generator.read_csv_and_populate_shingles_dict(ENTITY_TABLE_CSV, shingles_dict)
-    write_dict_to_file(shingles_dict, 'ShingleEntityMatcher/dictionary.txt')
+    global shingles_dict, shingle_trie
+    recorder = instrumentation.recorder
+    recorder.reset()
+    recorder.configure(PROFILE_DIR if profile else None, trace_memory)
+
+    with recorder.stage("dictionary") as stage:
+        shingles_dict, rebuilt = shingle_dictionary_artifact.load_or_build(ENTITY_TABLE_CSV)
+        shingle_trie = shingle_matcher.ShingleTrie(shingles_dict.keys())
+        if rebuilt or not os.path.exists(DICTIONARY_TXT):
+            write_dict_to_file(shingles_dict, DICTIONARY_TXT)
+        stage.rows = len(shingles_dict)
+    dict_info_cache.clear()
+    if catalog_match_checker.PERSIST_VERDICTS:
+        catalog_match_checker.load_verdicts()
     #visits_revenue_aggregator.normalize_and_aggregate(LULU_TERMS_CSV, LULU_TERMS_AGGREGATED_CSV)
-    initialize_csvs()
-    process_search_queries()
-    problematic_query_rollup.rollup_queries(PROBLEMATIC_SEARCHES_CSV, ROLLED_UP_PROBLEMATIC_SEARCHES_CSV)
+    store = None
+    if aggregate_store_path:
+        store = aggregate_store.AggregateStore(aggregate_store_path)
+        print(f"{len(store.changed_queries())} queries changed since the last run.")
+        store.write_aggregates(LULU_TERMS_AGGREGATED_CSV)
+
+    checkpoint = search_checkpoint.SearchCheckpoint(CHECKPOINT_PATH, LULU_TERMS_AGGREGATED_CSV, checkpoint_identity())
+    resume_state = checkpoint.load() if resume else None
+    if resume_state:
+        # Rows written after the checkpoint are processed again, so they are cut off first
+        search_checkpoint.truncate_outputs(resume_state['outputs'])
+    else:
+        initialize_csvs()
+    with recorder.stage("search queries") as stage:
+        stage.rows = process_search_queries(workers, resume_state, checkpoint)
+    if catalog_match_checker.PERSIST_VERDICTS:
+        catalog_match_checker.save_verdicts()
+    with recorder.stage("rollup"):
+        problematic_query_rollup.rollup_queries(PROBLEMATIC_SEARCHES_CSV, ROLLED_UP_PROBLEMATIC_SEARCHES_CSV)
+    if results_db:
+        with recorder.stage("results store") as stage:
+            stage.rows = sum(results_store.load_results(RESULTS_DB_PATH, MATCHED_TABLE_CSV, UNMATCHED_TABLE_CSV,
+                                                        PROBLEMATIC_SEARCHES_CSV, ROLLED_UP_PROBLEMATIC_SEARCHES_CSV).values())
+    checkpoint.remove()
+    if store is not None:
+        store.acknowledge()
+        store.close()
+
+    recorder.write_report(RUN_REPORT_JSON, workers=workers)
 
 if __name__ == "__main__":
-    main()
-    
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Match search queries against the entity shingles and find problematic searches.")
+    parser.add_argument('--workers', type=int, default=1, help="Worker processes for the search query stage")
+    parser.add_argument('--resume', action='store_true', help=f"Continue an interrupted run from {CHECKPOINT_PATH}")
+    parser.add_argument('--result-cache', action='store_true',
+                        help=f"Reuse the output rows of earlier runs from {search_result_cache.RESULT_CACHE_PATH} (the file is never evicted)")
+    parser.add_argument('--aggregate-store', nargs='?', const=aggregate_store.AGGREGATE_STORE_PATH,
+                        help=f"Take the search queries from the aggregate store (default {aggregate_store.AGGREGATE_STORE_PATH}); "
+                             "with --result-cache only the changed queries are analyzed")
+    parser.add_argument('--results-db', action='store_true', help=f"Also load the outputs into the SQLite results store {RESULTS_DB_PATH}")
+    parser.add_argument('--profile', action='store_true',
+                        help=f"Write a cProfile dump per stage to {PROFILE_DIR} (worker processes are not profiled)")
+    parser.add_argument('--trace-memory', action='store_true', help="Record tracemalloc peaks per stage (slower)")
+    args = parser.parse_args()
+    if args.result_cache:
+        RESULT_CACHE_ENABLED = True
+    main(args.workers, args.profile, args.trace_memory, args.resume, args.aggregate_store, args.results_db)
@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import time
+
+# Minimum number of seconds between two checkpoints
+CHECKPOINT_INTERVAL = 30.0
+
+# Bytes of the input hashed at the start of the file and just before the checkpointed offset,
+# so resuming against a different or edited input is refused without rereading all of it
+INPUT_DIGEST_BYTES = 1 << 20
+
+class CountingLineReader:
+    """
+    Iterates over the lines of a binary file as text, keeping the byte offset of the next line.
+
+    csv readers pull one line at a time and stop at the end of a record, so after a record
+    is read, offset is exactly where the next record starts.
+    """
+
+    def __init__(self, file, encoding: str = 'utf-8'):
+        self.file = file
+        self.encoding = encoding
+        self.offset = file.tell()
+
+    def seek(self, offset: int) -> None:
+        self.file.seek(offset)
+        self.offset = offset
+
+    def __iter__(self) -> 'CountingLineReader':
+        return self
+
+    def __next__(self) -> str:
+        line = self.file.readline()
+        if not line:
+            raise StopIteration
+        self.offset += len(line)
+        return line.decode(self.encoding)
+
+def input_digest(filename: str, offset: int) -> str:
+    """
+    Hashes the first INPUT_DIGEST_BYTES of a file and the INPUT_DIGEST_BYTES before offset.
+
+    Args:
+        filename (str): The input file.
+        offset (int): The checkpointed offset.
+
+    Returns:
+        str: The hex digest.
+    """
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as file:
+        digest.update(file.read(min(offset, INPUT_DIGEST_BYTES)))
+        tail_start = max(0, offset - INPUT_DIGEST_BYTES)
+        file.seek(tail_start)
+        digest.update(file.read(offset - tail_start))
+    return digest.hexdigest()
+
+class SearchCheckpoint:
+    """
+    Periodically records how far the search query stage got: the input byte offset, the
+    number of rows done and the size of every output once flushed to disk.
+
+    A checkpoint also stores an identity (the input, outputs and dictionary it belongs to);
+    load() only returns a checkpoint whose identity matches the current run.
+    """
+
+    def __init__(self, path: str, input_path: str, identity: dict, interval: float = CHECKPOINT_INTERVAL):
+        self.path = path
+        self.input_path = input_path
+        self.identity = identity
+        self.interval = interval
+        self._last_save = time.monotonic()
+
+    def due(self) -> bool:
+        """
+        Returns whether the checkpoint interval has passed since the last save.
+        """
+        return time.monotonic() - self._last_save >= self.interval
+
+    def save(self, input_offset: int, rows_done: int, output_positions: dict) -> None:
+        """
+        Writes the checkpoint atomically. The outputs must already be synced to output_positions.
+
+        Args:
+            input_offset (int): Byte offset of the first input row not yet processed.
+            rows_done (int): Number of input rows processed.
+            output_positions (dict): Output path to its size once the processed rows are written.
+        """
+        state = {
+            'identity': self.identity,
+            'input_offset': input_offset,
+            'input_digest': input_digest(self.input_path, input_offset),
+            'rows_done': rows_done,
+            'outputs': output_positions,
+        }
+        temp_path = f'{self.path}.tmp'
+        with open(temp_path, mode='w', encoding='utf-8') as file:
+            json.dump(state, file, indent=2)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.path)
+        self._last_save = time.monotonic()
+
+    def load(self):
+        """
+        Reads the checkpoint, if there is one for this run.
+
+        Returns:
+            dict or None: The checkpoint state, or None if there is no checkpoint or it
+                          belongs to another input, dictionary or set of outputs.
+        """
+        if not os.path.exists(self.path):
+            print(f"No checkpoint at {self.path}, starting from the beginning.")
+            return None
+        with open(self.path, encoding='utf-8') as file:
+            state = json.load(file)
+
+        if state.get('identity') != self.identity:
+            print(f"Checkpoint {self.path} belongs to another input or dictionary, starting from the beginning.")
+            return None
+        if os.path.getsize(self.input_path) < state['input_offset'] or \
+                input_digest(self.input_path, state['input_offset']) != state['input_digest']:
+            print(f"Input {self.input_path} changed since checkpoint {self.path}, starting from the beginning.")
+            return None
+        for output_path, position in state['outputs'].items():
+            if not os.path.exists(output_path) or os.path.getsize(output_path) < position:
+                print(f"Output {output_path} is shorter than checkpoint {self.path}, starting from the beginning.")
+                return None
+
+        print(f"Resuming from checkpoint {self.path} after {state['rows_done']} rows.")
+        return state
+
+    def remove(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+def truncate_outputs(output_positions: dict) -> None:
+    """
+    Cuts every output back to its checkpointed size, dropping rows written after the checkpoint.
+
+    Args:
+        output_positions (dict): Output path to its checkpointed size.
+    """
+    for output_path, position in output_positions.items():
+        with open(output_path, mode='r+b') as file:
+            file.truncate(position)
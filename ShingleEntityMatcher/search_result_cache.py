@@ -0,0 +1,114 @@
+import json
+import sqlite3
+
+RESULT_CACHE_PATH = 'ShingleEntityMatcher/search_results_cache.sqlite'
+
+# Results held in memory before they are written in one transaction
+COMMIT_EVERY = 1000
+
+# Seconds a worker waits for another worker's write transaction to finish
+BUSY_TIMEOUT = 60.0
+
+class SearchResultCache:
+    """
+    SQLite store of the output rows each search query row produced.
+
+    A query row's MatchedTable, UnmatchedTable and problematic search rows only depend on the
+    row itself, the shingles dictionary and the catalog, so entries are valid for as long as
+    the namespace (which identifies the dictionary and catalog) is unchanged. Opening the
+    cache with a different namespace discards every entry.
+    """
+
+    def __init__(self, namespace: str, db_path: str = RESULT_CACHE_PATH):
+        self.namespace = namespace
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+        self._pending = {}
+
+        # Autocommit mode: writes only take the lock inside the explicit transactions of flush()
+        self._connection = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS results (row_key TEXT PRIMARY KEY, result TEXT NOT NULL) WITHOUT ROWID'
+        )
+
+        row = self._connection.execute("SELECT value FROM meta WHERE name = 'namespace'").fetchone()
+        if row is None or row[0] != namespace:
+            if row is not None:
+                print("Search result cache was built for another dictionary or catalog, clearing it...")
+            self._connection.execute('BEGIN IMMEDIATE')
+            self._connection.execute('DELETE FROM results')
+            self._connection.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('namespace', ?)", (namespace,))
+            self._connection.execute('COMMIT')
+
+    @staticmethod
+    def row_key(search_query: str, visits: str, revenue: str) -> str:
+        """
+        Returns the cache key of a query row: every column the outputs are built from.
+        """
+        return json.dumps([search_query, visits, revenue], ensure_ascii=False, separators=(',', ':'))
+
+    def get(self, row_key: str):
+        """
+        Looks up the output rows of a query row.
+
+        Args:
+            row_key (str): The key from row_key().
+
+        Returns:
+            tuple or None: The matched, unmatched and problematic rows, or None on a cache miss.
+        """
+        result = self._pending.get(row_key)
+        if result is None:
+            row = self._connection.execute('SELECT result FROM results WHERE row_key = ?', (row_key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            result = row[0]
+        self.hits += 1
+        return json.loads(result)
+
+    def put(self, row_key: str, matched_rows: list, unmatched_rows: list, problematic_rows: list) -> None:
+        """
+        Stores the output rows of a query row.
+
+        Args:
+            row_key (str): The key from row_key().
+            matched_rows (list): The row's MatchedTable rows.
+            unmatched_rows (list): The row's UnmatchedTable rows.
+            problematic_rows (list): The row's problematic search rows (at most one).
+        """
+        self._pending[row_key] = json.dumps([matched_rows, unmatched_rows, problematic_rows], ensure_ascii=False, separators=(',', ':'))
+        if len(self._pending) >= COMMIT_EVERY:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Writes the pending results to the SQLite file in one short transaction.
+
+        Results are held in memory until then, so the write lock shared by the shard workers
+        is only taken for the insert itself, never while rows are being analyzed.
+        """
+        if not self._pending:
+            return
+        self._connection.execute('BEGIN IMMEDIATE')
+        try:
+            self._connection.executemany('INSERT OR REPLACE INTO results (row_key, result) VALUES (?, ?)', self._pending.items())
+        except BaseException:
+            self._connection.execute('ROLLBACK')
+            raise
+        self._connection.execute('COMMIT')
+        self._pending = {}
+
+    def close(self) -> None:
+        """
+        Flushes pending writes and closes the SQLite connection.
+        """
+        self.flush()
+        self._connection.close()
+
+    def __len__(self) -> int:
+        return self._connection.execute('SELECT COUNT(*) FROM results').fetchone()[0]
@@ -0,0 +1,224 @@
+from array import array
+from collections.abc import Mapping, Sequence
+from typing import NamedTuple
+from sortedcontainers import SortedDict
+
+# Filter ids are packed into the low bits of each posting reference
+FILTER_BITS = 16
+FILTER_MASK = (1 << FILTER_BITS) - 1
+
+class ShingleEntry(NamedTuple):
+    """
+    One dictionary entry for a shingle, unpackable like the former [entity, shingle_type, entity_type, filter] lists.
+    """
+    entity: str
+    shingle_type: str
+    entity_type: str
+    filter: str
+
+class MatchRecord(NamedTuple):
+    """
+    The MatchedTable columns that depend only on the shingle key.
+    """
+    entity_types: str
+    partial_matches: str
+    shingle_type: str
+    overlap: str
+    entity_overlaps: int
+    entity_type_overlaps: int
+
+def build_match_record(entries) -> MatchRecord:
+    """
+    Summarizes the entries of a shingle key into its MatchRecord.
+
+    Args:
+        entries (iterable): The key's entries.
+
+    Returns:
+        MatchRecord: The entity types joined by "|", the partial-match entities joined by "|"
+                     (empty for a full match), the shingle type, the overlap flag and the
+                     number of distinct entities and entity types.
+    """
+    matched_entities = {}
+    partial_matches = []
+
+    for entry in entries:
+        matched_entities.setdefault(entry.entity_type, []).append(entry.entity)
+        if entry.shingle_type == "partial":
+            partial_matches.append(entry.entity)
+
+    distinct_entities = {entity for entities in matched_entities.values() for entity in entities}
+    entity_overlap = len(distinct_entities) > 1
+    entity_type_overlap = len(matched_entities) > 1
+
+    return MatchRecord(
+        '|'.join(matched_entities.keys()),
+        '|'.join(partial_matches),
+        "partial" if partial_matches else "full",
+        "Y" if entity_overlap or entity_type_overlap else "N",
+        len(distinct_entities),
+        len(matched_entities)
+    )
+
+class StringPool:
+    """
+    Interns strings into dense integer ids.
+    """
+    __slots__ = ('strings', 'ids')
+
+    def __init__(self):
+        self.strings = []
+        self.ids = {}
+
+    def intern(self, string: str) -> int:
+        string_id = self.ids.get(string)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.strings.append(string)
+            self.ids[string] = string_id
+        return string_id
+
+    def __getitem__(self, string_id: int) -> str:
+        return self.strings[string_id]
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+class PostingList(Sequence):
+    """
+    Read-only view of the entries stored under one shingle key.
+    """
+    __slots__ = ('dictionary', 'refs')
+
+    def __init__(self, dictionary: 'ShingleDictionary', refs: array):
+        self.dictionary = dictionary
+        self.refs = refs
+
+    def __len__(self) -> int:
+        return len(self.refs)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.dictionary.entry(ref) for ref in self.refs[index]]
+        return self.dictionary.entry(self.refs[index])
+
+    def __iter__(self):
+        entry = self.dictionary.entry
+        for ref in self.refs:
+            yield entry(ref)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (PostingList, list, tuple)):
+            return [list(entry) for entry in self] == [list(entry) for entry in other]
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        # Same text as the former list-of-lists values, so dictionary dumps are unchanged
+        return repr([list(entry) for entry in self])
+
+class ShingleDictionary(Mapping):
+    """
+    Compact shingle dictionary: a sorted, read-only mapping from shingle key to its entries.
+
+    Entities, entity types and normalization filters are interned into integer ids, and each
+    posting (entity, shingle type, entity type) is stored once in parallel arrays. Keys hold
+    array-backed references to postings packed with a filter id, so normalized keys point at
+    the original postings instead of duplicating them.
+    """
+
+    def __init__(self):
+        self.entities = StringPool()
+        self.entity_types = StringPool()
+        self.shingle_types = StringPool()
+        self.filters = StringPool()
+        self.filters.intern("")
+
+        self.posting_entities = array('I')
+        self.posting_entity_types = array('I')
+        self.posting_shingle_types = array('B')
+
+        self._refs = SortedDict()
+
+    def add(self, key: str, entity: str, shingle_type: str, entity_type: str, filter: str = "") -> None:
+        """
+        Adds a new posting under a key.
+
+        Args:
+            key (str): The lowercased shingle key.
+            entity (str): The entity the shingle was generated from.
+            shingle_type (str): "full" or "partial".
+            entity_type (str): The type of the entity (e.g., category, collection).
+            filter (str): The normalization filters that produced the key, if any.
+        """
+        posting_id = len(self.posting_entities)
+        self.posting_entities.append(self.entities.intern(entity))
+        self.posting_entity_types.append(self.entity_types.intern(entity_type))
+        self.posting_shingle_types.append(self.shingle_types.intern(shingle_type))
+        self._key_refs(key).append(self._ref(posting_id, filter))
+
+    def add_normalized(self, normalized_key: str, original_key: str, filter: str) -> None:
+        """
+        Adds every posting of original_key under normalized_key, tagged with the normalization filters.
+
+        Args:
+            normalized_key (str): The normalized shingle key.
+            original_key (str): The existing key whose postings are referenced.
+            filter (str): The normalization filters that changed original_key into normalized_key.
+        """
+        filter_id = self._filter_id(filter)
+        original_refs = self._refs[original_key]
+        self._key_refs(normalized_key).extend(
+            [((ref >> FILTER_BITS) << FILTER_BITS) | filter_id for ref in original_refs]
+        )
+
+    def entry(self, ref: int) -> ShingleEntry:
+        """
+        Resolves a posting reference into a ShingleEntry.
+        """
+        posting_id = ref >> FILTER_BITS
+        return ShingleEntry(
+            self.entities[self.posting_entities[posting_id]],
+            self.shingle_types[self.posting_shingle_types[posting_id]],
+            self.entity_types[self.posting_entity_types[posting_id]],
+            self.filters[ref & FILTER_MASK]
+        )
+
+    def refs(self, key: str) -> array:
+        """
+        Returns the raw posting references of a key.
+        """
+        return self._refs[key]
+
+    def match_record(self, key: str) -> MatchRecord:
+        """
+        Returns the MatchRecord of a key, computed from its current entries.
+        """
+        return build_match_record(self[key])
+
+    def __getitem__(self, key: str) -> PostingList:
+        return PostingList(self, self._refs[key])
+
+    def __contains__(self, key) -> bool:
+        return key in self._refs
+
+    def __iter__(self):
+        return iter(self._refs)
+
+    def __len__(self) -> int:
+        return len(self._refs)
+
+    def _key_refs(self, key: str) -> array:
+        refs = self._refs.get(key)
+        if refs is None:
+            refs = array('Q')
+            self._refs[key] = refs
+        return refs
+
+    def _filter_id(self, filter: str) -> int:
+        filter_id = self.filters.intern(filter)
+        if filter_id > FILTER_MASK:
+            raise ValueError(f"Too many distinct normalization filters (more than {FILTER_MASK})")
+        return filter_id
+
+    def _ref(self, posting_id: int, filter: str) -> int:
+        return (posting_id << FILTER_BITS) | self._filter_id(filter)
@@ -0,0 +1,340 @@
+import argparse
+import bisect
+import hashlib
+import mmap
+import os
+import struct
+from array import array
+from collections.abc import Mapping
+import normalization_cache
+import shingles_dict_generator
+from shingle_dictionary import ShingleDictionary, ShingleEntry, MatchRecord, PostingList, StringPool, FILTER_BITS, FILTER_MASK
+
+ENTITY_TABLE_CSV = 'ShingleEntityMatcher/entity_table_new.csv'
+
+# Field type used to normalize the single-word keys (see shingles_dict_generator)
+NORMALIZATION_FIELD_TYPE = 'dig_practice_char_stem'
+
+MAGIC = b'SHNGLDCT'
+FORMAT_VERSION = 2
+
+# magic, version, entity table sha256, analyzer fingerprint sha256, then the counts of
+# entities, entity types, shingle types, filters, postings, keys and posting references
+HEADER = struct.Struct('<8sI4x32s32s7Q')
+ALIGNMENT = 8
+
+# Per-key match record: entity types string id, partial matches string id, entity overlaps,
+# entity type overlaps and flags
+RECORD_FIELDS = 5
+RECORD_PARTIAL = 1
+RECORD_OVERLAP = 2
+
+def artifact_path_for(entity_table_csv: str) -> str:
+    """
+    Returns the artifact path used for an entity table, next to the table itself.
+
+    Args:
+        entity_table_csv (str): Path to the entity table CSV.
+
+    Returns:
+        str: Path to the compiled shingle dictionary.
+    """
+    return os.path.splitext(entity_table_csv)[0] + '.shingles.bin'
+
+def file_sha256(filename: str) -> bytes:
+    """
+    Computes the SHA-256 digest of a file's contents.
+    """
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.digest()
+
+def current_fingerprint() -> bytes:
+    """
+    Returns the analyzer fingerprint of the normalization field type as raw bytes.
+    """
+    fingerprint = normalization_cache.analyzer_fingerprint(NORMALIZATION_FIELD_TYPE)
+    return bytes.fromhex(fingerprint) if fingerprint else bytes(32)
+
+def _string_table(strings: list) -> tuple:
+    blobs = [string.encode('utf-8') for string in strings]
+    offsets = array('Q', [0])
+    for blob in blobs:
+        offsets.append(offsets[-1] + len(blob))
+    return offsets, b''.join(blobs)
+
+def write_artifact(dictionary: ShingleDictionary, filename: str, entity_table_sha256: bytes, fingerprint: bytes) -> None:
+    """
+    Compiles a populated ShingleDictionary into a memory-mappable binary artifact.
+
+    After the header come, each padded to 8 bytes: the offsets and UTF-8 blob of the
+    entity, entity type, shingle type and filter string tables, the three posting arrays,
+    the offsets and blob of the sorted keys, the per-key reference offsets, the packed
+    posting references, and the string table and fields of each key's precomputed
+    MatchRecord. The file is written next to its destination and renamed into place,
+    so processes that already mapped the previous artifact keep a consistent view.
+
+    Args:
+        dictionary (ShingleDictionary): The expanded shingle dictionary.
+        filename (str): Path to write the artifact to.
+        entity_table_sha256 (bytes): Digest of the entity table the dictionary was built from.
+        fingerprint (bytes): Analyzer fingerprint of the normalization field type.
+    """
+    keys = list(dictionary.keys())
+    pools = [dictionary.entities, dictionary.entity_types, dictionary.shingle_types, dictionary.filters]
+    key_ref_offsets = array('Q', [0])
+    refs = array('Q')
+    for key in keys:
+        refs.extend(dictionary.refs(key))
+        key_ref_offsets.append(len(refs))
+
+    sections = []
+    for pool in pools:
+        sections.extend(_string_table(pool.strings))
+    sections.append(array('I', dictionary.posting_entities))
+    sections.append(array('I', dictionary.posting_entity_types))
+    sections.append(array('B', dictionary.posting_shingle_types))
+    sections.extend(_string_table(keys))
+    sections.append(key_ref_offsets)
+    sections.append(refs)
+
+    record_strings = StringPool()
+    records = array('I')
+    for key in keys:
+        record = dictionary.match_record(key)
+        flags = (RECORD_PARTIAL if record.shingle_type == "partial" else 0) | (RECORD_OVERLAP if record.overlap == "Y" else 0)
+        records.extend((record_strings.intern(record.entity_types), record_strings.intern(record.partial_matches),
+                        record.entity_overlaps, record.entity_type_overlaps, flags))
+    sections.extend(_string_table(record_strings.strings))
+    sections.append(records)
+
+    header = HEADER.pack(
+        MAGIC, FORMAT_VERSION, entity_table_sha256, fingerprint,
+        *(len(pool) for pool in pools), len(dictionary.posting_entities), len(keys), len(refs)
+    )
+
+    temp_filename = f'{filename}.{os.getpid()}.tmp'
+    with open(temp_filename, 'wb') as file:
+        file.write(header)
+        for section in sections:
+            data = section.tobytes() if isinstance(section, array) else section
+            file.write(struct.pack('<Q', len(data)))
+            file.write(data)
+            file.write(bytes(-file.tell() % ALIGNMENT))
+    os.replace(temp_filename, filename)
+
+class MappedStringTable:
+    """
+    Read-only string pool backed by an offsets array and a UTF-8 blob in the mapped artifact.
+    """
+    __slots__ = ('offsets', 'blob', 'strings')
+
+    def __init__(self, offsets: memoryview, blob: memoryview):
+        self.offsets = offsets
+        self.blob = blob
+        self.strings = [None] * (len(offsets) - 1)
+
+    def __getitem__(self, string_id: int) -> str:
+        string = self.strings[string_id]
+        if string is None:
+            string = str(self.blob[self.offsets[string_id]:self.offsets[string_id + 1]], 'utf-8')
+            self.strings[string_id] = string
+        return string
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+class MappedShingleDictionary(Mapping):
+    """
+    Read-only ShingleDictionary served straight from a memory-mapped artifact.
+
+    Keys are looked up by binary search over the sorted UTF-8 key table, and postings are
+    resolved from the mapped arrays on access, so loading costs a header check and every
+    process mapping the same file shares its pages.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        with open(filename, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._views = [memoryview(self._mmap)]
+        view = self._views[0]
+
+        (magic, version, self.entity_table_sha256, self.fingerprint,
+         *counts) = HEADER.unpack_from(view, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"{filename} is not a version {FORMAT_VERSION} shingle dictionary artifact")
+
+        sections = []
+        position = HEADER.size
+        while position < len(view):
+            (length,) = struct.unpack_from('<Q', view, position)
+            position += 8
+            sections.append(self._view(view[position:position + length]))
+            position += length + (-(position + length) % ALIGNMENT)
+
+        def string_table(index: int) -> MappedStringTable:
+            return MappedStringTable(self._view(sections[index].cast('Q')), sections[index + 1])
+
+        self.entities = string_table(0)
+        self.entity_types = string_table(2)
+        self.shingle_types = string_table(4)
+        self.filters = string_table(6)
+        self.posting_entities = self._view(sections[8].cast('I'))
+        self.posting_entity_types = self._view(sections[9].cast('I'))
+        self.posting_shingle_types = sections[10]
+        self._key_offsets = self._view(sections[11].cast('Q'))
+        self._key_blob = sections[12]
+        self._key_ref_offsets = self._view(sections[13].cast('Q'))
+        self._refs = self._view(sections[14].cast('Q'))
+        self.record_strings = string_table(15)
+        self._records = self._view(sections[17].cast('I'))
+        self._key_count = counts[5]
+        self._match_records = [None] * self._key_count
+
+    def close(self) -> None:
+        """
+        Unmaps the artifact. The dictionary and any postings taken from it must not be used afterwards.
+        """
+        for view in reversed(self._views):
+            view.release()
+        self._mmap.close()
+
+    def _view(self, view: memoryview) -> memoryview:
+        self._views.append(view)
+        return view
+
+    def key_bytes(self, index: int) -> bytes:
+        return self._key_blob[self._key_offsets[index]:self._key_offsets[index + 1]].tobytes()
+
+    def find(self, key: str) -> int:
+        """
+        Returns the index of a key in the sorted key table, or -1 if it is absent.
+        """
+        # UTF-8 byte order matches code point order, the order the keys were written in
+        encoded = key.encode('utf-8')
+        index = bisect.bisect_left(range(self._key_count), encoded, key=self.key_bytes)
+        if index < self._key_count and self.key_bytes(index) == encoded:
+            return index
+        return -1
+
+    def entry(self, ref: int) -> ShingleEntry:
+        """
+        Resolves a posting reference into a ShingleEntry.
+        """
+        posting_id = ref >> FILTER_BITS
+        return ShingleEntry(
+            self.entities[self.posting_entities[posting_id]],
+            self.shingle_types[self.posting_shingle_types[posting_id]],
+            self.entity_types[self.posting_entity_types[posting_id]],
+            self.filters[ref & FILTER_MASK]
+        )
+
+    def refs(self, key: str) -> memoryview:
+        """
+        Returns the raw posting references of a key.
+        """
+        index = self.find(key) if isinstance(key, str) else -1
+        if index < 0:
+            raise KeyError(key)
+        return self._refs[self._key_ref_offsets[index]:self._key_ref_offsets[index + 1]]
+
+    def match_record(self, key: str) -> MatchRecord:
+        """
+        Returns the precomputed MatchRecord of a key.
+        """
+        index = self.find(key) if isinstance(key, str) else -1
+        if index < 0:
+            raise KeyError(key)
+
+        record = self._match_records[index]
+        if record is None:
+            entity_types_id, partial_matches_id, entity_overlaps, entity_type_overlaps, flags = \
+                self._records[index * RECORD_FIELDS:(index + 1) * RECORD_FIELDS]
+            record = MatchRecord(
+                self.record_strings[entity_types_id],
+                self.record_strings[partial_matches_id],
+                "partial" if flags & RECORD_PARTIAL else "full",
+                "Y" if flags & RECORD_OVERLAP else "N",
+                entity_overlaps,
+                entity_type_overlaps
+            )
+            self._match_records[index] = record
+        return record
+
+    def __getitem__(self, key: str) -> PostingList:
+        return PostingList(self, self.refs(key))
+
+    def __contains__(self, key) -> bool:
+        return isinstance(key, str) and self.find(key) >= 0
+
+    def __iter__(self):
+        for index in range(self._key_count):
+            yield str(self.key_bytes(index), 'utf-8')
+
+    def __len__(self) -> int:
+        return self._key_count
+
+def build_artifact(entity_table_csv: str = ENTITY_TABLE_CSV, artifact_path: str = None) -> str:
+    """
+    Builds and expands the shingle dictionary for an entity table and compiles it to an artifact.
+
+    Args:
+        entity_table_csv (str): Path to the entity table CSV.
+        artifact_path (str): Where to write the artifact; defaults to artifact_path_for(entity_table_csv).
+
+    Returns:
+        str: Path to the written artifact.
+    """
+    artifact_path = artifact_path or artifact_path_for(entity_table_csv)
+    shingles_dict = ShingleDictionary()
+    shingles_dict_generator.read_csv_and_populate_shingles_dict(entity_table_csv, shingles_dict)
+    write_artifact(shingles_dict, artifact_path, file_sha256(entity_table_csv), current_fingerprint())
+    print(f"Shingle dictionary artifact written to {artifact_path} ({len(shingles_dict)} keys).")
+    return artifact_path
+
+def load_or_build(entity_table_csv: str = ENTITY_TABLE_CSV, artifact_path: str = None) -> tuple:
+    """
+    Maps the compiled shingle dictionary for an entity table, rebuilding the artifact first if
+    it is missing, unreadable, or was built from a different entity table or analyzer chain.
+
+    Args:
+        entity_table_csv (str): Path to the entity table CSV.
+        artifact_path (str): Path to the artifact; defaults to artifact_path_for(entity_table_csv).
+
+    Returns:
+        tuple: The MappedShingleDictionary and whether the artifact was rebuilt.
+    """
+    artifact_path = artifact_path or artifact_path_for(entity_table_csv)
+    entity_table_sha256 = file_sha256(entity_table_csv)
+    fingerprint = current_fingerprint()
+
+    if os.path.exists(artifact_path):
+        try:
+            dictionary = MappedShingleDictionary(artifact_path)
+        except (ValueError, struct.error, IndexError, TypeError) as e:
+            print(f"Ignoring unreadable shingle dictionary artifact {artifact_path}: {e}")
+        else:
+            if dictionary.entity_table_sha256 == entity_table_sha256 and dictionary.fingerprint == fingerprint:
+                print(f"Loaded shingle dictionary artifact {artifact_path} ({len(dictionary)} keys).")
+                return dictionary, False
+            print(f"Shingle dictionary artifact {artifact_path} is stale, rebuilding...")
+            dictionary.close()
+
+    build_artifact(entity_table_csv, artifact_path)
+    return MappedShingleDictionary(artifact_path), True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile the expanded shingle dictionary into a memory-mappable artifact.")
+    parser.add_argument('--entity-table', default=ENTITY_TABLE_CSV, help="Entity table CSV to build from")
+    parser.add_argument('--output', help="Artifact path (default: next to the entity table)")
+    parser.add_argument('--force', action='store_true', help="Rebuild even if the existing artifact is current")
+    args = parser.parse_args()
+
+    if args.force:
+        build_artifact(args.entity_table, args.output)
+    else:
+        load_or_build(args.entity_table, args.output)
@@ -0,0 +1,56 @@
+END_OF_KEY = None
+
+class ShingleTrie:
+    """
+    Token-level trie over the shingle dictionary keys.
+
+    Each key is stored as its sequence of space-separated words, so every dictionary span of
+    a query can be found by walking the trie from each start token, instead of building and
+    looking up every contiguous word span.
+    """
+
+    def __init__(self, keys=()):
+        self.root = {}
+        self.depth = 0
+        for key in keys:
+            self.add(key)
+
+    def add(self, key: str) -> None:
+        """
+        Adds a dictionary key to the trie.
+
+        Args:
+            key (str): A lowercased shingle key.
+        """
+        words = key.split(' ')
+        node = self.root
+        for word in words:
+            node = node.setdefault(word, {})
+        node[END_OF_KEY] = key
+        self.depth = max(self.depth, len(words))
+
+    def find_matches(self, tokens: list) -> list:
+        """
+        Finds every span of the tokens whose lowercased text is a dictionary key.
+
+        The walk from each start token stops as soon as the trie has no continuation, so the
+        cost is bounded by the number of tokens times the longest key, not by the number of spans.
+
+        Args:
+            tokens (list): The whitespace-separated tokens of a query.
+
+        Returns:
+            list: (start, end, key) tuples, where tokens[start:end] matches the key, ordered by
+                  start and then end.
+        """
+        lowered_tokens = [token.lower() for token in tokens]
+        matches = []
+        for start in range(len(lowered_tokens)):
+            node = self.root
+            for end in range(start, min(len(lowered_tokens), start + self.depth)):
+                node = node.get(lowered_tokens[end])
+                if node is None:
+                    break
+                if END_OF_KEY in node:
+                    matches.append((start, end + 1, node[END_OF_KEY]))
+        return matches
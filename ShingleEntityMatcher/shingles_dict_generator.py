@@ -1,7 +1,6 @@
 import csv
-from sortedcontainers import SortedDict
+import instrumentation
 import normalizer
-import copy
 
 # Read from a CSV file and populate the shingles dictionary
 def read_csv_and_populate_shingles_dict(filename, shingles_dict):
@@ -10,14 +9,17 @@ def read_csv_and_populate_shingles_dict(filename, shingles_dict):
 
     Args:
         filename (str): The path to the CSV file.
-        shingles_dict (SortedDict): The dictionary to populate with shingles.
+        shingles_dict (ShingleDictionary): The dictionary to populate with shingles.
     """
     print(f"Opening file {filename} to populate shingles dictionary...")
-    with open(filename, mode='r', newline='', encoding='utf-8') as file:
+    with instrumentation.recorder.stage("shingle generation") as stage, \
+         open(filename, mode='r', newline='', encoding='utf-8') as file:
         reader = csv.reader(file)
         headers = next(reader)
         print("Reading headers...")
+        stage.rows = 0
         for row in reader:
+            stage.rows += 1
             for i, entity in enumerate(row):
                 if entity.strip():  # Ensure the entity is not empty
                     entity_type = headers[i]
@@ -33,15 +35,13 @@ def add_shingles_to_dict(entity, entity_type, shingles_dict):
     Args:
         entity (str): The entity to generate shingles for.
         entity_type (str): The type of the entity (e.g., category, collection).
-        shingles_dict (SortedDict): The dictionary to populate with shingles.
+        shingles_dict (ShingleDictionary): The dictionary to populate with shingles.
     """
     entity_shingles = generate_shingles(entity)
     for shingle in entity_shingles:
         shingle_key = shingle.lower()
         shingle_type = "full" if shingle.lower() == entity.lower() else "partial"
-        if shingle_key not in shingles_dict:
-            shingles_dict[shingle_key] = []
-        shingles_dict[shingle_key].append([entity, shingle_type, entity_type, ""])
+        shingles_dict.add(shingle_key, entity, shingle_type, entity_type)
 
 # Generate shingles from a phrase
 def generate_shingles(phrase):
@@ -64,26 +64,23 @@ def expand_shingles_with_normalization(shingles_dict):
     Expands the shingles dictionary by adding normalized versions of shingles.
 
     Args:
-        shingles_dict (SortedDict): The dictionary containing shingles to expand with normalization.
+        shingles_dict (ShingleDictionary): The dictionary containing shingles to expand with normalization.
     """
     print("Expanding shingles dictionary with normalized keys...")
-    original_keys = list(shingles_dict.keys())
-    for original_key in original_keys:
-        if len(original_key.split()) == 1:  # Only normalize single-word shingles
-            normalized_result = normalizer.normalize(original_key, 'dig_practice_char_stem')
+    with instrumentation.recorder.stage("normalization expansion") as stage:
+        # Only normalize single-word shingles, in one batched round of analysis requests
+        original_keys = [key for key in shingles_dict.keys() if len(key.split()) == 1]
+        stage.rows = len(original_keys)
+        normalized_results = normalizer.normalize_many(original_keys, 'dig_practice_char_stem')
+
+        for original_key, normalized_result in zip(original_keys, normalized_results):
             normalized_key = normalized_result["result"][0]
 
             if normalized_key and normalized_key != original_key:
                 filter_changes = append_true_keys(normalized_result)
 
-                shingles_dict_original_key_with_normalization = copy.deepcopy(shingles_dict[original_key])
-                for sublist in shingles_dict_original_key_with_normalization:
-                    sublist[3] = filter_changes
-
-                if normalized_key in shingles_dict:
-                    shingles_dict[normalized_key].extend(shingles_dict_original_key_with_normalization)
-                else:
-                    shingles_dict[normalized_key] = shingles_dict_original_key_with_normalization
+                # Reference the original key's postings under the normalized key, tagged with the filters
+                shingles_dict.add_normalized(normalized_key, original_key, filter_changes)
 
     print("Shingles dictionary expanded successfully.")
 
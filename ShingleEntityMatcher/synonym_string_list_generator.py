@@ -1,53 +1,82 @@
 import json
+from itertools import islice
 
-def reconstruct_strings(token_data: list) -> list:
+POSITION_LENGTH_ATTRIBUTE = 'org.apache.lucene.analysis.tokenattributes.PositionLengthAttribute#positionLength'
+
+def index_tokens_by_position(tokens: list) -> dict:
     """
-    Reconstructs possible strings from token data by recursively appending tokens based on their positions.
+    Indexes a token graph by start position.
 
     Args:
-        token_data (list): A list containing dictionaries of token information.
+        tokens (list): Token dictionaries from the last phase of an analysis response.
 
     Returns:
-        list: A list of reconstructed strings.
+        dict: Start position to the (text, next position) edges leaving it, in token order.
     """
-    # Extract the list of dictionaries (tokens) from the last item in token_data
-    tokens = list(token_data[-1].values())[0]
-
-    def generate_strings(current_position: int, current_string: str) -> list:
-        """
-        Recursively generates possible strings starting from the current position.
-
-        Args:
-            current_position (int): The current token position to start from.
-            current_string (str): The string constructed so far.
-
-        Returns:
-            list: A list of strings generated from the current position.
-        """
-        # Find all tokens starting at the current position
-        possible_tokens = [token for token in tokens if token['position'] == current_position]
-
-        if not possible_tokens:
-            # If no tokens are found, return the current string as a complete string
-            return [current_string.strip()]
-
-        results = []
-        for token in possible_tokens:
-            # Append the current token's text to the current string
-            new_string = current_string + token['text'] + ' '
-
-            # Calculate the next position to move to
-            next_position = current_position + token['org.apache.lucene.analysis.tokenattributes.PositionLengthAttribute#positionLength']
-
-            # Recursively generate the rest of the strings
-            results.extend(generate_strings(next_position, new_string))
+    edges_by_position = {}
+    for token in tokens:
+        edges_by_position.setdefault(token['position'], []).append(
+            (token['text'], token['position'] + token[POSITION_LENGTH_ATTRIBUTE])
+        )
+    return edges_by_position
+
+def iter_strings(token_data: list, max_expansions: int = None, unique: bool = False):
+    """
+    Lazily yields the strings along every path through the token graph.
 
-        return results
+    Paths are produced in the same order as a depth-first walk from position 1 that follows
+    the tokens at each position in their original order. The walk keeps only the current
+    path on its stack, so memory does not grow with the number of expansions.
 
-    # Start generating strings from position 1 with an empty string
-    return generate_strings(1, '')
+    Args:
+        token_data (list): A list containing dictionaries of token information.
+        max_expansions (int): Stop after this many strings; None for no limit.
+        unique (bool): Skip strings that were already yielded.
 
+    Yields:
+        str: A reconstructed string.
+    """
+    # Extract the list of dictionaries (tokens) from the last item in token_data
+    tokens = list(token_data[-1].values())[0]
+    edges_by_position = index_tokens_by_position(tokens)
+
+    def walk():
+        stack = [(1, ())]
+        while stack:
+            current_position, words = stack.pop()
+            edges = edges_by_position.get(current_position)
+            if not edges:
+                # No tokens start here, so the path is a complete string
+                yield ' '.join(words).strip()
+                continue
+            for text, next_position in reversed(edges):
+                stack.append((next_position, words + (text,)))
+
+    strings = walk()
+    if unique:
+        strings = unique_strings(strings)
+    return islice(strings, max_expansions)
+
+def unique_strings(strings):
+    """
+    Yields each string the first time it appears.
+    """
+    seen = set()
+    for string in strings:
+        if string not in seen:
+            seen.add(string)
+            yield string
 
+def reconstruct_strings(token_data: list, max_expansions: int = None, unique: bool = False) -> list:
+    """
+    Reconstructs possible strings from token data by following the token graph from position 1.
 
+    Args:
+        token_data (list): A list containing dictionaries of token information.
+        max_expansions (int): Keep at most this many strings; None for no limit.
+        unique (bool): Drop repeated strings, keeping the first occurrence.
 
-            
+    Returns:
+        list: A list of reconstructed strings.
+    """
+    return list(iter_strings(token_data, max_expansions, unique))
@@ -1,10 +1,22 @@
 import csv
+import re
 from collections import defaultdict
 from decimal import Decimal
 import sys
+import numpy as np
+import pandas as pd
 import normalizer  # Assuming you have a normalizer module with a normalize function
 
-def normalize_and_aggregate(input_filename: str, output_filename: str) -> None:
+# Number of search queries sent to the normalizer per batch
+NORMALIZATION_BATCH_SIZE = 1000
+
+# "vectorized" normalizes each distinct query once and groups columnar; "rowwise" is the original two-pass engine
+AGGREGATION_ENGINE = "vectorized"
+
+# Revenue amounts the vectorized engine sums as integer cents; anything else falls back to Decimal
+CENTS_PATTERN = re.compile(r'^-?\d+(\.\d{1,2})?$')
+
+def normalize_and_aggregate(input_filename: str, output_filename: str, engine: str = None) -> None:
     """
     Normalizes search queries from an input CSV file, aggregates their visits and revenue,
     and writes the results to an output CSV file.
@@ -12,9 +24,18 @@ def normalize_and_aggregate(input_filename: str, output_filename: str) -> None:
     Args:
         input_filename (str): Path to the input CSV file containing search queries.
         output_filename (str): Path to the output CSV file where normalized and aggregated results will be saved.
+        engine (str): "vectorized" or "rowwise"; defaults to AGGREGATION_ENGINE.
     """
     print("Normalizing and aggregating search queries...")
 
+    engine = engine or AGGREGATION_ENGINE
+    if engine == "vectorized":
+        aggregate_vectorized(input_filename, output_filename)
+        print("Search queries successfully normalized and aggregated.")
+        return
+    if engine != "rowwise":
+        raise ValueError(f"Unknown aggregation engine: {engine}")
+
     # Dictionary to hold aggregated data with the format {normalized_query: [total_visits, total_revenue]}
     aggregated_data = defaultdict(lambda: [0, Decimal('0.00')])
     iteration_count = 0
@@ -23,14 +44,12 @@ def normalize_and_aggregate(input_filename: str, output_filename: str) -> None:
         reader = csv.DictReader(infile)
         clean_header(reader)
 
-        for row in reader:
+        for row, normalized_search_query in iter_normalized_rows(reader):
             iteration_count += 1
             if iteration_count % 1000 == 0:
                 sys.stdout.write(f"\rQueries processed: {iteration_count}")
                 sys.stdout.flush()
 
-            search_query = row['Search Query']
-            normalized_search_query = normalizer.get_normalized_final_text(search_query, 'dig_practice_char')
             visits = int(row['Visits'])
             revenue = Decimal(row['Revenue'].replace('$', '').replace(',', ''))
 
@@ -52,6 +71,26 @@ def clean_header(reader: csv.DictReader) -> None:
     if reader.fieldnames and reader.fieldnames[0].startswith('\ufeff'):
         reader.fieldnames[0] = reader.fieldnames[0].replace('\ufeff', '')
 
+def iter_normalized_rows(reader: csv.DictReader):
+    """
+    Yields each row together with its normalized search query, normalizing the queries in batches.
+
+    Args:
+        reader (csv.DictReader): The CSV reader object.
+
+    Yields:
+        tuple: The row and its normalized search query.
+    """
+    batch = []
+    for row in reader:
+        batch.append(row)
+        if len(batch) >= NORMALIZATION_BATCH_SIZE:
+            yield from zip(batch, normalizer.get_normalized_final_text_many([batch_row['Search Query'] for batch_row in batch], 'dig_practice_char'))
+            batch = []
+
+    if batch:
+        yield from zip(batch, normalizer.get_normalized_final_text_many([batch_row['Search Query'] for batch_row in batch], 'dig_practice_char'))
+
 def write_aggregated_data(input_filename: str, output_filename: str, aggregated_data: dict) -> None:
     """
     Writes the aggregated search query data to an output CSV file.
@@ -70,9 +109,7 @@ def write_aggregated_data(input_filename: str, output_filename: str, aggregated_
             writer = csv.DictWriter(outfile, fieldnames=reader.fieldnames)
             writer.writeheader()
 
-            for row in reader:
-                normalized_search_query = normalizer.get_normalized_final_text(row['Search Query'], 'dig_practice_char')
-
+            for row, normalized_search_query in iter_normalized_rows(reader):
                 if normalized_search_query in aggregated_data:
                     visits, revenue = aggregated_data[normalized_search_query]
                     row['Search Query'] = normalized_search_query
@@ -82,3 +119,108 @@ def write_aggregated_data(input_filename: str, output_filename: str, aggregated_
 
                     # Remove the entry after writing it to avoid duplicates
                     del aggregated_data[normalized_search_query]
+
+def parse_cents(revenues: pd.Series):
+    """
+    Parses revenue strings such as "$1,234.50" into exact integer cents.
+
+    Args:
+        revenues (pd.Series): The raw revenue strings.
+
+    Returns:
+        np.ndarray or None: int64 cents, or None if a value has more than two decimals or
+                            another format that only Decimal can represent exactly.
+    """
+    amounts = revenues.str.replace('$', '', regex=False).str.replace(',', '', regex=False)
+    if not amounts.str.fullmatch(CENTS_PATTERN).all():
+        return None
+
+    negative = amounts.str.startswith('-').to_numpy()
+    parts = amounts.str.lstrip('-').str.split('.', n=1, expand=True).reindex(columns=[0, 1])
+    units = parts[0].astype('int64').to_numpy()
+    fraction = parts[1].fillna('').str.ljust(2, '0').astype('int64').to_numpy()
+    cents = units * 100 + fraction
+    return np.where(negative, -cents, cents)
+
+def format_cents(cents: int) -> str:
+    """
+    Formats integer cents like the sum of two-decimal Decimals, e.g. 123450 -> "1234.50".
+    """
+    sign = '-' if cents < 0 else ''
+    return f"{sign}{abs(cents) // 100}.{abs(cents) % 100:02d}"
+
+def aggregate_vectorized(input_filename: str, output_filename: str) -> None:
+    """
+    Aggregates visits and revenue by normalized search query in a single pass over the input.
+
+    Each distinct raw query is normalized exactly once, and the totals are computed with
+    NumPy over integer group codes. Groups are written in order of first occurrence, each
+    from the first input row of the group, so the output matches the rowwise engine.
+
+    Args:
+        input_filename (str): Path to the input CSV file containing search queries.
+        output_filename (str): Path to the output CSV file.
+    """
+    with open(input_filename, mode='r', newline='', encoding='utf-8') as infile:
+        reader = csv.DictReader(infile)
+        clean_header(reader)
+        fieldnames = reader.fieldnames
+
+        # Keep the three aggregated columns for every row, and whole rows only for the first
+        # occurrence of each raw query (the only rows that can head a group)
+        queries, visits, revenues = [], [], []
+        first_rows = {}
+        for row in reader:
+            query = row['Search Query']
+            queries.append(query)
+            visits.append(row['Visits'])
+            revenues.append(row['Revenue'])
+            if query not in first_rows:
+                first_rows[query] = row
+
+    # Distinct raw queries in first-occurrence order, and each row's index into them
+    query_codes, distinct_queries = pd.factorize(pd.Series(queries, dtype=object), sort=False)
+    distinct_queries = list(distinct_queries)
+    print(f"Normalizing {len(distinct_queries)} distinct queries out of {len(queries)} rows...")
+
+    normalized_queries = []
+    for start in range(0, len(distinct_queries), NORMALIZATION_BATCH_SIZE):
+        normalized_queries.extend(normalizer.get_normalized_final_text_many(
+            distinct_queries[start:start + NORMALIZATION_BATCH_SIZE], 'dig_practice_char'))
+        sys.stdout.write(f"\rQueries processed: {len(normalized_queries)}")
+        sys.stdout.flush()
+
+    # Groups are numbered in first-occurrence order, since distinct queries are
+    group_of_query, group_names = pd.factorize(pd.Series(normalized_queries, dtype=object), sort=False)
+    row_groups = group_of_query[query_codes]
+    group_count = len(group_names)
+
+    total_visits = np.zeros(group_count, dtype=np.int64)
+    np.add.at(total_visits, row_groups, pd.Series(visits, dtype=object).astype('int64').to_numpy())
+
+    revenue_series = pd.Series(revenues, dtype=object)
+    cents = parse_cents(revenue_series)
+    if cents is not None:
+        total_cents = np.zeros(group_count, dtype=np.int64)
+        np.add.at(total_cents, row_groups, cents)
+        total_revenues = [format_cents(int(value)) for value in total_cents]
+    else:
+        total_revenues = [Decimal('0.00')] * group_count
+        for group, revenue in zip(row_groups, revenue_series):
+            total_revenues[group] += Decimal(revenue.replace('$', '').replace(',', ''))
+
+    # The first row of each group is the first row of its first distinct raw query
+    group_first_query = np.full(group_count, -1, dtype=np.int64)
+    for query_index in range(len(distinct_queries) - 1, -1, -1):
+        group_first_query[group_of_query[query_index]] = query_index
+
+    with open(output_filename, mode='w', newline='', encoding='utf-8') as outfile:
+        print("\nWriting normalized and aggregated queries to new CSV...")
+        writer = csv.DictWriter(outfile, fieldnames=fieldnames)
+        writer.writeheader()
+        for group in range(group_count):
+            row = first_rows[distinct_queries[group_first_query[group]]]
+            row['Search Query'] = group_names[group]
+            row['Visits'] = int(total_visits[group])
+            row['Revenue'] = total_revenues[group]
+            writer.writerow(row)